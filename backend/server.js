@@ -118,12 +118,18 @@ app.use(cors({
 // -------------------------------------------------------------------------------------------------------------//
 // DATABASE CONNECTION SETUP
 // -------------------------------------------------------------------------------------------------------------//
-const db = mysql2.createConnection({
+const dbConfig = {
   user: "root",
   host: "localhost",
   password: "Raintail0!", // Password of the database you created
   database: "main_db", // Name of the database you created
-});
+};
+const db = mysql2.createConnection(dbConfig);
+// For upserts that must tell inserted (affectedRows 1) from unchanged (0) rows:
+// with mysql2's default FOUND_ROWS flag an unchanged row also counts as 1
+const upsertDb = mysql2.createConnection({ ...dbConfig, flags: ["-FOUND_ROWS"] });
+// Transactions need a connection of their own, so concurrent requests on db/upsertDb cannot interleave
+const transactionPool = mysql2.createPool({ ...dbConfig, flags: ["-FOUND_ROWS"], connectionLimit: 4 });
 // Check mySql workbench if you forgot
 
 // -------------------------------------------------------------------------------------------------------------//
@@ -1690,7 +1696,52 @@ app.post("/upload-main-data", upload.none(), async (req, res) => {
 // -------------------------------------------------------------------------------------------------------------//
 // POST REQUEST to store structured scheduling data (from AI email parser)
 // -------------------------------------------------------------------------------------------------------------//
-app.post("/api/scheduling/parsed-email", (req, res) => {
+// --- Normalize available_slots_timings ---
+function normalizeAvailableSlots(slots) {
+  const timeOnlyPattern = /^\d{1,2}(\.\d{0,2})?([ap]m)?\s*-\s*\d{1,2}(\.\d{0,2})?([ap]m)?$/i;
+  const datePattern = /^\d{1,2}\s+\w+/; // e.g. 27 Aug
+
+  let defaultTime = null;
+  const cleaned = [];
+
+  for (let i = 0; i < slots.length; i++) {
+    const entry = slots[i].trim();
+
+    if (timeOnlyPattern.test(entry)) {
+      defaultTime = entry;
+      continue;
+    }
+
+    if (defaultTime && datePattern.test(entry)) {
+      cleaned.push(`${entry} ${defaultTime}`);
+    } else {
+      cleaned.push(entry);
+    }
+  }
+
+  return cleaned;
+}
+
+// A record whose idempotency_key is already stored is left as it is, so the
+// email pipeline can safely resend a batch after a timeout. Not INSERT IGNORE,
+// which would also turn truncation and NOT NULL errors into silent warnings.
+// Run on upsertDb: affectedRows is 1 for a new row, 0 for a duplicate.
+function insertParsedEmailsQuery(rowCount) {
+  const row = "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NOW(), ?, ?, ?, ?, ?)";
+  return `
+  INSERT INTO parsed_emails (
+    type, session_name, from_name, from_email, to_email, 
+    original_session, new_session, reason, students,
+    available_slots_timings, notes, received_at, session_id, idempotency_key, duplicate_of,
+    slot_intervals, has_conflicts
+  )
+  VALUES ${Array(rowCount).fill(row).join(", ")}
+  ON DUPLICATE KEY UPDATE id = id
+`;
+}
+const insertParsedEmailQuery = insertParsedEmailsQuery(1);
+
+function parsedEmailValues(record) {
   const {
     type,
     session_name,
@@ -1702,49 +1753,19 @@ app.post("/api/scheduling/parsed-email", (req, res) => {
     reason,
     students,
     available_slots_timings,
-    notes
-  } = req.body;
-
-  const insertQuery = `
-    INSERT INTO parsed_emails (
-      type, session_name, from_name, from_email, to_email, 
-      original_session, new_session, reason, students,
-      available_slots_timings, notes, received_at
-    )
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NOW())
-  `;
-
-  // --- Normalize available_slots_timings ---
-  function normalizeAvailableSlots(slots) {
-    const timeOnlyPattern = /^\d{1,2}(\.\d{0,2})?([ap]m)?\s*-\s*\d{1,2}(\.\d{0,2})?([ap]m)?$/i;
-    const datePattern = /^\d{1,2}\s+\w+/; // e.g. 27 Aug
-
-    let defaultTime = null;
-    const cleaned = [];
-
-    for (let i = 0; i < slots.length; i++) {
-      const entry = slots[i].trim();
-
-      if (timeOnlyPattern.test(entry)) {
-        defaultTime = entry;
-        continue;
-      }
-
-      if (defaultTime && datePattern.test(entry)) {
-        cleaned.push(`${entry} ${defaultTime}`);
-      } else {
-        cleaned.push(entry);
-      }
-    }
-
-    return cleaned;
-  }
+    notes,
+    session_id, // set for replies to an invite (X-Session-ID)
+    idempotency_key, // set by the email pipeline's outbox
+    duplicate_of, // idempotency_key of the email this one nearly repeats
+    slot_intervals, // [{ slot, start, end, conflicts }] from the pipeline's conflict check
+    has_conflicts
+  } = record;
 
   const normalizedSlots = Array.isArray(available_slots_timings)
     ? normalizeAvailableSlots(available_slots_timings)
     : null;
 
-  const values = [
+  return [
     type,
     session_name,
     from_name,
@@ -1755,17 +1776,146 @@ app.post("/api/scheduling/parsed-email", (req, res) => {
     reason,
     students,
     normalizedSlots ? normalizedSlots.join(", ") : null,
-    notes
+    notes,
+    session_id || null,
+    idempotency_key || null,
+    duplicate_of || null,
+    Array.isArray(slot_intervals) ? JSON.stringify(slot_intervals) : null,
+    has_conflicts ? 1 : 0
   ];
+}
 
-  db.query(insertQuery, values, (err, result) => {
-    if (err) {
+// Adds parsed_emails.idempotency_key (unique), duplicate_of, slot_intervals
+// and has_conflicts on first use
+let parsedEmailColumnsReady = null;
+function ensureParsedEmailColumns() {
+  if (!parsedEmailColumnsReady) {
+    parsedEmailColumnsReady = (async () => {
+      const [columns] = await db.promise().query(`
+        SELECT COLUMN_NAME 
+        FROM INFORMATION_SCHEMA.COLUMNS 
+        WHERE TABLE_NAME = 'parsed_emails' AND TABLE_SCHEMA = 'main_db'
+          AND COLUMN_NAME IN ('idempotency_key', 'duplicate_of', 'slot_intervals', 'has_conflicts')
+      `);
+      const existing = new Set(columns.map((c) => c.COLUMN_NAME));
+      if (!existing.has("idempotency_key")) {
+        await db.promise().query(
+          `ALTER TABLE parsed_emails ADD COLUMN idempotency_key VARCHAR(64) NULL, ADD UNIQUE KEY uniq_parsed_emails_idempotency_key (idempotency_key)`
+        );
+      }
+      if (!existing.has("duplicate_of")) {
+        await db.promise().query(
+          `ALTER TABLE parsed_emails ADD COLUMN duplicate_of VARCHAR(64) NULL, ADD KEY idx_parsed_emails_duplicate_of (duplicate_of)`
+        );
+      }
+      if (!existing.has("slot_intervals")) {
+        await db.promise().query(`ALTER TABLE parsed_emails ADD COLUMN slot_intervals JSON NULL`);
+      }
+      if (!existing.has("has_conflicts")) {
+        await db.promise().query(
+          `ALTER TABLE parsed_emails ADD COLUMN has_conflicts TINYINT(1) NOT NULL DEFAULT 0, ADD KEY idx_parsed_emails_has_conflicts (has_conflicts)`
+        );
+      }
+    })().catch((err) => {
+      parsedEmailColumnsReady = null;
+      throw err;
+    });
+  }
+  return parsedEmailColumnsReady;
+}
+
+app.post("/api/scheduling/parsed-email", async (req, res) => {
+  try {
+    await ensureParsedEmailColumns();
+    const [result] = await upsertDb.promise().query(insertParsedEmailQuery, parsedEmailValues(req.body));
+    if (result.affectedRows === 0) {
+      return res.status(200).json({ message: "Parsed email already saved." });
+    }
+    return res.status(201).json({ message: "Parsed email saved successfully." });
+  } catch (err) {
+    console.error("Error inserting parsed email:", err);
+    return res.status(500).json({ error: "Failed to store parsed scheduling data." });
+  }
+});
+
+// -------------------------------------------------------------------------------------------------------------//
+// POST REQUEST to store a batch of parsed emails (email pipeline outbox)
+// Body: { records: [{ idempotency_key, type, session_name, ... }] }
+// Each record is answered on its own as stored, duplicate or failed; only failed ones should be resent.
+// The batch is stored with one multi-row INSERT in a transaction. Keys already stored (or repeated
+// within the batch) are found first and left out, which is how each row learns its own status; the
+// SELECT ... FOR UPDATE holds those key ranges so a concurrent batch cannot insert them meanwhile.
+// If the INSERT fails (one bad row fails the statement) the records are stored one by one instead,
+// so only the bad rows come back as failed.
+// -------------------------------------------------------------------------------------------------------------//
+async function insertParsedEmailsOneByOne(records) {
+  const results = [];
+  for (const record of records) {
+    try {
+      const [result] = await upsertDb.promise().query(insertParsedEmailQuery, parsedEmailValues(record));
+      results.push({ idempotency_key: record.idempotency_key, status: result.affectedRows === 0 ? "duplicate" : "stored" });
+    } catch (err) {
       console.error("Error inserting parsed email:", err);
-      return res.status(500).json({ error: "Failed to store parsed scheduling data." });
+      results.push({ idempotency_key: record.idempotency_key, status: "failed", error: err.code || "DB_ERROR" });
     }
+  }
+  return results;
+}
 
-    return res.status(201).json({ message: "Parsed email saved successfully." });
-  });
+app.post("/api/scheduling/parsed-email/bulk", async (req, res) => {
+  const { records } = req.body;
+
+  if (!Array.isArray(records)) {
+    return res.status(400).json({ error: "Invalid format" });
+  }
+  if (records.length === 0) {
+    return res.status(200).json({ results: [] });
+  }
+
+  let connection;
+  try {
+    await ensureParsedEmailColumns();
+    connection = await transactionPool.promise().getConnection();
+  } catch (err) {
+    console.error("Error preparing parsed_emails for bulk insert:", err);
+    return res.status(500).json({ error: "Failed to store parsed scheduling data." });
+  }
+
+  try {
+    await connection.beginTransaction();
+    const keys = [...new Set(records.map((record) => record.idempotency_key).filter(Boolean))];
+    const seen = new Set();
+    if (keys.length) {
+      const [rows] = await connection.query(
+        "SELECT idempotency_key FROM parsed_emails WHERE idempotency_key IN (?) FOR UPDATE",
+        [keys]
+      );
+      rows.forEach((row) => seen.add(row.idempotency_key));
+    }
+
+    const fresh = [];
+    const results = records.map((record) => {
+      const key = record.idempotency_key;
+      if (key && seen.has(key)) {
+        return { idempotency_key: key, status: "duplicate" };
+      }
+      if (key) seen.add(key);
+      fresh.push(record);
+      return { idempotency_key: key, status: "stored" };
+    });
+
+    if (fresh.length) {
+      await connection.query(insertParsedEmailsQuery(fresh.length), fresh.flatMap(parsedEmailValues));
+    }
+    await connection.commit();
+    return res.status(200).json({ results });
+  } catch (err) {
+    await connection.rollback().catch(() => {});
+    console.error("Bulk insert of parsed emails failed; storing them one by one:", err);
+    return res.status(200).json({ results: await insertParsedEmailsOneByOne(records) });
+  } finally {
+    connection.release();
+  }
 });
 
 // -------------------------------------------------------------------------------------------------------------//
@@ -2502,13 +2652,13 @@ app.post("/api/scheduling/update-blocked-dates", (req, res) => {
 
 // ------------------- Retrieving Blocked Dates from Database (blocked_dates) -------------------
 app.get("/api/scheduling/get-blocked-dates", (req, res) => {
-  const q = "SELECT date, remark FROM blocked_dates";
+  const q = "SELECT date, remark, school, yearofstudy FROM blocked_dates";
   db.query(q, (err, data) => {
     if (err) {
       console.error("❌ Failed to fetch blocked dates:", err);
       return res.status(500).json({ error: "Internal server error" });
     }
-    return res.json({ blocked_dates: data }); // [{ date: "2025-07-11" }, ...]
+    return res.json({ blocked_dates: data }); // [{ date: "2025-07-11", school, yearofstudy }, ...]
   });
 });
 
@@ -2806,6 +2956,24 @@ app.post('/delete-multiple-students', (req, res) => {
 // -------------------------------------------------------------------------------------------------------------//
 // ------------------- DOCTOR LINK FOR AVAILABILITY INSTEAD OF EMAILING REPLY -------------------
 // -------------------------------------------------------------------------------------------------------------//
+// Whether this doctor (by MCR or email) already sent availability for the invite,
+// through the link (MCR kept in notes) or by email (from_email)
+async function availabilitySubmitted(sessionId, { mcr, email }) {
+  const emails = email ? [email.trim().toLowerCase()] : [];
+  if (mcr) {
+    const [doctorRows] = await db.promise().query("SELECT email FROM main_data WHERE mcr_number = ?", [mcr.trim()]);
+    doctorRows.forEach((row) => row.email && emails.push(row.email.trim().toLowerCase()));
+  }
+  const [rows] = await db.promise().query(
+    `SELECT id FROM parsed_emails
+     WHERE session_id = ? AND type = 'availability'
+       AND (notes = ? OR LOWER(from_email) IN (?))
+     LIMIT 1`,
+    [sessionId, mcr ? mcr.trim() : null, emails.length ? emails : [null]]
+  );
+  return rows.length > 0;
+}
+
 app.get("/api/email-sessions/:sessionId", (req, res) => {
   const sessionId = req.params.sessionId;
 
@@ -2822,14 +2990,18 @@ app.get("/api/email-sessions/:sessionId", (req, res) => {
 
     const session = results[0];
 
-    // 🔒 Check if this session_id has already been submitted
-    const [parsedRows] = await db.promise().query(
-      "SELECT id FROM parsed_emails WHERE session_id = ? AND type = 'availability'",
-      [sessionId]
-    );
-
-    if (parsedRows.length > 0) {
-      return res.status(403).json({ error: "This session has already been submitted." });
+    // 🔒 An invite goes to several doctors, so "already submitted" is per doctor
+    // (?mcr= or ?email=); without one the invite is returned as is, e.g. to the email pipeline
+    const { mcr, email } = req.query;
+    if (mcr || email) {
+      try {
+        if (await availabilitySubmitted(sessionId, { mcr, email })) {
+          return res.status(403).json({ error: "This session has already been submitted." });
+        }
+      } catch (checkErr) {
+        console.error("❌ DB error checking submitted availability:", checkErr);
+        return res.status(500).json({ error: "Database error" });
+      }
     }
 
     let slots = [];
@@ -2909,6 +3081,10 @@ app.patch("/api/scheduling/parsed-email/:session_id/update-availability", async
       return res.status(403).json({ error: "This MCR is not authorized for this session." });
     }
 
+    if (await availabilitySubmitted(session_id, { mcr: mcr_number })) {
+      return res.status(409).json({ error: "You have submitted already." });
+    }
+
     // Step 2: Format selected slots
     const formattedSlots = selected_slots.map(slot => {
       const dateObj = new Date(slot.date);
@@ -4245,6 +4421,11 @@ db.connect((err) => {
     console.log("Connection Successful. Backend server is running!");
   }
 });
+upsertDb.connect((err) => {
+  if (err) {
+    console.log("Error connecting to the database (upserts):", err);
+  }
+});
 
 const PORT = process.env.PORT || 3001;
 
@@ -0,0 +1,95 @@
+"""
+Fill-colour classification for the posting-dates workbook.
+
+Cells only point at a shared fill record, and a workbook has a few dozen of
+them at most, so each fill is resolved once into a canonical colour key
+("#92D050", "theme:9", "theme:5:0.80") and cached. Keys are mapped to
+blocked-date remarks through the colour legend in blocked_dates_config.yaml.
+"""
+import os
+
+import yaml
+from openpyxl.styles.colors import COLOR_INDEX
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "blocked_dates_config.yaml")
+
+# Colours that read as "no fill" on the sheet
+_UNCOLOURED = {"#FFFFFF", "#000000"}
+
+
+def load_colour_legend(config_path=CONFIG_PATH):
+    """Read the colour key -> remark legend from the YAML config"""
+    if not os.path.exists(config_path):
+        return {}
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f) or {}
+    return {str(key).upper() if str(key).startswith("#") else str(key): label
+            for key, label in (config.get("colour_legend") or {}).items()}
+
+
+def colour_key(fill):
+    """Canonical key for a fill, or None when it is not visibly coloured"""
+    if fill is None or fill.patternType != "solid":
+        return None
+    color = fill.start_color
+
+    if color.type == "rgb":
+        rgb = color.rgb
+        if not isinstance(rgb, str):
+            return None
+        key = f"#{rgb[-6:].upper()}"
+        return None if key in _UNCOLOURED else key
+
+    if color.type == "theme":
+        if color.theme == 0:
+            return None
+        if color.tint:
+            return f"theme:{color.theme}:{color.tint:.2f}"
+        return f"theme:{color.theme}"
+
+    if color.type == "indexed":
+        if color.indexed in (64, 9):
+            return None
+        if color.indexed < len(COLOR_INDEX):
+            key = f"#{COLOR_INDEX[color.indexed][-6:].upper()}"
+            return None if key in _UNCOLOURED else key
+        return f"indexed:{color.indexed}"
+
+    return None
+
+
+class FillClassifier:
+    """Resolves each distinct fill of a workbook once and labels cells from the legend"""
+
+    def __init__(self, wb, legend=None):
+        self.fills = wb._fills
+        self.legend = load_colour_legend() if legend is None else legend
+        self._keys = {}
+
+    def key(self, cell):
+        # _style.fillId is the shared fill record; cell.fill would build a proxy per cell
+        style = getattr(cell, "_style", None)
+        fill_id = style.fillId if style is not None else 0
+        try:
+            return self._keys[fill_id]
+        except KeyError:
+            key = self._keys[fill_id] = colour_key(self.fills[fill_id])
+            return key
+
+    def label(self, cell):
+        key = self.key(cell)
+        return self.legend.get(key) if key else None
+
+
+def link_coloured_dates(date_cells, classifier):
+    """Blocked-date entries for date cells whose fill colour is in the legend"""
+    results = []
+    for cell, dt in date_cells:
+        remark = classifier.label(cell)
+        if remark:
+            results.append({
+                "date": dt.strftime("%Y-%m-%d"),
+                "remark": remark,
+                "remark_cell": cell.coordinate
+            })
+    return results
@@ -0,0 +1,214 @@
+"""
+Remark grammar for the posting-dates workbook (column H).
+
+Every remark is tokenised once by a single precompiled scanner that yields
+single dates ("19 Mar"), short ranges ("20 - 21 Oct") and full ranges
+("9 Aug to 17 Aug 2025"). Week markers ("HOR Week", "CBL Week") are read
+from blocked_dates_config.yaml and compiled into a single trie automaton,
+so adding markers does not add passes over the text.
+
+Used by extract_blocked_dates.py and excel_test/test.py.
+"""
+import os
+import re
+import unicodedata
+from collections import namedtuple
+from datetime import datetime
+
+import yaml
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "blocked_dates_config.yaml")
+DEFAULT_WEEK_MARKERS = ["HOR Week", "CBL Week"]
+
+month_map = {
+    'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+    'Jul': 7, 'Aug': 8, 'Sep': 9, 'Sept': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
+}
+
+_MONTH = r'(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)'
+
+# One scanner for every date shape. The leading day is shared, then the
+# branches split into "D Mon to D Mon [YYYY]", "D Mon" and "D - D Mon".
+_TOKEN_RE = re.compile(
+    r'(\d{1,2})(?:'
+    r'\s+(' + _MONTH + r')(?:\s+(?:to|-)\s+(\d{1,2})\s+(\2)(?:\s+(\d{4}))?|\b)'
+    r'|\s*-\s*(\d{1,2})\s+(' + _MONTH + r'))'
+)
+_SINGLE_RE = re.compile(r'\d{1,2}\s+' + _MONTH + r'\b')
+
+# Leading "12 Sept", "12 Sept 2025", "12 Sept Fri" etc. stripped from the stored remark
+_LEADING_DATE_RE = re.compile(
+    r'^\s*\d{1,2}\s+(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sept|Sep|Oct|Nov|Dec)'
+    r'(?:\s+\d{2,4})?'  # optional year
+    r'(?:\s*(Mon|Tue|Wed|Thu|Fri|Sat|Sun))?'  # optional weekday
+    r'[\s,:-]*'
+)
+
+_DASHES = str.maketrans({'\u2013': '-', '\u2014': '-', '\u2212': '-'})
+
+ParsedRemark = namedtuple("ParsedRemark", ["text", "cleaned", "markers", "singles", "ranges", "full_ranges"])
+
+
+class MarkerAutomaton:
+    """
+    Multi-pattern matcher for literal week markers.
+
+    The markers are merged into a trie, and the trie is compiled into one
+    regex so the scan runs inside the C regex engine rather than a Python
+    per-character loop. A marker that overlaps or prefixes another one is
+    still reported.
+    """
+
+    def __init__(self, markers):
+        self.markers = list(dict.fromkeys(markers))
+        trie = {}
+        for marker in self.markers:
+            node = trie
+            for ch in marker:
+                node = node.setdefault(ch, {})
+            node[""] = marker
+        # Longest match at a position also implies every marker that prefixes it
+        self._implied = {m: [p for p in self.markers if m.startswith(p)] for m in self.markers}
+        self._regex = re.compile(self._trie_pattern(trie)) if self.markers else None
+
+    def _trie_pattern(self, node):
+        branches = [re.escape(ch) + self._trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            body = "(?:" + body + ")?"
+        return body
+
+    def find(self, text):
+        """Return the distinct markers found in text, in order of first appearance"""
+        found = []
+        if self._regex is None:
+            return found
+        m = self._regex.search(text)
+        while m:
+            for marker in self._implied[m.group()]:
+                if marker not in found:
+                    found.append(marker)
+            # Restart one character on so overlapping markers are still seen
+            m = self._regex.search(text, m.start() + 1)
+        return found
+
+
+def load_week_markers(config_path=CONFIG_PATH):
+    """Read week markers from the YAML config, falling back to the built-in pair"""
+    if not os.path.exists(config_path):
+        return list(DEFAULT_WEEK_MARKERS)
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f) or {}
+    return config.get("week_markers") or list(DEFAULT_WEEK_MARKERS)
+
+
+class RemarkParser:
+    """Single-pass tokenizer for column-H remark strings"""
+
+    def __init__(self, week_markers=None):
+        if week_markers is None:
+            week_markers = load_week_markers()
+        self.automaton = MarkerAutomaton(week_markers)
+
+    def normalize(self, raw):
+        text = raw.strip()
+        # ASCII text is already NFKC and has no unicode dashes
+        if not text.isascii():
+            text = unicodedata.normalize("NFKC", text).translate(_DASHES)
+        return text
+
+    def parse(self, raw):
+        text = self.normalize(raw)
+        leading = _LEADING_DATE_RE.match(text)
+        cleaned = text[leading.end():] if leading else text
+        markers = self.automaton.find(text)
+
+        singles, ranges, full_ranges = [], [], []
+        if not markers:
+            for m in _TOKEN_RE.finditer(text):
+                day, month_name, full_end, _, year, range_end, range_month = m.groups()
+                # Overlapping single dates only count on word boundaries, as \b did before
+                starts_word = not _is_word(text, m.start() - 1)
+                if range_end:
+                    month = month_map[range_month]
+                    if _SINGLE_RE.match(text, m.start(6)):
+                        singles.append((int(range_end), month))
+                    ranges.append((int(day), int(range_end), month))
+                elif full_end:
+                    month = month_map[month_name]
+                    if starts_word:
+                        singles.append((int(day), month))
+                    if _SINGLE_RE.match(text, m.start(3)):
+                        singles.append((int(full_end), month))
+                    full_ranges.append((int(day), int(full_end), month, int(year) if year else None))
+                elif starts_word:
+                    singles.append((int(day), month_map[month_name]))
+
+        return ParsedRemark(text, cleaned, markers, singles, ranges, full_ranges)
+
+
+def _is_word(text, i):
+    if i < 0 or i >= len(text):
+        return False
+    ch = text[i]
+    return ch.isalnum() or ch == "_"
+
+
+def index_calendar(calendar_dates):
+    """Group calendar dates by (month, day), keeping sheet order within each key"""
+    index = {}
+    for dt in calendar_dates:
+        index.setdefault((dt.month, dt.day), []).append(dt)
+    return index
+
+
+def link_remark(parsed, calendar_index, remark_cell, row_dates=()):
+    """Turn a parsed remark into blocked-date entries against the workbook calendar"""
+    results = []
+
+    def add(dt, remark):
+        results.append({
+            "date": dt.strftime("%Y-%m-%d"),
+            "remark": remark,
+            "remark_cell": remark_cell
+        })
+
+    def add_range(start_day, end_day, month, year):
+        for day in range(start_day, end_day + 1):
+            for dt in calendar_index.get((month, day), ()):
+                if dt.year == year:
+                    add(dt, parsed.cleaned)
+
+    if parsed.markers:
+        # Week markers block every date in the row
+        for dt in row_dates:
+            add(dt, parsed.text)
+        return results
+
+    for day, month in parsed.singles:
+        for dt in calendar_index.get((month, day), ()):
+            add(dt, parsed.cleaned)
+
+    for start_day, end_day, month in parsed.ranges:
+        years = [dt.year for (m, _), dts in calendar_index.items() if m == month for dt in dts]
+        if years:
+            add_range(start_day, end_day, month, max(years))
+
+    for start_day, end_day, month, year in parsed.full_ranges:
+        add_range(start_day, end_day, month, year or datetime.now().year)
+
+    return results
+
+
+def dedupe_results(linked_results):
+    """Drop repeated (date, remark_cell) pairs, keeping the first occurrence"""
+    seen = set()
+    deduped = []
+    for item in linked_results:
+        key = (item['date'], item['remark_cell'])
+        if key not in seen:
+            seen.add(key)
+            deduped.append(item)
+    return deduped
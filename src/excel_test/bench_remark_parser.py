@@ -0,0 +1,83 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import unicodedata
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "components"))
+from remark_parser import RemarkParser, month_map
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "remark_golden.json")
+
+
+# Baseline: the per-remark regex sequence extract_blocked_dates.py used before remark_parser
+def legacy_parse(raw):
+    text = unicodedata.normalize("NFKC", raw.strip())
+    text = re.sub(r'[–—−]', '-', text)
+    cleaned = re.sub(
+        r'^\s*\d{1,2}\s+(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sept|Sep|Oct|Nov|Dec)'
+        r'(?:\s+\d{2,4})?(?:\s*(Mon|Tue|Wed|Thu|Fri|Sat|Sun))?[\s,:-]*',
+        '', text, flags=re.UNICODE)
+    if 'HOR Week' not in text and 'CBL Week' not in text:
+        singles = re.findall(r'\b(\d{1,2})\s+(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)\b', text)
+        ranges = re.findall(r'(\d{1,2})\s*-\s*(\d{1,2})\s+(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)', text)
+        full = re.findall(
+            r'(\d{1,2})\s+(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)\s+(?:to|-)\s+(\d{1,2})\s+\2(?:\s+(\d{4}))?',
+            text)
+        return cleaned, singles, ranges, full
+    return cleaned, [], [], []
+
+
+def check_golden(parser, golden):
+    failures = 0
+    for case in golden:
+        parsed = parser.parse(case["remark"])
+        got = {
+            "text": parsed.text,
+            "cleaned": parsed.cleaned,
+            "markers": parsed.markers,
+            "singles": [list(t) for t in parsed.singles],
+            "ranges": [list(t) for t in parsed.ranges],
+            "full_ranges": [list(t) for t in parsed.full_ranges],
+        }
+        expected = {k: case[k] for k in got}
+        if got != expected:
+            failures += 1
+            print(f"❌ {case['remark']!r}")
+            for key in got:
+                if got[key] != expected[key]:
+                    print(f"   {key}: expected {expected[key]!r}, got {got[key]!r}")
+    return failures
+
+
+def throughput(fn, remarks, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for remark in remarks:
+            fn(remark)
+    elapsed = time.perf_counter() - start
+    return len(remarks) * repeat / elapsed
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Golden check and throughput benchmark for remark_parser")
+    arg_parser.add_argument("--repeat", type=int, default=2000, help="Passes over the golden corpus")
+    args = arg_parser.parse_args()
+
+    with open(GOLDEN_PATH, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+
+    parser = RemarkParser()
+    failures = check_golden(parser, golden)
+    if failures:
+        print(f"❌ {failures}/{len(golden)} golden remarks differ")
+        sys.exit(1)
+    print(f"✅ {len(golden)} golden remarks match")
+
+    remarks = [case["remark"] for case in golden]
+    legacy_rate = throughput(legacy_parse, remarks, args.repeat)
+    parser_rate = throughput(parser.parse, remarks, args.repeat)
+    print(f"📊 legacy regex sequence: {legacy_rate:,.0f} remarks/sec")
+    print(f"📊 remark_parser:         {parser_rate:,.0f} remarks/sec ({parser_rate / legacy_rate:.2f}x)")
@@ -167,7 +167,11 @@ const DoctorSessionBooking = () => {
       setSubmitted(true);
     } catch (err) {
       console.error(err);
-      setError("Failed to submit your availability.");
+      if (err.response?.status === 409) {
+        setError("🛑 You have submitted already.");
+      } else {
+        setError("Failed to submit your availability.");
+      }
     }
   };
 
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import threading
+from api.send_to_backend import post_parsed_batch
+from processor.work_queue import STATE_DIR
+from utils.metrics import OUTBOX_DEPTH, OUTBOX_DELIVERIES
+from utils.trace import text_digest
+
+# Durable outbox between extraction and the backend. A parsed record is
+# committed to SQLite before its email is marked read, and a background
+# flusher delivers pending records in batches to
+# /api/scheduling/parsed-email/bulk. Each record carries an idempotency key
+# derived from its email id, so a batch resent after a timeout or a restart
+# is stored once. Failed deliveries back off exponentially per record; the
+# record stays in the outbox, so neither the data nor the inference is lost
+# while the backend is down. A record the backend still refuses after
+# MAX_ATTEMPTS deliveries (about 3 hours of retries by default) is marked
+# dead: it is no longer sent, stays in the database for inspection, and is
+# counted in OUTBOX_DEPTH{status="dead"}.
+
+BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+# Wait this long after a record arrives, so records produced together share a request
+LINGER_SECONDS = float(os.getenv("OUTBOX_LINGER_SECONDS", "2"))
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 900
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "20"))
+KEEP_SENT_DAYS = 7
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    idempotency_key TEXT PRIMARY KEY,
+    email_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+
+def idempotency_key(email_id):
+    """Stable per email, so re-processing the same email cannot create a second row"""
+    return text_digest(f"parsed-email:{email_id}")
+
+
+def backoff_seconds(attempts):
+    """Exponential backoff with jitter, capped at BACKOFF_MAX_SECONDS"""
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class Outbox:
+    def __init__(self, name="default", path=None, deliver=post_parsed_batch, batch_size=BATCH_SIZE,
+                 linger_seconds=LINGER_SECONDS, max_attempts=MAX_ATTEMPTS):
+        if path is None:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            path = os.path.join(STATE_DIR, f"outbox_{name}.db")
+        self.path = path
+        self.deliver = deliver
+        self.batch_size = batch_size
+        self.linger_seconds = linger_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+            self._db.execute("DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?",
+                             (time.time() - KEEP_SENT_DAYS * 86400,))
+        dead = self.dead_count()
+        if dead:
+            print(f"[WARNING] Outbox: {dead} dead records in {path} were never accepted by the backend")
+        self._report_depth()
+
+    def put(self, email_id, record, key=None):
+        """Commit a record for delivery; returns its idempotency key (by default derived from email_id)"""
+        key = key or idempotency_key(email_id)
+        payload = json.dumps(dict(record, idempotency_key=key), ensure_ascii=False)
+        now = time.time()
+        with self._lock, self._db:
+            # Already committed (e.g. the email was processed again before it was marked read)
+            self._db.execute(
+                "INSERT OR IGNORE INTO outbox (idempotency_key, email_id, payload, created_at, status, next_attempt_at) "
+                "VALUES (?, ?, ?, ?, 'pending', ?)", (key, email_id, payload, now, now))
+        self._report_depth()
+        self._wake.set()
+        return key
+
+    def _due(self):
+        with self._lock:
+            return self._db.execute(
+                "SELECT idempotency_key, payload, attempts FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY created_at LIMIT ?", (time.time(), self.batch_size)).fetchall()
+
+    def flush_once(self):
+        """Deliver one batch of due records; returns how many the backend accepted"""
+        rows = self._due()
+        if not rows:
+            return 0
+        status, results = self.deliver([json.loads(payload) for _, payload, _ in rows])
+        outcome = {r.get("idempotency_key"): r.get("status") for r in results}
+        now = time.time()
+        accepted = 0
+        dead = []
+        with self._lock, self._db:
+            for key, _, attempts in rows:
+                result = outcome.get(key)
+                if result in ("stored", "duplicate"):
+                    self._db.execute("UPDATE outbox SET status = 'sent', sent_at = ?, attempts = ?, last_error = NULL "
+                                     "WHERE idempotency_key = ?", (now, attempts + 1, key))
+                    OUTBOX_DELIVERIES.inc(result=result)
+                    accepted += 1
+                elif attempts + 1 >= self.max_attempts:
+                    error = f"HTTP {status}" if result is None else result
+                    self._db.execute("UPDATE outbox SET status = 'dead', attempts = ?, last_error = ? "
+                                     "WHERE idempotency_key = ?", (attempts + 1, error, key))
+                    OUTBOX_DELIVERIES.inc(result="dead")
+                    dead.append((key, error))
+                else:
+                    error = f"HTTP {status}" if result is None else result
+                    self._db.execute("UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? "
+                                     "WHERE idempotency_key = ?", (attempts + 1, now + backoff_seconds(attempts + 1), error, key))
+                    OUTBOX_DELIVERIES.inc(result="retry")
+        self._report_depth()
+        for key, error in dead:
+            print(f"[ERROR] Outbox: record {key} refused {self.max_attempts} times (last: {error}); marked dead, not retried")
+        if accepted + len(dead) < len(rows):
+            print(f"[WARNING] Outbox: backend accepted {accepted}/{len(rows)} records (HTTP {status}); the rest will be retried")
+        return accepted
+
+    def _next_due_in(self):
+        with self._lock:
+            row = self._db.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'").fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def _run(self):
+        while not self._stop.is_set():
+            wait = self._next_due_in()
+            self._wake.wait(timeout=wait if wait is not None else 60)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            # Let records produced together be sent together
+            if self.linger_seconds:
+                self._stop.wait(self.linger_seconds)
+            try:
+                while self.flush_once() == self.batch_size:
+                    pass
+            except Exception as e:
+                print(f"[ERROR] Outbox flush failed: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="outbox-flusher", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self, flush=True):
+        """Stop the flusher; with flush, try once more to deliver what is due"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+        if flush:
+            try:
+                while self.flush_once() == self.batch_size:
+                    pass
+            except Exception as e:
+                print(f"[WARNING] Outbox not flushed on close: {e}")
+
+    def _report_depth(self):
+        OUTBOX_DEPTH.set(len(self), status="pending")
+        OUTBOX_DEPTH.set(self.dead_count(), status="dead")
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+
+    def dead_count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox WHERE status = 'dead'").fetchone()[0]
+
+    def oldest_pending_age(self):
+        with self._lock:
+            row = self._db.execute("SELECT MIN(created_at) FROM outbox WHERE status = 'pending'").fetchone()
+        return None if row[0] is None else time.time() - row[0]
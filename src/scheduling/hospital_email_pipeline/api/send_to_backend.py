@@ -4,12 +4,99 @@ import requests
 
 load_dotenv()  # load from .env file
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:3001")
+# JWT for routes behind verifyToken (e.g. the timetable); optional
+BACKEND_API_TOKEN = os.getenv("BACKEND_API_TOKEN")
 
 def post_structured_data(json_data, endpoint=None):
     if endpoint is None:
         endpoint = f"{API_BASE_URL}/api/scheduling/parsed-email"
     try:
-        res = requests.post(endpoint, json=json_data)
+        res = requests.post(endpoint, json=json_data, timeout=30)
         return res.status_code, res.text
     except Exception as e:
         return 500, str(e)
+
+def post_parsed_batch(records):
+    """
+    Bulk insert of outbox records (each with an idempotency_key). Returns
+    (status, [{idempotency_key, status: stored|duplicate|failed}]); the list is
+    empty unless the request itself succeeded.
+    """
+    try:
+        res = requests.post(f"{API_BASE_URL}/api/scheduling/parsed-email/bulk", json={"records": records}, timeout=30)
+        if res.status_code == 200:
+            return res.status_code, res.json().get("results", [])
+        return res.status_code, []
+    except Exception as e:
+        print(f"[WARNING] Outbox delivery failed: {e}")
+        return 500, []
+
+def post_blocked_dates(blocked_dates, school, yearofstudy):
+    """Same payload as a manual posting-spreadsheet upload"""
+    try:
+        payload = {"blocked_dates": blocked_dates, "school": school, "yearofstudy": yearofstudy}
+        res = requests.post(f"{API_BASE_URL}/api/scheduling/update-blocked-dates", json=payload, timeout=30)
+        return res.status_code, res.text
+    except Exception as e:
+        return 500, str(e)
+
+def fetch_email_session(session_id):
+    """The email_sessions row behind an invite (session_name, slots, ...), or None"""
+    try:
+        # No ?mcr=/?email=: the invite as sent, whoever has already replied to it
+        res = requests.get(f"{API_BASE_URL}/api/email-sessions/{session_id}", timeout=10)
+        if res.status_code == 200:
+            return res.json()
+        print(f"[WARNING] Could not fetch email session {session_id}: {res.status_code}")
+    except Exception as e:
+        print(f"[WARNING] Could not fetch email session {session_id}: {e}")
+    return None
+
+def fetch_blocked_dates():
+    """Blocked dates as [{date, remark, school, yearofstudy}], or [] if the backend is unreachable"""
+    try:
+        res = requests.get(f"{API_BASE_URL}/api/scheduling/get-blocked-dates", timeout=10)
+        if res.status_code == 200:
+            return res.json().get("blocked_dates", [])
+        print(f"[WARNING] Could not fetch blocked dates: {res.status_code}")
+    except Exception as e:
+        print(f"[WARNING] Could not fetch blocked dates: {e}")
+    return []
+
+def fetch_scheduled_sessions():
+    """
+    Timetable sessions, or None when they cannot be read (no backend token,
+    unauthorised or unreachable), so callers do not take "no sessions" for
+    "no conflicts"
+    """
+    if not BACKEND_API_TOKEN:
+        print("[WARNING] BACKEND_API_TOKEN is not set; doctors' booked sessions are not checked for conflicts")
+        return None
+    try:
+        res = requests.get(
+            f"{API_BASE_URL}/api/scheduling/timetable",
+            headers={"Authorization": f"Bearer {BACKEND_API_TOKEN}"},
+            timeout=10,
+        )
+        if res.status_code == 200:
+            return res.json()
+        if res.status_code in (401, 403):
+            print(f"[WARNING] Timetable fetch unauthorised ({res.status_code}); check BACKEND_API_TOKEN. "
+                  "Doctors' booked sessions are not checked for conflicts")
+        else:
+            print(f"[WARNING] Could not fetch timetable: {res.status_code}")
+    except Exception as e:
+        print(f"[WARNING] Could not fetch timetable: {e}")
+    return None
+    try:
+        res = requests.get(
+            f"{API_BASE_URL}/api/scheduling/timetable",
+            headers={"Authorization": f"Bearer {BACKEND_API_TOKEN}"},
+            timeout=10,
+        )
+        if res.status_code == 200:
+            return res.json()
+        print(f"[WARNING] Could not fetch timetable: {res.status_code}")
+    except Exception as e:
+        print(f"[WARNING] Could not fetch timetable: {e}")
+    return []
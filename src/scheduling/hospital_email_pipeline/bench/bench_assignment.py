@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PIPELINE_DIR)
+from scheduler.assignment import MaxSessionsPerDoctor, NoBlockedDates, MatchSessionName, load_doctors, load_sessions, solve
+
+# Rough size of one academic year today
+BASE_DOCTORS = 300
+BASE_SESSIONS = 2000
+SLOTS_PER_REPLY = 8
+SESSION_NAMES = ["Cardio Tutorial", "Infectious Diseases Tutorial", "Renal Tutorial", "Geriatrics Tutorial", "Neuro Tutorial"]
+HOURS = [9, 11, 14, 16]
+
+
+def synthetic_year(scale, seed=0):
+    rng = random.Random(seed)
+    year_start = datetime(2025, 6, 2)
+    weekdays = [year_start + timedelta(days=d) for d in range(365) if (year_start + timedelta(days=d)).weekday() < 5]
+
+    blocked = [{"date": d.strftime("%Y-%m-%d"), "remark": "CBL Week"} for d in rng.sample(weekdays, 25)]
+
+    sessions = []
+    for i in range(BASE_SESSIONS * scale):
+        day = rng.choice(weekdays)
+        hour = rng.choice(HOURS)
+        sessions.append({
+            "id": i,
+            "session_name": rng.choice(SESSION_NAMES),
+            "date": day.strftime("%Y-%m-%d"),
+            "time": f"{hour}:00 - {hour + 2}:00",
+        })
+
+    availability = []
+    for i in range(BASE_DOCTORS * scale):
+        slots = []
+        for _ in range(SLOTS_PER_REPLY):
+            day = rng.choice(weekdays)
+            hour = rng.choice(HOURS)
+            slots.append(f"{day.day} {day.strftime('%B')} {day.year} {hour}:00 - {hour + 2}:00")
+        availability.append({
+            "type": "availability",
+            "from_name": f"Dr Synthetic {i}",
+            "from_email": f"dr.{i}@hospital.sg",
+            "session_name": rng.choice(SESSION_NAMES),
+            "available_slots_timings": slots,
+        })
+    return availability, sessions, blocked
+
+
+def check(assignments, sessions, blocked, limit):
+    seen_sessions = set()
+    per_doctor = {}
+    blocked_dates = {b["date"] for b in blocked}
+    for a in assignments:
+        assert a["session_id"] not in seen_sessions, "session assigned twice"
+        seen_sessions.add(a["session_id"])
+        per_doctor[a["doctor_email"]] = per_doctor.get(a["doctor_email"], 0) + 1
+        assert a["start"][:10] not in blocked_dates, "session on a blocked date"
+    assert all(n <= limit for n in per_doctor.values()), "doctor over the session cap"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the tutor assignment solver on synthetic data")
+    parser.add_argument("--scale", type=int, default=10, help="Multiple of today's yearly volume")
+    parser.add_argument("--max-per-doctor", type=int, default=4)
+    args = parser.parse_args()
+
+    availability, open_sessions, blocked = synthetic_year(args.scale)
+    print(f"[INFO] {len(availability)} replies, {len(open_sessions)} sessions, {len(blocked)} blocked dates")
+
+    started = time.perf_counter()
+    doctors = load_doctors(availability)
+    sessions = load_sessions(open_sessions)
+    parsed = time.perf_counter()
+
+    constraints = [MaxSessionsPerDoctor(args.max_per_doctor), NoBlockedDates(blocked), MatchSessionName()]
+    assignments, unassigned = solve(doctors, sessions, constraints)
+    solved = time.perf_counter()
+
+    check(assignments, sessions, blocked, args.max_per_doctor)
+    print(f"[OK] Assigned {len(assignments)}/{len(sessions)} sessions ({len(unassigned)} left open)")
+    print(f"[INFO] Parse: {parsed - started:.2f}s  Solve: {solved - parsed:.2f}s  Total: {solved - started:.2f}s")
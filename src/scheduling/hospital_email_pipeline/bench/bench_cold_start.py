@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PIPELINE_DIR)
+from bench.golden_benchmark import DEFAULT_CORPUS, load_corpus, to_message, percentile
+
+# Time-to-first-email after a restart. Each run is a fresh interpreter that
+# does what main.py does before its first email: import the LLM stack, load
+# the extraction model, and extract one golden email. The same runs are done
+# loading from the Hub cache (use_prepared: false) and from the snapshot
+# written by prepare_model.py. The page cache stays warm between runs, like
+# a respawn on the same host.
+#
+#   python prepare_model.py && python bench/bench_cold_start.py --runs 5
+#   python bench/bench_cold_start.py --model-id HuggingFaceTB/SmolLM2-135M-Instruct --prepare
+
+VARIANTS = {"hub": {"use_prepared": False}, "prepared": {"use_prepared": True}}
+
+CHILD = """
+import sys, time, json, contextlib, os
+started = time.perf_counter()
+sys.path.insert(0, {pipeline_dir!r})
+with contextlib.redirect_stdout(open(os.devnull, "w")):
+    from llm.llama_model import LlamaModel
+    imported = time.perf_counter()
+    model = LlamaModel(model_id={model_id!r}, overrides={overrides!r})
+    loaded = time.perf_counter()
+    model.generate({text!r})
+    done = time.perf_counter()
+print(json.dumps({{"import_s": imported - started, "load_s": loaded - imported, "first_email_s": done - loaded, "source": getattr(model.model, "name_or_path", "")}}))
+"""
+
+
+def run_once(model_id, overrides, text):
+    started = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD.format(pipeline_dir=PIPELINE_DIR, model_id=model_id, overrides=overrides, text=text)],
+        cwd=PIPELINE_DIR, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    lines = out.stdout.strip().splitlines()
+    if out.returncode != 0 or not lines:
+        raise RuntimeError((out.stderr or out.stdout).strip().splitlines()[-1] if (out.stderr or out.stdout).strip() else "child failed")
+    result = json.loads(lines[-1])
+    # Wall time includes interpreter start-up, which is what a respawn pays
+    result["time_to_first_email_s"] = wall
+    return result
+
+
+def summarise(variant, runs):
+    keys = ["import_s", "load_s", "first_email_s", "time_to_first_email_s"]
+    summary = {"variant": variant, "runs": len(runs)}
+    for key in keys:
+        values = [r[key] for r in runs]
+        summary[key + "_p50"] = percentile(values, 0.5)
+        summary[key + "_max"] = max(values)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time-to-first-email after a restart: Hub cache vs prepared snapshot")
+    parser.add_argument("--model-id", help="Override the llm_config.yaml model id")
+    parser.add_argument("--dtype", help="torch_dtype override (must match the prepared snapshot)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--variants", default="hub,prepared")
+    parser.add_argument("--prepare", action="store_true", help="Run prepare_model.py for the model first if needed")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--json", help="Write every run to this file")
+    args = parser.parse_args()
+
+    from processor.email_parser import extract_relevant_fields
+    text = extract_relevant_fields(to_message(load_corpus(args.corpus)[0]))["raw_text"]
+
+    if args.prepare:
+        command = [sys.executable, os.path.join(PIPELINE_DIR, "prepare_model.py")]
+        if args.model_id:
+            command += ["--model-id", args.model_id]
+        if args.dtype:
+            command += ["--dtype", args.dtype]
+        subprocess.run(command, cwd=PIPELINE_DIR, check=True)
+
+    print(f"\n{'variant':<10}{'runs':>5}{'import s':>10}{'load s':>9}{'first email s':>15}{'total p50 s':>13}{'total max s':>13}")
+    summaries, all_runs = [], {}
+    for variant in args.variants.split(","):
+        overrides = dict(VARIANTS[variant])
+        if args.dtype:
+            overrides["torch_dtype"] = args.dtype
+        try:
+            runs = [run_once(args.model_id, overrides, text) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{variant:<10}  ERROR: {e}")
+            continue
+        all_runs[variant] = runs
+        s = summarise(variant, runs)
+        summaries.append(s)
+        print(f"{variant:<10}{s['runs']:>5}{s['import_s_p50']:>10.2f}{s['load_s_p50']:>9.2f}{s['first_email_s_p50']:>15.2f}"
+              f"{s['time_to_first_email_s_p50']:>13.2f}{s['time_to_first_email_s_max']:>13.2f}", flush=True)
+
+    if len(summaries) == 2:
+        before, after = summaries[0]["time_to_first_email_s_p50"], summaries[1]["time_to_first_email_s_p50"]
+        print(f"\n[OK] {summaries[1]['variant']} vs {summaries[0]['variant']}: {before - after:+.2f}s ({before / after:.2f}x)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"model_id": args.model_id, "summaries": summaries, "runs": all_runs}, f, indent=2)
+        print(f"[OK] Results written to {args.json}")
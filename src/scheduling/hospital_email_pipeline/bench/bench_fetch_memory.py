@@ -0,0 +1,69 @@
+import os
+import sys
+import gc
+import argparse
+import tracemalloc
+import contextlib
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PIPELINE_DIR)
+from bench.stub_servers import MailboxGraph
+from bench.synthetic_mail import SyntheticMail
+
+# Peak Python memory of one unread poll (get_emails) against a stub mailbox
+# holding a term-start backlog, with realistic Outlook-sized HTML bodies.
+# Streaming pages into EmailRecords should keep the peak close to the size
+# of the records kept, rather than growing with the raw HTML of the page.
+#
+#   python bench/bench_fetch_memory.py --unread 500,2000,5000
+
+# Outlook wraps a short message in a lot of markup
+OUTLOOK_PADDING = "<div style='font-family:Calibri,sans-serif;font-size:11pt;color:#1F497D'>&nbsp;</div>" * 60
+
+
+def padded(message):
+    body = message["body"]["content"].replace("<body>", "<body>" + OUTLOOK_PADDING)
+    return dict(message, body={"contentType": "html", "content": body})
+
+
+def measure(unread, page_size):
+    import graph_api.fetch_emails as fetch_emails
+    import bs4  # imported lazily by the pipeline; keep it out of the measurement
+
+    mailbox = MailboxGraph()
+    generator = SyntheticMail(seed=unread)
+    raw_bytes = 0
+    for _ in range(unread):
+        message = padded(generator.next()[0])
+        raw_bytes += len(message["body"]["content"])
+        mailbox.deliver(message)
+    server = mailbox.server()
+    fetch_emails.GRAPH_BASE_URL = server.start() + "/v1.0"
+    fetch_emails.PAGE_SIZE = page_size
+
+    quiet = open(os.devnull, "w")
+    try:
+        gc.collect()
+        tracemalloc.start()
+        with contextlib.redirect_stdout(quiet):
+            emails = fetch_emails.get_emails("bench-token")
+        kept, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        quiet.close()
+        server.stop()
+    return {"unread": unread, "fetched": len(emails), "html_mb": raw_bytes / 2 ** 20,
+            "kept_mb": kept / 2 ** 20, "peak_mb": peak / 2 ** 20}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peak memory of an unread poll against a large stub backlog")
+    parser.add_argument("--unread", default="500,2000,5000", help="Comma-separated backlog sizes")
+    parser.add_argument("--page-size", type=int, default=50, help="$top per Graph page")
+    args = parser.parse_args()
+
+    print(f"{'unread':>8}{'fetched':>9}{'HTML MB':>10}{'kept MB':>10}{'peak MB':>10}{'peak-kept':>11}")
+    for unread in (int(n) for n in args.unread.split(",")):
+        r = measure(unread, args.page_size)
+        print(f"{r['unread']:>8}{r['fetched']:>9}{r['html_mb']:>10.1f}{r['kept_mb']:>10.1f}{r['peak_mb']:>10.1f}"
+              f"{r['peak_mb'] - r['kept_mb']:>11.1f}", flush=True)
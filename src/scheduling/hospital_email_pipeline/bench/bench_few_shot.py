@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import argparse
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PIPELINE_DIR)
+from bench.golden_benchmark import load_corpus, to_message, percentile, DEFAULT_CORPUS
+
+# Prompt size and retrieval quality of the few-shot prompter, without a
+# model: for every golden email, the static system_prompt against core_prompt
+# with the k nearest bank examples. Tokens are counted with the model's
+# tokenizer when transformers and the tokenizer are available, else
+# estimated at 4 characters per token. Retrieval is scored by whether the
+# examples share the golden email's type. Accuracy and prefill time need the
+# model: python bench/golden_benchmark.py --prompt default,retrieved
+#
+#   python bench/bench_few_shot.py --k 1,2,3
+#   python bench/bench_few_shot.py --tokenizer meta-llama/Llama-3.2-3B-Instruct
+
+
+def token_counter(model_id):
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(model_id, trust_remote_code=True)
+    except Exception as e:
+        print(f"[WARNING] No tokenizer for {model_id} ({type(e).__name__}); estimating 4 characters per token")
+        return lambda text: len(text) / 4, "est."
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False)), "tokens"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prompt tokens and retrieval quality of few-shot prompts on the golden corpus")
+    parser.add_argument("--k", default="1,2,3", help="Comma-separated numbers of retrieved examples")
+    parser.add_argument("--tokenizer", help="Count tokens with this tokenizer (default: llm_config.yaml model_id)")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    args = parser.parse_args()
+
+    import yaml
+    from processor.email_parser import extract_relevant_fields
+    from llm.few_shot import ExampleBank, FewShotPrompter
+
+    with open(os.path.join(PIPELINE_DIR, "config", "llm_config.yaml"), "r") as f:
+        config = yaml.safe_load(f)
+    count, unit = token_counter(args.tokenizer or config["model_id"])
+
+    cases = load_corpus(args.corpus)
+    texts = [extract_relevant_fields(to_message(c))["raw_text"] for c in cases]
+    started = time.perf_counter()
+    bank = ExampleBank(config["few_shot_bank"])
+    print(f"[INFO] {len(bank.examples)} bank examples, index {bank.cache_path} ({time.perf_counter() - started:.3f}s)")
+    bodies = {e["body"].strip() for e in bank.examples}
+    overlap = [c["id"] for c in cases if c["body"].strip() in bodies]
+    if overlap:
+        print(f"[WARNING] Golden emails also in the bank (retrieval finds their answer): {', '.join(overlap)}")
+
+    static = count(config["system_prompt"])
+    print(f"\n{'prompt':<14}{unit:>8}{'vs static':>11}{'top type':>10}{'any type':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    print(f"{'static':<14}{static:>8.0f}{'':>11}{'':>10}{'':>10}{'':>9}{'':>9}")
+    for k in (int(v) for v in args.k.split(",")):
+        prompter = FewShotPrompter(config["core_prompt"], bank, k)
+        sizes, latencies, top_type, any_type = [], [], 0, 0
+        for case, text in zip(cases, texts):
+            t0 = time.perf_counter()
+            prompt = prompter.system_prompt(text)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            sizes.append(count(prompt))
+            types = [e["output"]["type"] for _, e in bank.nearest(text, k)]
+            top_type += types[0] == case["expected"]["type"]
+            any_type += case["expected"]["type"] in types
+        mean = sum(sizes) / len(sizes)
+        n = len(cases)
+        print(f"{f'retrieved:{k}':<14}{mean:>8.0f}{mean / static - 1:>+11.0%}{top_type / n:>10.0%}{any_type / n:>10.0%}"
+              f"{percentile(latencies, 0.5):>9.3f}{percentile(latencies, 0.99):>9.3f}")
@@ -0,0 +1,111 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PIPELINE_DIR)
+from bench.synthetic_mail import SyntheticMail
+
+# Near-duplicate index at mailbox scale: fills an index with synthetic emails
+# (one template per kind, so the worst case for LSH buckets), then looks up
+# forwards, lightly edited resends and fresh emails. Reports lookup latency
+# (signature included and index only) and how often each kind is detected
+# and reused. Fails when a p99 index lookup exceeds --budget-ms.
+#
+#   python bench/bench_near_duplicates.py --stored 50000 --queries 500
+
+FORWARD = "From: {name} <{addr}>\nTo: Colleague <colleague@hospital.sg>\nSubject: FW: {subject}\n\n" \
+          "Hi, please see below.\n\n---------- Forwarded message ---------\n{text}"
+EDITS = [("following", "folowing"), ("Hi,", "Hello,"), ("Regards", "Best regards"), ("Dear team", "Dear all")]
+
+
+def raw_text(message):
+    from processor.email_parser import extract_relevant_fields
+    return extract_relevant_fields(message)["raw_text"]
+
+
+def forwarded(message):
+    return FORWARD.format(name="Med Admin", addr="med-admin@hospital.sg", subject=message["subject"], text=raw_text(message))
+
+
+def edited(message, rng):
+    text = raw_text(message)
+    for old, new in rng.sample(EDITS, 2):
+        text = text.replace(old, new)
+    return text
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency and recall of the near-duplicate index")
+    parser.add_argument("--stored", type=int, default=50000, help="Emails in the index before querying")
+    parser.add_argument("--queries", type=int, default=500, help="Lookups per query kind")
+    parser.add_argument("--threshold", type=float, help="Override NEAR_DUPLICATE_THRESHOLD")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--budget-ms", type=float, default=1.0, help="Allowed p99 index lookup time")
+    args = parser.parse_args()
+
+    from processor.near_duplicates import NearDuplicateIndex, THRESHOLD, fingerprint
+
+    rng = random.Random(args.seed)
+    generator = SyntheticMail(seed=args.seed)
+    path = os.path.join(tempfile.mkdtemp(prefix="near-dup-"), "index.db")
+    index = NearDuplicateIndex(path=path, threshold=args.threshold or THRESHOLD)
+
+    stored = []
+    started = time.perf_counter()
+    for i in range(args.stored):
+        message, expected = generator.next()
+        index.add(message["id"], raw_text(message), expected or {})
+        if len(stored) < args.queries:
+            stored.append(message)
+    print(f"[INFO] Indexed {len(index)} emails in {time.perf_counter() - started:.1f}s (threshold {index.threshold})")
+
+    started = time.perf_counter()
+    NearDuplicateIndex(path=path, threshold=index.threshold)
+    print(f"[INFO] Reloaded the index in {time.perf_counter() - started:.2f}s")
+
+    fresh, fresh_noise = [], []
+    while len(fresh) < args.queries or len(fresh_noise) < args.queries // 4:
+        message, expected = generator.next()
+        (fresh if expected else fresh_noise).append(message)
+    kinds = {
+        "exact resend": [raw_text(m) for m in stored],
+        "forward": [forwarded(m) for m in stored],
+        "edited resend": [edited(m, rng) for m in stored],
+        "fresh email": [raw_text(m) for m in fresh[:args.queries]],
+        "fresh notice": [raw_text(m) for m in fresh_noise[:args.queries // 4]],
+    }
+
+    print(f"\n{'query':<15}{'found':>8}{'reused':>8}{'total p50 ms':>14}{'p99 ms':>9}{'index p50 ms':>14}{'p99 ms':>9}")
+    over_budget = []
+    for kind, texts in kinds.items():
+        total, lookups, found, reused = [], [], 0, 0
+        for text in texts:
+            t0 = time.perf_counter()
+            sig, salient_text = fingerprint(text)
+            t1 = time.perf_counter()
+            match = index._lookup(sig, salient_text)
+            t2 = time.perf_counter()
+            total.append((t2 - t0) * 1000)
+            lookups.append((t2 - t1) * 1000)
+            found += match is not None
+            reused += bool(match and match.reusable)
+        n = len(texts)
+        print(f"{kind:<15}{found / n:>8.0%}{reused / n:>8.0%}{percentile(total, 0.5):>14.3f}{percentile(total, 0.99):>9.3f}"
+              f"{percentile(lookups, 0.5):>14.3f}{percentile(lookups, 0.99):>9.3f}")
+        if percentile(lookups, 0.99) > args.budget_ms:
+            over_budget.append(kind)
+    print("\nA found fresh email is a new tutor email close to a stored one (all synthetic ones share a template); it is"
+          " only reused when its dates, times, negations and subject match. Notices repeat verbatim, so reusing them is correct.")
+    if over_budget:
+        print(f"[FAIL] p99 index lookup over {args.budget_ms} ms for: {', '.join(over_budget)}")
+        sys.exit(1)
+    print(f"[OK] p99 index lookup within {args.budget_ms} ms for every query kind")
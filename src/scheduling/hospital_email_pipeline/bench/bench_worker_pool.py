@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PIPELINE_DIR)
+from bench.golden_benchmark import DEFAULT_CORPUS, load_corpus, to_message
+
+# Throughput of the multi-process inference pool as workers are added. For
+# each worker count a fresh pool is started, warmed up on one email per
+# worker, then fed the golden corpus (cycled) all at once. Memory is reported
+# both as summed RSS and summed PSS: with mmap'd weights the shared pages are
+# counted once in PSS, so PSS stays close to one model while RSS multiplies.
+#
+#   python bench/bench_worker_pool.py --workers 1,2,4 --emails 40
+#   python bench/bench_worker_pool.py --model-id HuggingFaceTB/SmolLM2-135M-Instruct --json pool.json
+
+
+def memory_mb(pid):
+    """(rss, pss) of one process in MB from smaps_rollup; (None, None) where unavailable"""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if parts[0] in ("Rss:", "Pss:"):
+                    values[parts[0][:-1]] = int(parts[1]) / 1024
+    except OSError:
+        return None, None
+    return values.get("Rss"), values.get("Pss")
+
+
+def run_pool(workers, texts, model_id, overrides):
+    from llm.worker_pool import WorkerPool
+
+    started = time.perf_counter()
+    pool = WorkerPool(workers, model_id=model_id, overrides=overrides)
+    start_seconds = time.perf_counter() - started
+    try:
+        pool.map(texts[:workers])
+
+        started = time.perf_counter()
+        outputs = pool.map(texts)
+        elapsed = time.perf_counter() - started
+
+        memory = [memory_mb(pid) for pid in pool.pids]
+    finally:
+        pool.close()
+
+    rss = [r for r, _ in memory if r is not None]
+    pss = [p for _, p in memory if p is not None]
+    return {
+        "workers": workers,
+        "cores_per_worker": len(pool.core_sets[0]),
+        "emails": len(texts),
+        "empty_outputs": sum(1 for o in outputs if not o.strip()),
+        "seconds": elapsed,
+        "emails_per_minute": len(texts) / elapsed * 60 if elapsed else None,
+        "start_seconds": start_seconds,
+        "max_load_seconds": max(pool.load_seconds),
+        "rss_mb_total": sum(rss) if rss else None,
+        "pss_mb_total": sum(pss) if pss else None,
+    }
+
+
+def _fmt(value, spec):
+    if isinstance(value, (int, float)):
+        return format(value, spec)
+    return "-".rjust(int(spec.split(".")[0] or 0))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emails/minute of the inference worker pool as workers are added")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--emails", type=int, default=40, help="Emails per run (the golden corpus is cycled)")
+    parser.add_argument("--model-id", help="Override the llm_config.yaml model id")
+    parser.add_argument("--dtype", default=None, help="torch_dtype override (the mmap'd snapshot should already be in it)")
+    parser.add_argument("--max-new-tokens", type=int, default=None)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    from processor.email_parser import extract_relevant_fields
+
+    cases = load_corpus(args.corpus)
+    texts = [extract_relevant_fields(to_message(c))["raw_text"] for c in itertools.islice(itertools.cycle(cases), args.emails)]
+    overrides = {key: value for key, value in (("torch_dtype", args.dtype), ("max_new_tokens", args.max_new_tokens)) if value}
+    counts = [int(w) for w in args.workers.split(",") if w.strip()]
+    print(f"[INFO] {args.emails} emails per run, worker counts: {', '.join(map(str, counts))}, CPUs: {os.cpu_count()}\n")
+
+    header = f"{'workers':>7}{'cores':>7}{'emails/min':>12}{'speedup':>9}{'eff':>7}{'load s':>8}{'RSS MB':>9}{'PSS MB':>9}"
+    print(header)
+    print("-" * len(header))
+    results = []
+    for workers in counts:
+        result = run_pool(workers, texts, args.model_id, overrides)
+        baseline = results[0]["emails_per_minute"] if results else result["emails_per_minute"]
+        base_workers = results[0]["workers"] if results else workers
+        result["speedup"] = result["emails_per_minute"] / baseline if baseline else None
+        result["efficiency"] = result["speedup"] / (workers / base_workers) if result["speedup"] else None
+        results.append(result)
+        print(f"{workers:>7}{result['cores_per_worker']:>7}{_fmt(result['emails_per_minute'], '12.1f')}"
+              f"{_fmt(result['speedup'], '8.2f')}x{_fmt(result['efficiency'], '7.0%')}{_fmt(result['max_load_seconds'], '8.1f')}"
+              f"{_fmt(result['rss_mb_total'], '9.0f')}{_fmt(result['pss_mb_total'], '9.0f')}", flush=True)
+        if result["empty_outputs"]:
+            print(f"[WARNING] {result['empty_outputs']} empty outputs with {workers} workers (see worker errors above)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"model_id": args.model_id, "results": results}, f, indent=2)
+        print(f"\n[OK] Results written to {args.json}")
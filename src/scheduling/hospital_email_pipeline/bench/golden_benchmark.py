@@ -0,0 +1,328 @@
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import contextlib
+import subprocess
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PIPELINE_DIR)
+
+# Headless accuracy/latency benchmark for extraction configs. Every
+# combination of the grid flags is run over the golden corpus (anonymised
+# emails with the JSON the backend should receive), each in its own process
+# so peak RSS is per config.
+#
+#   python bench/golden_benchmark.py --model-id oracle            # harness self-check, no model
+#   python bench/golden_benchmark.py --dtype float32,bfloat16 --batch-size 1,4
+#   python bench/golden_benchmark.py --prompt default,compact --max-new-tokens 256,500 --json results.json
+#   python bench/golden_benchmark.py --prompt default,retrieved,retrieved:3    # few-shot examples picked per email
+#   python bench/golden_benchmark.py --draft-model-id none,meta-llama/Llama-3.2-1B-Instruct   # speculative decoding
+#   python bench/golden_benchmark.py --cpu-optimised false,true                # bf16/SDPA/torch.compile on CPU
+#   python bench/golden_benchmark.py --model-id HuggingFaceTB/SmolLM2-135M-Instruct --cpu-optimised false,true
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+DEFAULT_CORPUS = os.path.join(GOLDEN_DIR, "corpus.jsonl")
+PROMPTS_DIR = os.path.join(GOLDEN_DIR, "prompts")
+
+# from_name/from_email/to_email are overwritten from the headers, so they are not scored
+FIELDS = ["type", "session_name", "original_session", "new_session", "reason", "students", "available_slots_timings", "notes"]
+GRID = ["model_id", "torch_dtype", "quantization", "batch_size", "prompt", "max_new_tokens", "draft_model_id", "cpu_optimised"]
+
+
+def load_corpus(path=DEFAULT_CORPUS):
+    cases = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                cases.append(json.loads(line))
+    return cases
+
+
+def to_message(case):
+    """Graph-shaped message so the prompt goes through extract_relevant_fields like in production"""
+    html = "<html><body>" + "".join(f"<p>{line}</p>" for line in case["body"].split("\n")) + "</body></html>"
+    return {
+        "id": case["id"],
+        "subject": case["subject"],
+        "from": {"emailAddress": {"name": case["from_name"], "address": case["from_email"]}},
+        "toRecipients": [{"emailAddress": {"name": case["to_name"], "address": case["to_email"]}}],
+        "body": {"contentType": "html", "content": html},
+    }
+
+
+def resolve_prompt(variant):
+    """
+    Config overrides for a prompt variant: default keeps llm_config.yaml,
+    retrieved[:k] uses core_prompt with the k (default 2) most similar bank
+    examples, anything else is a name in golden/prompts or a file path used
+    as a static system_prompt.
+    """
+    if not variant or variant == "default":
+        return {}
+    if variant.split(":")[0] == "retrieved":
+        return {"few_shot_k": int(variant.split(":")[1]) if ":" in variant else 2}
+    path = variant if os.path.exists(variant) else os.path.join(PROMPTS_DIR, f"{variant}.txt")
+    with open(path, "r", encoding="utf-8") as f:
+        return {"system_prompt": f.read(), "few_shot_k": 0}
+
+
+def _normalise(value):
+    if value is None:
+        return ""
+    text = str(value).strip().lower()
+    if text in ("null", "none", "n/a"):
+        return ""
+    return " ".join("".join(ch if ch.isalnum() or ch in ":-" else " " for ch in text).split())
+
+
+def field_matches(field, got, expected):
+    if field == "available_slots_timings":
+        return sorted(_normalise(v) for v in got or []) == sorted(_normalise(v) for v in expected or [])
+    got, expected = _normalise(got), _normalise(expected)
+    if field == "type" or not expected or not got:
+        return got == expected
+    # Free-text fields: accept a faithful substring either way ("family emergency" vs "a family emergency")
+    return got == expected or got in expected or expected in got
+
+
+def score(cases, parsed):
+    per_field = {field: 0 for field in FIELDS}
+    exact = 0
+    details = []
+    for case, data in zip(cases, parsed):
+        wrong = [f for f in FIELDS if data is None or not field_matches(f, data.get(f), case["expected"].get(f))]
+        for field in FIELDS:
+            if field not in wrong:
+                per_field[field] += 1
+        exact += not wrong
+        details.append({"id": case["id"], "parsed": data is not None, "wrong_fields": wrong})
+    n = len(cases) or 1
+    return {
+        "field_accuracy": {field: hits / n for field, hits in per_field.items()},
+        "mean_field_accuracy": sum(per_field.values()) / (n * len(FIELDS)),
+        "exact_match": exact / n,
+        "json_parse_rate": sum(d["parsed"] for d in details) / n,
+        "cases": details,
+    }
+
+
+class OracleModel:
+    """Answers with the golden JSON; checks the harness and scoring without a model"""
+
+    model_id = "oracle"
+
+    def __init__(self, cases):
+        from processor.email_parser import extract_relevant_fields
+        self.answers = {extract_relevant_fields(to_message(c))["raw_text"]: json.dumps(c["expected"]) for c in cases}
+
+    def generate(self, email_text):
+        return self.answers.get(email_text, "")
+
+    def generate_batch(self, email_texts):
+        return [self.generate(text) for text in email_texts]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] if ordered else None
+
+
+def peak_rss_mb():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_config(config, corpus_path):
+    """Run one config in this process and return its report"""
+    from processor.email_parser import extract_relevant_fields
+    from processor.pipeline import parse_model_output
+    from utils.metrics import TOKENS_IN, TOKENS_OUT, SPECULATIVE_TOKENS
+
+    cases = load_corpus(corpus_path)
+    fields = [extract_relevant_fields(to_message(c)) for c in cases]
+    quiet = open(os.devnull, "w")
+
+    load_started = time.perf_counter()
+    with contextlib.redirect_stdout(quiet):
+        if config["model_id"] == "oracle":
+            model = OracleModel(cases)
+        else:
+            from llm.llama_model import LlamaModel
+            overrides = {
+                "torch_dtype": config["torch_dtype"],
+                "quantization": config["quantization"],
+                "max_new_tokens": config["max_new_tokens"],
+            }
+            if config.get("cpu_optimised", "config") != "config":
+                overrides["cpu_optimised"] = config["cpu_optimised"] == "true"
+            if config.get("draft_model_id", "config") != "config":
+                overrides["draft_model_id"] = None if config["draft_model_id"] == "none" else config["draft_model_id"]
+            overrides.update(resolve_prompt(config["prompt"]))
+            model = LlamaModel(model_id=None if config["model_id"] == "config" else config["model_id"], overrides=overrides)
+            # Warm-up so one-off allocation is not billed to the first email
+            model.generate(fields[0]["raw_text"])
+    load_seconds = time.perf_counter() - load_started
+
+    batch_size = max(1, config["batch_size"])
+    outputs, latencies = [], []
+    tokens_before = TOKENS_OUT.value()
+    prompt_tokens_before = TOKENS_IN.value()
+    accepted_before = SPECULATIVE_TOKENS.value(result="accepted")
+    proposed_before = SPECULATIVE_TOKENS.value(result="proposed")
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(quiet):
+        for i in range(0, len(fields), batch_size):
+            texts = [f["raw_text"] for f in fields[i:i + batch_size]]
+            batch_started = time.perf_counter()
+            if batch_size == 1:
+                results = [model.generate(texts[0])]
+            else:
+                results = model.generate_batch(texts)
+            elapsed_ms = (time.perf_counter() - batch_started) * 1000
+            outputs.extend(r.strip() for r in results)
+            # Every email in a batch waits for the whole batch
+            latencies.extend([elapsed_ms] * len(texts))
+    total_seconds = time.perf_counter() - started
+    generated = TOKENS_OUT.value() - tokens_before
+    prompt_tokens = TOKENS_IN.value() - prompt_tokens_before
+    proposed = SPECULATIVE_TOKENS.value(result="proposed") - proposed_before
+    accepted = SPECULATIVE_TOKENS.value(result="accepted") - accepted_before
+
+    parsed = []
+    with contextlib.redirect_stdout(quiet):
+        for output, f in zip(outputs, fields):
+            try:
+                parsed.append(parse_model_output(output, f))
+            except (json.JSONDecodeError, AttributeError, TypeError):
+                parsed.append(None)
+    quiet.close()
+
+    report = dict(config)
+    report.update(score(cases, parsed))
+    report.update({
+        "emails": len(cases),
+        "load_seconds": load_seconds,
+        "latency_p50_ms": percentile(latencies, 0.5),
+        "latency_p95_ms": percentile(latencies, 0.95),
+        "emails_per_minute": len(cases) / total_seconds * 60 if total_seconds else None,
+        "tokens_per_second": generated / total_seconds if total_seconds and generated else None,
+        "prompt_tokens_per_email": prompt_tokens / len(cases) if prompt_tokens else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "draft_model": getattr(model, "draft_model_id", None),
+        "cpu_optimisations": getattr(model, "cpu_optimisations", None),
+        "acceptance_rate": accepted / proposed if proposed else None,
+        "latencies_ms": latencies,
+        "outputs": outputs,
+    })
+    return report
+
+
+def run_isolated(config, corpus_path):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--single", json.dumps(config), "--corpus", corpus_path],
+        capture_output=True, text=True,
+    )
+    lines = out.stdout.strip().splitlines()
+    if out.returncode != 0 or not lines:
+        return dict(config, error=(out.stderr or out.stdout).strip()[-2000:])
+    return json.loads(lines[-1])
+
+
+def is_plain(report):
+    """No draft model and no CPU optimisations in effect"""
+    return not report.get("draft_model") and not report.get("cpu_optimisations")
+
+
+def compare_to_plain(reports):
+    """
+    Pair every assisted or CPU-optimised run with the run that differs only
+    by having neither, and add the per-email speedup and how many outputs
+    are identical (all of them for assisted greedy decoding; bfloat16 may
+    change a few).
+    """
+    for report in reports:
+        if is_plain(report) or "error" in report:
+            continue
+        key = {k: report[k] for k in GRID if k not in ("draft_model_id", "cpu_optimised")}
+        plain = next((r for r in reports if is_plain(r) and "error" not in r
+                      and all(r[k] == v for k, v in key.items())), None)
+        if plain is None:
+            continue
+        ratios = [p / a for p, a in zip(plain["latencies_ms"], report["latencies_ms"]) if a]
+        report["speedup_vs_plain"] = sum(ratios) / len(ratios) if ratios else None
+        report["identical_outputs"] = sum(a == b for a, b in zip(plain["outputs"], report["outputs"])) / len(report["outputs"])
+
+
+def _fmt(value, spec):
+    if isinstance(value, (int, float)):
+        return format(value, spec)
+    return "-".rjust(int(spec.split(".")[0] or 0))
+
+
+def print_table(reports):
+    header = (f"{'model':<28}{'dtype':<10}{'quant':<14}{'bs':>3} {'prompt':<10}{'max_new':>8} {'draft':<18}{'acc':>7}{'exact':>7}{'json':>6}"
+              f"{'p50 ms':>10}{'p95 ms':>10}{'tok/s':>8}{'prompt':>8}{'RSS MB':>8}{'accept':>8}{'cpu opt':>20}{'speedup':>8}{'same':>6}")
+    print(header)
+    print("-" * len(header))
+    for r in reports:
+        row = (f"{str(r['model_id'])[-27:]:<28}{str(r['torch_dtype']):<10}{str(r['quantization']):<14}{r['batch_size']:>3} {str(r['prompt'])[:9]:<10}"
+               f"{r['max_new_tokens']:>8} {str(r.get('draft_model') or 'none')[-17:]:<18}")
+        if "error" in r:
+            print(row + "  ERROR: " + r["error"].splitlines()[-1][:80])
+            continue
+        print(row + f"{_fmt(r['mean_field_accuracy'], '7.1%')}{_fmt(r['exact_match'], '7.1%')}{_fmt(r['json_parse_rate'], '6.0%')}"
+              f"{_fmt(r['latency_p50_ms'], '10.0f')}{_fmt(r['latency_p95_ms'], '10.0f')}{_fmt(r['tokens_per_second'], '8.1f')}{_fmt(r.get('prompt_tokens_per_email'), '8.0f')}{_fmt(r['peak_rss_mb'], '8.0f')}"
+              f"{_fmt(r.get('acceptance_rate'), '8.0%')}{','.join(r.get('cpu_optimisations') or []) or '-':>20}"
+              f"{_fmt(r.get('speedup_vs_plain'), '7.2f')}{'x' if r.get('speedup_vs_plain') else ' '}"
+              f"{_fmt(r.get('identical_outputs'), '6.0%')}")
+
+
+def _split(value, cast=str):
+    return [cast(v.strip()) for v in value.split(",") if v.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Field accuracy and latency of extraction configs on the golden corpus")
+    parser.add_argument("--model-id", default="config", help="Comma-separated model ids; 'config' uses llm_config.yaml, 'oracle' the golden answers")
+    parser.add_argument("--dtype", default="auto", help="Comma-separated torch dtypes (auto, float32, float16, bfloat16)")
+    parser.add_argument("--quantization", default="none", help="Comma-separated: none, dynamic_int8, bnb_8bit, bnb_4bit")
+    parser.add_argument("--batch-size", default="1", help="Comma-separated batch sizes")
+    parser.add_argument("--prompt", default="default",
+                        help="Comma-separated prompt variants (default, retrieved[:k], a name in golden/prompts, or a path)")
+    parser.add_argument("--max-new-tokens", default="500", help="Comma-separated max_new_tokens values")
+    parser.add_argument("--draft-model-id", default="config",
+                        help="Comma-separated draft models for speculative decoding; 'none' disables, 'config' uses llm_config.yaml")
+    parser.add_argument("--cpu-optimised", default="config",
+                        help="Comma-separated: true, false, or 'config' for llm_config.yaml's cpu_optimised")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--json", help="Write the full reports (including per-case results) to this file")
+    parser.add_argument("--no-isolate", action="store_true", help="Run every config in this process (peak RSS becomes cumulative)")
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_config(json.loads(args.single), args.corpus)))
+        sys.exit(0)
+
+    grid = itertools.product(
+        _split(args.model_id), _split(args.dtype), _split(args.quantization),
+        _split(args.batch_size, int), _split(args.prompt), _split(args.max_new_tokens, int), _split(args.draft_model_id),
+        _split(args.cpu_optimised),
+    )
+    configs = [dict(zip(GRID, values)) for values in grid]
+    print(f"[INFO] {len(configs)} configs over {len(load_corpus(args.corpus))} golden emails\n")
+
+    reports = []
+    for config in configs:
+        report = run_config(config, args.corpus) if args.no_isolate else run_isolated(config, args.corpus)
+        reports.append(report)
+    compare_to_plain(reports)
+    print_table(reports)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"\n[OK] Reports written to {args.json}")
@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import contextlib
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PIPELINE_DIR)
+from bench.stub_servers import MailboxGraph, ReplayBackend
+from bench.synthetic_mail import SyntheticMail
+
+# Capacity test for the monitor: synthetic tutor emails arrive in a stub
+# Graph mailbox at a Poisson rate while the monitor loop (same code path as
+# main.py) polls, extracts, posts and marks them read. For each arrival rate
+# the backlog, arrival-to-read latency and RSS are sampled, and the highest
+# rate whose backlog stays flat is reported as sustainable.
+#
+#   python bench/load_test.py --model synthetic --model-ms 8000 --rates 2,4,6,8
+#   python bench/load_test.py --model config --find --duration 600
+
+DEFAULT_TINY_MODEL = "HuggingFaceTB/SmolLM2-135M-Instruct"
+
+
+class SyntheticModel:
+    """Answers with the generator's expected JSON after a fixed think time"""
+
+    def __init__(self, delay_ms=0):
+        self.delay = delay_ms / 1000.0
+        self.answers = {}
+        self.model_id = f"synthetic({delay_ms:g} ms)"
+
+    def register(self, message, expected):
+        from processor.email_parser import extract_relevant_fields
+        from utils.trace import text_digest
+        if expected is not None:
+            self.answers[text_digest(extract_relevant_fields(message)["raw_text"])] = json.dumps(expected)
+
+    def generate(self, email_text):
+        from utils.trace import text_digest
+        if self.delay:
+            time.sleep(self.delay)
+        return self.answers.get(text_digest(email_text), "")
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def slope_per_minute(samples):
+    """Least-squares slope of (seconds, value) samples, per minute"""
+    if len(samples) < 2:
+        return 0.0
+    n = len(samples)
+    mean_t = sum(t for t, _ in samples) / n
+    mean_v = sum(v for _, v in samples) / n
+    var = sum((t - mean_t) ** 2 for t, _ in samples)
+    if not var:
+        return 0.0
+    return sum((t - mean_t) * (v - mean_v) for t, v in samples) / var * 60
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def run_rate(rate, args, model, seed):
+    import graph_api.fetch_emails as fetch_emails
+    import graph_api.mark_as_read as mark_as_read
+    import api.send_to_backend as send_to_backend
+    from processor.email_parser import should_process_email
+    from processor.pipeline import process_email
+    from processor.slot_intervals import ConflictChecker
+
+    mailbox = MailboxGraph()
+    backend = ReplayBackend()
+    graph_server = mailbox.server(args.graph_latency_ms)
+    backend_server = backend.server(args.backend_latency_ms)
+    graph_url = graph_server.start() + "/v1.0"
+    fetch_emails.GRAPH_BASE_URL = mark_as_read.GRAPH_BASE_URL = graph_url
+    send_to_backend.API_BASE_URL = backend_server.start()
+    checker = ConflictChecker()
+
+    generator = SyntheticMail(seed=seed)
+    rng = random.Random(seed)
+    stop = threading.Event()
+    arrivals = [0]
+    samples = []
+
+    def arrive():
+        while not stop.wait(rng.expovariate(rate / 60.0)):
+            message, expected = generator.next()
+            if isinstance(model, SyntheticModel):
+                model.register(message, expected)
+            mailbox.deliver(message)
+            arrivals[0] += 1
+
+    started = time.time()
+
+    def sample():
+        while not stop.wait(args.sample_seconds):
+            backlog = len(mailbox.unread(should_process_email))
+            samples.append({"t": round(time.time() - started, 2), "backlog": backlog, "rss_mb": round(rss_mb(), 1)})
+
+    threads = [threading.Thread(target=arrive, daemon=True), threading.Thread(target=sample, daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    processed = {}
+    quiet = open(os.devnull, "w")
+    try:
+        while time.time() - started < args.duration:
+            with contextlib.redirect_stdout(quiet):
+                emails = fetch_emails.get_emails("load-test-token") or []
+                for email in emails:
+                    if should_process_email(email):
+                        result = process_email(email, model, checker, "load-test-token")
+                        processed[result] = processed.get(result, 0) + 1
+            time.sleep(args.poll_seconds)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        quiet.close()
+        graph_server.stop()
+        backend_server.stop()
+
+    elapsed = time.time() - started
+    latencies = mailbox.read_latencies()
+    # Judge the trend on the second half, once the first polls have settled
+    tail = [(s["t"], s["backlog"]) for s in samples if s["t"] >= elapsed / 2]
+    growth = slope_per_minute(tail)
+    p95 = percentile(latencies, 0.95)
+    final_backlog = samples[-1]["backlog"] if samples else 0
+    tail_backlog = sum(v for _, v in tail) / len(tail) if tail else 0.0
+    # A few emails waiting for the next poll is normal; a pile that stays or grows is not
+    sustainable = tail_backlog <= args.backlog_allowance and (p95 is None or p95 <= args.max_latency_s)
+    return {
+        "rate_per_minute": rate,
+        "duration_seconds": round(elapsed, 1),
+        "arrived": arrivals[0],
+        "processed": sum(processed.values()),
+        "results": processed,
+        "throughput_per_minute": sum(processed.values()) / elapsed * 60,
+        "final_backlog": final_backlog,
+        "max_backlog": max((s["backlog"] for s in samples), default=0),
+        "mean_backlog_second_half": tail_backlog,
+        "backlog_growth_per_minute": growth,
+        "latency_p50_s": percentile(latencies, 0.5),
+        "latency_p95_s": p95,
+        "peak_rss_mb": max((s["rss_mb"] for s in samples), default=rss_mb()),
+        "sustainable": sustainable,
+        "samples": samples,
+    }
+
+
+def print_row(result):
+    p50 = result["latency_p50_s"]
+    p95 = result["latency_p95_s"]
+    print(f"{result['rate_per_minute']:>8.1f}{result['arrived']:>9}{result['processed']:>11}"
+          f"{result['final_backlog']:>9}{result['backlog_growth_per_minute']:>+10.2f}"
+          f"{(p50 if p50 is not None else float('nan')):>9.1f}{(p95 if p95 is not None else float('nan')):>9.1f}"
+          f"{result['peak_rss_mb']:>10.0f}  {'yes' if result['sustainable'] else 'NO'}", flush=True)
+
+
+def load_model(kind, model_id, model_ms):
+    if kind == "synthetic":
+        return SyntheticModel(model_ms)
+    from llm.llama_model import LlamaModel
+    if kind == "tiny":
+        return LlamaModel(model_id=model_id or DEFAULT_TINY_MODEL)
+    return LlamaModel(model_id=model_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the email monitor against a synthetic stub mailbox")
+    parser.add_argument("--model", choices=["synthetic", "tiny", "config"], default="synthetic",
+                        help="synthetic: canned answers after --model-ms; tiny: small local model; config: llm_config.yaml")
+    parser.add_argument("--model-id", help="Override the model id for tiny/config")
+    parser.add_argument("--model-ms", type=float, default=0, help="Think time of the synthetic model per email")
+    parser.add_argument("--rates", default="30,60,120", help="Comma-separated arrival rates (emails/minute)")
+    parser.add_argument("--find", action="store_true", help="Double the rate until unsustainable, then bisect")
+    parser.add_argument("--search-steps", type=int, default=3, help="Bisection steps after --find brackets the limit")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds per rate")
+    parser.add_argument("--poll-seconds", type=float, default=5, help="Sleep between polls (main.py uses 5)")
+    parser.add_argument("--sample-seconds", type=float, default=1)
+    parser.add_argument("--graph-latency-ms", type=float, default=0)
+    parser.add_argument("--backend-latency-ms", type=float, default=0)
+    parser.add_argument("--backlog-allowance", type=float, default=3,
+                        help="Mean backlog over the second half of a run that still counts as keeping up")
+    parser.add_argument("--max-latency-s", type=float, default=300, help="p95 arrival-to-read latency limit")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write every run (with backlog/RSS samples) to this file")
+    args = parser.parse_args()
+
+    model = load_model(args.model, args.model_id, args.model_ms)
+    print(f"[INFO] Model: {getattr(model, 'model_id', args.model)}; {args.duration:g}s per rate, polling every {args.poll_seconds:g}s")
+    print(f"\n{'rate/min':>8}{'arrived':>9}{'processed':>11}{'backlog':>9}{'growth/m':>10}{'p50 s':>9}{'p95 s':>9}{'RSS MB':>10}  sustainable")
+
+    runs = []
+
+    def measure(rate):
+        result = run_rate(rate, args, model, args.seed + len(runs))
+        runs.append(result)
+        print_row(result)
+        return result["sustainable"]
+
+    if args.find:
+        rate = float(args.rates.split(",")[0])
+        low, high = None, None
+        while high is None:
+            if measure(rate):
+                low, rate = rate, rate * 2
+            else:
+                high = rate
+                if low is None:
+                    low = 0.0
+        for _ in range(args.search_steps):
+            middle = (low + high) / 2
+            if measure(middle):
+                low = middle
+            else:
+                high = middle
+    else:
+        for rate in (float(r) for r in args.rates.split(",")):
+            measure(rate)
+
+    sustainable = [r["rate_per_minute"] for r in runs if r["sustainable"]]
+    if sustainable:
+        print(f"\n[OK] Highest sustainable rate: {max(sustainable):.1f} emails/minute")
+    else:
+        print("\n[WARNING] No tested rate was sustainable")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"model": getattr(model, "model_id", args.model), "args": vars(args), "runs": runs}, f, indent=2)
+        print(f"[OK] Results written to {args.json}")
@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+from collections import deque
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PIPELINE_DIR)
+from bench.stub_servers import ReplayGraph, ReplayBackend
+
+# Replays a trace recorded with PIPELINE_RECORD=trace.jsonl through the real
+# pipeline code (get_emails -> extract_relevant_fields -> model ->
+# post_structured_data -> mark read) against local stub servers, then
+# reports per-stage latency and overall throughput.
+#
+#   python bench/replay.py trace.jsonl                 # recorded LLM outputs, no model
+#   python bench/replay.py trace.jsonl --model tiny    # small local model, CI-sized
+#   python bench/replay.py trace.jsonl --model config  # model from llm_config.yaml
+
+DEFAULT_TINY_MODEL = "HuggingFaceTB/SmolLM2-135M-Instruct"
+STAGES = ["fetch", "html_strip", "generate", "tokenize", "prefill", "decode", "backend_post", "mark_read"]
+
+
+class ReplayModel:
+    """Returns the recorded output for a prompt, matched by hash and then by order"""
+
+    def __init__(self, llm_events):
+        self.by_input = {}
+        self.in_order = deque()
+        for event in llm_events:
+            self.by_input.setdefault(event.get("input_sha1"), deque()).append(event["output"])
+            self.in_order.append(event["output"])
+        self.misses = 0
+
+    def generate(self, email_text):
+        from utils.trace import text_digest
+        outputs = self.by_input.get(text_digest(email_text))
+        if outputs:
+            return outputs.popleft() if len(outputs) > 1 else outputs[0]
+        self.misses += 1
+        return self.in_order.popleft() if self.in_order else ""
+
+
+def load_model(kind, model_id, llm_events):
+    if kind == "replay":
+        return ReplayModel(llm_events)
+    from llm.llama_model import LlamaModel
+    if kind == "tiny":
+        return LlamaModel(model_id=model_id or DEFAULT_TINY_MODEL)
+    return LlamaModel(model_id=model_id)
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def stage_report(histogram):
+    rows = []
+    seen = {labels["stage"] for labels in histogram.label_sets()}
+    for name in STAGES + sorted(seen - set(STAGES)):
+        if name not in seen:
+            continue
+        _, total, count = histogram.snapshot(stage=name)
+        rows.append({
+            "stage": name,
+            "count": count,
+            "mean_ms": total / count * 1000,
+            "p50_ms": histogram.quantile(0.5, stage=name) * 1000,
+            "p95_ms": histogram.quantile(0.95, stage=name) * 1000,
+        })
+    return rows
+
+
+def print_report(report):
+    print(f"\n[INFO] Replayed {report['polls']} polls, {report['emails_processed']} emails in {report['wall_seconds']:.2f}s"
+          f" ({report['emails_per_minute']:.1f} emails/min)")
+    print(f"[INFO] Results: {json.dumps(report['results'])}")
+    if report["email_p50_ms"] is not None:
+        print(f"[INFO] Per-email latency: p50 {report['email_p50_ms']:.1f} ms, p95 {report['email_p95_ms']:.1f} ms")
+    print(f"\n{'stage':<14}{'count':>7}{'mean ms':>11}{'p50 ms':>11}{'p95 ms':>11}")
+    for row in report["stages"]:
+        print(f"{row['stage']:<14}{row['count']:>7}{row['mean_ms']:>11.2f}{row['p50_ms']:>11.2f}{row['p95_ms']:>11.2f}")
+
+
+def replay(trace_path, model_kind="replay", model_id=None, graph_latency_ms=0, backend_latency_ms=0, verbose=False):
+    # Modules read their endpoints at import time, so the stubs start first
+    from utils.trace import load_trace
+    events = load_trace(trace_path)
+
+    graph = ReplayGraph(events.get("graph_messages", []))
+    backend = ReplayBackend(events.get("backend_response", []))
+    graph_server = graph.server(graph_latency_ms)
+    backend_server = backend.server(backend_latency_ms)
+    os.environ["GRAPH_BASE_URL"] = graph_server.start() + "/v1.0"
+    os.environ["API_BASE_URL"] = backend_server.start()
+    os.environ.pop("BACKEND_API_TOKEN", None)
+
+    from graph_api.fetch_emails import get_emails
+    from processor.email_parser import should_process_email
+    from processor.pipeline import process_email
+    from processor.slot_intervals import ConflictChecker
+    from api.send_to_backend import fetch_blocked_dates
+    from utils.metrics import STAGE_SECONDS, stage
+
+    model = load_model(model_kind, model_id, events.get("llm_output", []))
+    checker = ConflictChecker(fetch_blocked_dates(), [])
+    quiet = open(os.devnull, "w") if not verbose else None
+
+    results = {}
+    latencies = []
+    polls = 0
+    started = time.perf_counter()
+    try:
+        while not graph.exhausted:
+            with contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext():
+                with stage("fetch"):
+                    emails = get_emails("replay-token")
+                polls += 1
+                for email in emails or []:
+                    if not should_process_email(email):
+                        results["skipped"] = results.get("skipped", 0) + 1
+                        continue
+                    email_started = time.perf_counter()
+                    result = process_email(email, model, checker, "replay-token")
+                    latencies.append((time.perf_counter() - email_started) * 1000)
+                    results[result] = results.get(result, 0) + 1
+    finally:
+        wall = time.perf_counter() - started
+        graph_server.stop()
+        backend_server.stop()
+        if quiet:
+            quiet.close()
+
+    processed = len(latencies)
+    report = {
+        "trace": os.path.abspath(trace_path),
+        "model": model_kind if model_kind == "replay" else getattr(model, "model_id", model_kind),
+        "polls": polls,
+        "emails_processed": processed,
+        "results": results,
+        "wall_seconds": wall,
+        "emails_per_minute": processed / wall * 60 if wall else 0.0,
+        "email_p50_ms": percentile(latencies, 0.5),
+        "email_p95_ms": percentile(latencies, 0.95),
+        "stages": stage_report(STAGE_SECONDS),
+    }
+    if isinstance(model, ReplayModel) and model.misses:
+        report["replay_model_misses"] = model.misses
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded pipeline trace against local stub servers")
+    parser.add_argument("trace", help="JSONL trace written with PIPELINE_RECORD=...")
+    parser.add_argument("--model", choices=["replay", "tiny", "config"], default="replay",
+                        help="replay: recorded outputs; tiny: small local model; config: llm_config.yaml model")
+    parser.add_argument("--model-id", help=f"Override the model id (tiny default: {DEFAULT_TINY_MODEL})")
+    parser.add_argument("--graph-latency-ms", type=float, default=0, help="Added latency per stub Graph call")
+    parser.add_argument("--backend-latency-ms", type=float, default=0, help="Added latency per stub backend call")
+    parser.add_argument("--json", help="Also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own output")
+    args = parser.parse_args()
+
+    report = replay(args.trace, args.model, args.model_id, args.graph_latency_ms, args.backend_latency_ms, args.verbose)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[OK] Report written to {args.json}")
@@ -0,0 +1,272 @@
+import re
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+# Local stand-ins for Microsoft Graph and the Express backend, so the
+# pipeline can be benchmarked with no network. Each stub is a list of
+# (method, path regex, handler) routes; a handler gets (match, query, body)
+# and returns (status, payload) where payload is a dict/list (sent as JSON),
+# a str, or None for an empty body.
+
+
+class StubServer:
+    def __init__(self, routes, latency_ms=0):
+        self.routes = [(method, re.compile(pattern), handler) for method, pattern, handler in routes]
+        self.latency = latency_ms / 1000.0
+        self.requests = 0
+        self._server = None
+
+    def _dispatch(self, method, raw_path, body):
+        parts = urlsplit(raw_path)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        for route_method, pattern, handler in self.routes:
+            if route_method != method:
+                continue
+            match = pattern.fullmatch(parts.path)
+            if match:
+                return handler(match, query, body)
+        return 404, {"error": {"code": "NotFound", "message": f"No stub route for {method} {parts.path}"}}
+
+    def start(self, host="127.0.0.1", port=0):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else None
+                except ValueError:
+                    body = raw.decode("utf-8", "replace")
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                status, payload = stub._dispatch(self.command, self.path, body)
+                if payload is None:
+                    data, content_type = b"", "text/plain"
+                elif isinstance(payload, (dict, list)):
+                    data, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+                else:
+                    data, content_type = str(payload).encode("utf-8"), "text/plain"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="stub-server", daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class ReplayGraph:
+    """Serves recorded /me/messages polls in order, then empty polls"""
+
+    def __init__(self, polls):
+        self.polls = list(polls)
+        self.position = 0
+        self.marked_read = []
+        self.exhausted = False
+        self._lock = threading.Lock()
+
+    def messages(self, match, query, body):
+        with self._lock:
+            if self.position < len(self.polls):
+                poll = self.polls[self.position]
+                self.position += 1
+                return poll.get("status", 200), poll["body"]
+            self.exhausted = True
+            return 200, {"value": []}
+
+    def mark_read(self, match, query, body):
+        self.marked_read.append(match.group(1))
+        return 200, {"id": match.group(1), "isRead": True}
+
+    def server(self, latency_ms=0):
+        return StubServer([
+            ("GET", r"/v1\.0/me/messages", self.messages),
+            ("PATCH", r"/v1\.0/me/messages/([^/]+)", self.mark_read),
+        ], latency_ms)
+
+
+class ReplayBackend:
+    """Answers parsed-email posts with the recorded responses, then with a plain 200"""
+
+    def __init__(self, responses=(), blocked_dates=(), sessions=(), email_sessions=None):
+        self.responses = list(responses)
+        self.blocked_dates = list(blocked_dates)
+        self.sessions = list(sessions)
+        self.email_sessions = dict(email_sessions or {})
+        self.posted = []
+        self.idempotency_keys = set()
+        self._lock = threading.Lock()
+
+    def parsed_email(self, match, query, body):
+        with self._lock:
+            self.posted.append(body)
+            index = len(self.posted) - 1
+        if index < len(self.responses):
+            response = self.responses[index]
+            return response.get("status", 200), response.get("body")
+        return 200, {"message": "Parsed email stored"}
+
+    def parsed_email_bulk(self, match, query, body):
+        results = []
+        with self._lock:
+            for record in (body or {}).get("records", []):
+                key = record.get("idempotency_key")
+                if key in self.idempotency_keys:
+                    results.append({"idempotency_key": key, "status": "duplicate"})
+                    continue
+                self.idempotency_keys.add(key)
+                self.posted.append(record)
+                results.append({"idempotency_key": key, "status": "stored"})
+        return 200, {"results": results}
+
+    def email_session(self, match, query, body):
+        session = self.email_sessions.get(match.group(1))
+        return (200, session) if session else (404, {"error": "Session not found"})
+
+    def server(self, latency_ms=0):
+        return StubServer([
+            ("POST", r"/api/scheduling/parsed-email", self.parsed_email),
+            ("POST", r"/api/scheduling/parsed-email/bulk", self.parsed_email_bulk),
+            ("GET", r"/api/scheduling/get-blocked-dates", lambda m, q, b: (200, {"blocked_dates": self.blocked_dates})),
+            ("GET", r"/api/scheduling/timetable", lambda m, q, b: (200, self.sessions)),
+            ("GET", r"/api/email-sessions/([^/]+)", self.email_session),
+        ], latency_ms)
+
+
+class MailboxGraph:
+    """
+    In-memory mailbox behind the Graph endpoints the pipeline uses: unread
+    /me/messages (honouring $select), inbox delta, $batch GET and PATCH,
+    PATCH isRead and sendMail. Arrival and
+    read times are kept per message for latency measurements.
+    """
+
+    def __init__(self):
+        self.messages = {}
+        self.order = []
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def deliver(self, message):
+        message = dict(message, isRead=False)
+        with self._lock:
+            self.messages[message["id"]] = {"message": message, "arrived": time.time(), "read": None}
+            self.order.append(message["id"])
+
+    def unread(self, predicate=None):
+        with self._lock:
+            return [m for m in (self.messages[i] for i in self.order)
+                    if not m["message"]["isRead"] and (predicate is None or predicate(m["message"]))]
+
+    def read_latencies(self):
+        with self._lock:
+            return [m["read"] - m["arrived"] for m in self.messages.values() if m["read"] is not None]
+
+    def _set_read(self, message_id, body):
+        with self._lock:
+            entry = self.messages.get(message_id)
+            if entry is None:
+                return 404, {"error": {"code": "ErrorItemNotFound", "message": "The specified object was not found in the store."}}
+            if isinstance(body, dict) and body.get("isRead") and not entry["message"]["isRead"]:
+                entry["message"]["isRead"] = True
+                entry["read"] = time.time()
+            return 200, entry["message"]
+
+    @staticmethod
+    def _select(message, query):
+        fields = query.get("$select")
+        return {k: v for k, v in message.items() if k in fields.split(",")} if fields else message
+
+    def _get_message(self, message_id, query):
+        with self._lock:
+            entry = self.messages.get(message_id)
+        if entry is None:
+            return 404, {"error": {"code": "ErrorItemNotFound", "message": "The specified object was not found in the store."}}
+        return 200, self._select(entry["message"], query)
+
+    def list_messages(self, match, query, body):
+        items = [m["message"] for m in self.unread()] if "isRead eq false" in query.get("$filter", "") else \
+            [self.messages[i]["message"] for i in list(self.order)]
+        items = [self._select(m, query) for m in items]
+        top = int(query.get("$top", 0) or 0)
+        skip = int(query.get("$skip", 0) or 0)
+        if not top:
+            return 200, {"value": items[skip:]}
+        page = {"value": items[skip:skip + top]}
+        if skip + top < len(items):
+            page["@odata.nextLink"] = f"/v1.0/me/messages?{urlencode(dict(query, **{'$skip': skip + top}))}"
+        return 200, page
+
+    def folder_messages(self, match, query, body):
+        # Only the receivedDateTime ge/lt window backfill uses; every message counts as in the folder
+        bounds = dict(re.findall(r"receivedDateTime (ge|lt) (\S+)", query.get("$filter", "")))
+        with self._lock:
+            items = sorted((self.messages[i]["message"] for i in self.order), key=lambda m: m["receivedDateTime"])
+        items = [m for m in items if ("ge" not in bounds or m["receivedDateTime"] >= bounds["ge"])
+                 and ("lt" not in bounds or m["receivedDateTime"] < bounds["lt"])]
+        top = int(query.get("$top", 0) or 0) or len(items)
+        skip = int(query.get("$skip", 0) or 0)
+        page = {"value": items[skip:skip + top]}
+        if skip + top < len(items):
+            page["@odata.nextLink"] = f"/v1.0/me/mailFolders/{match.group(1)}/messages?{urlencode(dict(query, **{'$skip': skip + top}))}"
+        return 200, page
+
+    def delta(self, match, query, body):
+        # The delta token is simply the index into the arrival order
+        start = int(query.get("$deltatoken", 0) or 0)
+        with self._lock:
+            ids = self.order[start:]
+            end = len(self.order)
+            items = [self.messages[i]["message"] for i in ids]
+        return 200, {"value": items, "@odata.deltaLink": f"/v1.0/me/mailFolders/inbox/messages/delta?$deltatoken={end}"}
+
+    def batch(self, match, query, body):
+        responses = []
+        for request in (body or {}).get("requests", []):
+            status, payload = 400, {"error": {"code": "BadRequest", "message": "Unsupported batch request"}}
+            parts = urlsplit(request.get("url", ""))
+            path_match = re.fullmatch(r"/me/messages/([^/?]+)", parts.path)
+            if request.get("method") == "PATCH" and path_match:
+                status, payload = self._set_read(path_match.group(1), request.get("body"))
+            elif request.get("method") == "GET" and path_match:
+                status, payload = self._get_message(path_match.group(1), {k: v[0] for k, v in parse_qs(parts.query).items()})
+            responses.append({"id": request.get("id"), "status": status, "body": payload})
+        return 200, {"responses": responses}
+
+    def patch_message(self, match, query, body):
+        return self._set_read(match.group(1), body)
+
+    def send_mail(self, match, query, body):
+        with self._lock:
+            self.sent.append(body)
+        return 202, None
+
+    def server(self, latency_ms=0):
+        return StubServer([
+            ("GET", r"/v1\.0/me/messages", self.list_messages),
+            ("GET", r"/v1\.0/me/mailFolders/inbox/messages/delta", self.delta),
+            ("GET", r"/v1\.0/me/mailFolders/([^/]+)/messages", self.folder_messages),
+            ("PATCH", r"/v1\.0/me/messages/([^/]+)", self.patch_message),
+            ("POST", r"/v1\.0/\$batch", self.batch),
+            ("POST", r"/v1\.0/me/sendMail", self.send_mail),
+        ], latency_ms)
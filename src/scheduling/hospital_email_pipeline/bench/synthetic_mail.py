@@ -0,0 +1,104 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+# Synthetic tutor emails shaped like Graph message resources. Each email comes
+# with the JSON the extractor should produce, so a stub model can answer
+# without an LLM and accuracy can be checked.
+
+FIRST_NAMES = ["Lim", "Tan", "Ang", "Ng", "Wong", "Goh", "Chua", "Lee", "Koh", "Teo", "Ong", "Yeo", "Chan", "Low", "Sim"]
+SESSION_NAMES = ["Cardio Tutorial", "Infectious Diseases Tutorial", "Renal Tutorial", "Geriatrics Tutorial", "Neuro Tutorial"]
+STUDENT_GROUPS = ["Year 2 batch", "Year 3 group", "Year 4 students", None]
+REASONS = ["clinic overrun", "family emergency", "overseas conference", "on-call duty", None]
+TIMES = ["9am", "11am", "2pm", "4pm", "2-4pm", "10:30am"]
+INBOXES = [("Med Admin", "med-admin@hospital.sg"), ("Education Office", "educationoffice@hospital.sg"), ("Scheduler", "scheduler@hospital.sg")]
+NOISE = [
+    ("Lift maintenance", "Lifts in Block {n} will be under maintenance this weekend."),
+    ("Parking update", "Carpark B will be closed on {day} for resurfacing."),
+    ("Canteen menu", "This week's canteen menu is attached."),
+    ("IT notice", "Password resets are scheduled for {day}. Please save your work."),
+]
+
+DEFAULT_MIX = {"availability": 0.55, "change_request": 0.25, "noise": 0.20}
+
+
+def _slot_text(day, time_text):
+    return f"{day.day} {day.strftime('%B')} ({day.strftime('%a')}) {time_text}"
+
+
+class SyntheticMail:
+    def __init__(self, seed=0, mix=None, start=None):
+        self.rng = random.Random(seed)
+        self.mix = mix or DEFAULT_MIX
+        self.start = start or datetime.now()
+        self.count = 0
+
+    def _upcoming_day(self):
+        day = self.start + timedelta(days=self.rng.randint(3, 60))
+        while day.weekday() >= 5:
+            day += timedelta(days=1)
+        return day
+
+    def _envelope(self, subject, body, sender, recipient):
+        self.count += 1
+        html = "<html><body>" + "".join(f"<p>{line}</p>" for line in body.split("\n")) + "</body></html>"
+        return {
+            "id": f"AAMk-synthetic-{self.count:07d}",
+            "conversationId": f"AAQk-synthetic-{self.count:07d}",
+            "subject": subject,
+            "bodyPreview": body[:255],
+            "receivedDateTime": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "isRead": False,
+            "from": {"emailAddress": {"name": sender[0], "address": sender[1]}},
+            "toRecipients": [{"emailAddress": {"name": recipient[0], "address": recipient[1]}}],
+            "body": {"contentType": "html", "content": html},
+        }
+
+    def _doctor(self):
+        name = self.rng.choice(FIRST_NAMES)
+        number = self.rng.randint(1, 400)
+        return f"Dr {name}", f"dr.{name.lower()}{number}@hospital.sg"
+
+    def availability(self):
+        sender, recipient = self._doctor(), self.rng.choice(INBOXES)
+        session = self.rng.choice(SESSION_NAMES)
+        group = self.rng.choice(STUDENT_GROUPS)
+        slots = sorted({self._upcoming_day() for _ in range(self.rng.randint(1, 5))})
+        slot_texts = [_slot_text(day, self.rng.choice(TIMES)) for day in slots]
+        body = "Hi,\nI'm available for the following dates for the " + session + ":\n" + \
+            "\n".join(f"- {s}" for s in slot_texts) + \
+            (f"\nThis is for the {group}." if group else "") + f"\nRegards,\n{sender[0]}"
+        expected = {
+            "type": "availability", "session_name": session,
+            "from_name": sender[0], "from_email": sender[1], "to_email": recipient[1],
+            "original_session": None, "new_session": None, "reason": None,
+            "students": group, "available_slots_timings": slot_texts, "notes": None,
+        }
+        return self._envelope(f"Re: {session}", body, sender, recipient), expected
+
+    def change_request(self):
+        sender, recipient = self._doctor(), self.rng.choice(INBOXES)
+        session = self.rng.choice(SESSION_NAMES)
+        group = self.rng.choice(STUDENT_GROUPS)
+        reason = self.rng.choice(REASONS)
+        original = _slot_text(self._upcoming_day(), self.rng.choice(TIMES))
+        new = _slot_text(self._upcoming_day(), self.rng.choice(TIMES))
+        body = f"Dear team,\nI can't make my session on {original} for the {session}. Can I move it to {new}?" + \
+            (f" It's due to {reason}." if reason else "") + (f" This is for the {group}." if group else "") + \
+            f"\nThanks,\n{sender[0]}"
+        expected = {
+            "type": "change_request", "session_name": session,
+            "from_name": sender[0], "from_email": sender[1], "to_email": recipient[1],
+            "original_session": original, "new_session": new, "reason": reason,
+            "students": group, "available_slots_timings": [], "notes": None,
+        }
+        return self._envelope("Rescheduling Request", body, sender, recipient), expected
+
+    def noise(self):
+        subject, template = self.rng.choice(NOISE)
+        body = template.format(n=self.rng.randint(1, 9), day=self._upcoming_day().strftime("%d %B"))
+        return self._envelope(subject, body, ("Facilities", "facilities@hospital.sg"), self.rng.choice(INBOXES)), None
+
+    def next(self):
+        """(graph message, expected extraction or None for noise)"""
+        kind = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        return getattr(self, kind)()
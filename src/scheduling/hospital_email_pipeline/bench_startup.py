@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+# Start-up guard for the CLIs the backend shells out to. Each entry point is
+# imported in a fresh interpreter; heavy dependencies must stay unloaded and
+# the import + command cost must stay inside the budget. Wall time (including
+# the interpreter itself) is reported next to a bare `python -c pass`.
+#
+# Timings are the best of --runs; a check over budget is measured again
+# (best of --runs more) before it fails, so a busy machine does not fail the
+# guard. Budgets are per check, with ample room over an idle machine.
+
+PIPELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ["msal", "torch", "transformers", "bs4"]
+
+CHECKS = [
+    # (label, code run in the child, modules that must not be imported, budget ms or None for --budget-ms)
+    ("email_config list", "import email_config; email_config.EmailConfig.list_profiles()", HEAVY_MODULES + ["requests"], None),
+    ("send_email import", "import send_email", HEAVY_MODULES + ["requests"], None),
+    ("email_parser import", "import processor.email_parser", HEAVY_MODULES, None),
+    ("slot_intervals import", "import processor.slot_intervals", HEAVY_MODULES + ["requests"], None),
+    # Client mode of the inference server must not pay for torch (~35 ms, mostly yaml and the config)
+    ("llama_model import", "import llm.llama_model, llm.llm_reply", HEAVY_MODULES + ["requests"], 100.0),
+]
+
+CHILD = """
+import sys, time, json
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "loaded": [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+
+def run_check(code, forbidden):
+    started = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD.format(code=code, forbidden=forbidden)],
+        cwd=PIPELINE_DIR, capture_output=True, text=True, check=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["wall_ms"] = wall_ms
+    return result
+
+
+def interpreter_baseline_ms(runs):
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        ms = (time.perf_counter() - started) * 1000
+        best = ms if best is None else min(best, ms)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time regression guard for the pipeline CLIs")
+    parser.add_argument("--budget-ms", type=float, default=50.0,
+                        help="Allowed import + command time inside the child, for checks without their own budget")
+    parser.add_argument("--runs", type=int, default=5, help="Best-of runs per check")
+    args = parser.parse_args()
+
+    baseline = interpreter_baseline_ms(args.runs)
+    print(f"[INFO] Bare interpreter start: {baseline:.1f} ms")
+
+    failed = False
+    for label, code, forbidden, budget_ms in CHECKS:
+        budget_ms = budget_ms or args.budget_ms
+        results = [run_check(code, forbidden) for _ in range(args.runs)]
+        if min(r["ms"] for r in results) > budget_ms:
+            # Confirm before failing: one slow round is usually a busy machine
+            results += [run_check(code, forbidden) for _ in range(args.runs)]
+        import_ms = min(r["ms"] for r in results)
+        wall_ms = min(r["wall_ms"] for r in results)
+        loaded = sorted({m for r in results for m in r["loaded"]})
+        status = "OK"
+        if loaded or import_ms > budget_ms:
+            status = "FAIL"
+            failed = True
+        print(f"[{status}] {label}: {import_ms:.1f} ms in-process (budget {budget_ms:g}), {wall_ms:.1f} ms wall"
+              + (f", loaded {', '.join(loaded)}" if loaded else ""))
+
+    sys.exit(1 if failed else 0)
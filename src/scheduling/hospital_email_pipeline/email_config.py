@@ -1,7 +1,103 @@
 import os
 import json
-import configparser
-from auth_helper import get_token_from_device_flow
+import time
+import atexit
+import tempfile
+from utils.metrics import record_cache
+
+PROFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "email_profiles")
+INDEX_FILE = "profiles.index"
+# last_used is bookkeeping only; coalesce its writes to one per profile per interval
+LAST_USED_FLUSH_SECONDS = 60
+
+# Process-level profile cache: path -> (mtime_ns, profile dict)
+_profile_cache = {}
+# Unwritten last_used updates: path -> timestamp
+_pending_last_used = {}
+_last_used_flushed = {}
+
+
+def _write_json_atomic(path, data):
+    """Write JSON to a temp file in the same directory and rename it over path"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, indent=2, fp=f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_profile(path):
+    """Read a profile through the mtime-validated cache; returns a private copy"""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _profile_cache.get(path)
+    record_cache("profile", bool(cached and cached[0] == mtime))
+    if cached and cached[0] == mtime:
+        return dict(cached[1])
+    with open(path, 'r') as f:
+        profile = json.load(f)
+    _profile_cache[path] = (mtime, profile)
+    return dict(profile)
+
+
+def _summary(name, profile, mtime):
+    return {
+        "name": name,
+        "sender_email": profile.get("sender_email", ""),
+        "sender_name": profile.get("sender_name", ""),
+        "description": profile.get("description", ""),
+        "last_used": profile.get("last_used", ""),
+        "mtime_ns": mtime
+    }
+
+
+def _load_index(profiles_dir):
+    try:
+        with open(os.path.join(profiles_dir, INDEX_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _update_index(profiles_dir, name, profile=None, mtime=None):
+    """Add, refresh (profile given) or drop (profile None) one index entry"""
+    index = _load_index(profiles_dir)
+    if profile is None:
+        index.pop(name, None)
+    else:
+        index[name] = _summary(name, profile, mtime)
+    _write_json_atomic(os.path.join(profiles_dir, INDEX_FILE), index)
+
+
+def _flush_pending_last_used():
+    for path, last_used in list(_pending_last_used.items()):
+        try:
+            # Re-read so a token refreshed by another process is not overwritten
+            profile = _read_profile(path)
+            profile["last_used"] = last_used
+            _store_profile(path, profile)
+        except (OSError, ValueError):
+            pass
+    _pending_last_used.clear()
+
+
+def _store_profile(path, profile):
+    _write_json_atomic(path, profile)
+    mtime = os.stat(path).st_mtime_ns
+    _profile_cache[path] = (mtime, dict(profile))
+    _last_used_flushed[path] = time.monotonic()
+    _pending_last_used.pop(path, None)
+    name = os.path.basename(path)[:-5]
+    _update_index(os.path.dirname(path), name, profile, mtime)
+
+
+atexit.register(_flush_pending_last_used)
+
 
 class EmailConfig:
     """
@@ -11,7 +107,7 @@ class EmailConfig:
     def __init__(self, config_name="default"):
         self.config_name = config_name
         self.config_dir = os.path.dirname(os.path.abspath(__file__))
-        self.profiles_dir = os.path.join(self.config_dir, "email_profiles")
+        self.profiles_dir = PROFILES_DIR
         
         # Ensure profiles directory exists
         os.makedirs(self.profiles_dir, exist_ok=True)
@@ -22,8 +118,9 @@ class EmailConfig:
     def load_profile(self):
         """Load email profile configuration"""
         if os.path.exists(self.profile_path):
-            with open(self.profile_path, 'r') as f:
-                self.profile = json.load(f)
+            self.profile = _read_profile(self.profile_path)
+            if self.profile_path in _pending_last_used:
+                self.profile["last_used"] = _pending_last_used[self.profile_path]
         else:
             # Create default profile
             self.profile = {
@@ -38,9 +135,8 @@ class EmailConfig:
             self.save_profile()
     
     def save_profile(self):
-        """Save email profile configuration"""
-        with open(self.profile_path, 'w') as f:
-            json.dump(self.profile, indent=2, fp=f)
+        """Save email profile configuration (atomically, and refresh the profile index)"""
+        _store_profile(self.profile_path, self.profile)
     
     def setup_new_profile(self, sender_email, sender_name, description=""):
         """Setup a new email profile with authentication"""
@@ -48,7 +144,8 @@ class EmailConfig:
         print(f"📧 Sender Email: {sender_email}")
         print(f"👤 Sender Name: {sender_name}")
         
-        # Get access token for this profile
+        # Get access token for this profile (msal is only loaded for setup)
+        from auth_helper import get_token_from_device_flow
         print("🔑 Authenticating for this email profile...")
         access_token = get_token_from_device_flow()
         
@@ -73,15 +170,23 @@ class EmailConfig:
         """Get access token for this profile"""
         token = self.profile.get("access_token")
         if token:
-            # Update last used timestamp
+            # Update last used timestamp; the write is debounced
             self.profile["last_used"] = self._get_timestamp()
-            self.save_profile()
+            self._touch_last_used()
             return token
         else:
             print(f"[ERROR] No access token found for profile '{self.config_name}'")
             print("Run: python email_config.py setup <profile_name> <email> <name>")
         return None
     
+    def _touch_last_used(self):
+        """Write last_used at most once per LAST_USED_FLUSH_SECONDS; the rest is flushed at exit"""
+        flushed = _last_used_flushed.get(self.profile_path)
+        if flushed is None or time.monotonic() - flushed >= LAST_USED_FLUSH_SECONDS:
+            self.save_profile()
+        else:
+            _pending_last_used[self.profile_path] = self.profile["last_used"]
+
     def is_configured(self):
         """Check if profile is properly configured"""
         return bool(self.profile.get("access_token") and 
@@ -101,36 +206,47 @@ class EmailConfig:
     
     @classmethod
     def list_profiles(cls):
-        """List all available email profiles"""
-        config_dir = os.path.dirname(os.path.abspath(__file__))
-        profiles_dir = os.path.join(config_dir, "email_profiles")
+        """List all available email profiles from the profile index"""
+        profiles_dir = PROFILES_DIR
         
         if not os.path.exists(profiles_dir):
             return []
         
-        profiles = []
-        for file in os.listdir(profiles_dir):
-            if file.endswith('.json'):
-                profile_name = file[:-5]  # Remove .json extension
-                try:
-                    with open(os.path.join(profiles_dir, file), 'r') as f:
-                        profile_data = json.load(f)
-                        profiles.append({
-                            "name": profile_name,
-                            "sender_email": profile_data.get("sender_email", ""),
-                            "sender_name": profile_data.get("sender_name", ""),
-                            "description": profile_data.get("description", ""),
-                            "last_used": profile_data.get("last_used", "")
-                        })
-                except:
-                    continue
+        # The index is trusted per entry while the profile file's mtime matches;
+        # only new or changed profiles are opened
+        index = _load_index(profiles_dir)
+        fresh = {}
+        changed = False
+        for entry in os.scandir(profiles_dir):
+            if not entry.name.endswith('.json') or entry.name.startswith('.'):
+                continue
+            profile_name = entry.name[:-5]  # Remove .json extension
+            mtime = entry.stat().st_mtime_ns
+            summary = index.get(profile_name)
+            if summary and summary.get("mtime_ns") == mtime:
+                fresh[profile_name] = summary
+                continue
+            try:
+                fresh[profile_name] = _summary(profile_name, _read_profile(entry.path), mtime)
+                changed = True
+            except (OSError, ValueError):
+                continue
+        
+        if changed or len(fresh) != len(index):
+            try:
+                _write_json_atomic(os.path.join(profiles_dir, INDEX_FILE), fresh)
+            except OSError:
+                pass
         
-        return profiles
+        return [{k: v for k, v in summary.items() if k != "mtime_ns"} for summary in fresh.values()]
     
     def delete_profile(self):
         """Delete this email profile"""
         if os.path.exists(self.profile_path):
             os.remove(self.profile_path)
+            _profile_cache.pop(self.profile_path, None)
+            _pending_last_used.pop(self.profile_path, None)
+            _update_index(self.profiles_dir, self.config_name)
             print(f"🗑️ Deleted email profile: {self.config_name}")
             return True
         return False
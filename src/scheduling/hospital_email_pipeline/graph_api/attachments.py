@@ -0,0 +1,42 @@
+import os
+import tempfile
+import requests
+from utils.metrics import record_graph_response
+
+GRAPH_BASE_URL = os.getenv("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0")
+CHUNK_BYTES = 64 * 1024
+# Graph file attachments top out around 150 MB; nothing we parse comes close
+MAX_ATTACHMENT_BYTES = 25 * 1024 * 1024
+
+def list_attachments(email_id, access_token):
+    """Attachment metadata only (id, name, contentType, size); contentBytes is never requested"""
+    url = f"{GRAPH_BASE_URL}/me/messages/{email_id}/attachments?$select=id,name,contentType,size"
+    response = requests.get(url, headers={"Authorization": f"Bearer {access_token}"})
+    record_graph_response("attachments", response.status_code)
+    if response.status_code != 200:
+        print(f"[ERROR] Failed to list attachments: {response.status_code} - {response.text[:200]}")
+        return []
+    return response.json().get("value", [])
+
+def download_attachment(email_id, attachment_id, access_token, suffix=""):
+    """Stream the raw attachment ($value) to a temp file in chunks; returns its path, or None"""
+    url = f"{GRAPH_BASE_URL}/me/messages/{email_id}/attachments/{attachment_id}/$value"
+    with requests.get(url, headers={"Authorization": f"Bearer {access_token}"}, stream=True, timeout=60) as response:
+        record_graph_response("attachment_value", response.status_code)
+        if response.status_code != 200:
+            print(f"[ERROR] Failed to download attachment: {response.status_code}")
+            return None
+        fd, path = tempfile.mkstemp(prefix="attachment-", suffix=suffix)
+        written = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in response.iter_content(CHUNK_BYTES):
+                    written += len(chunk)
+                    if written > MAX_ATTACHMENT_BYTES:
+                        raise ValueError(f"attachment larger than {MAX_ATTACHMENT_BYTES // 2 ** 20} MB")
+                    f.write(chunk)
+        except Exception as e:
+            os.unlink(path)
+            print(f"[ERROR] Failed to download attachment: {e}")
+            return None
+    return path
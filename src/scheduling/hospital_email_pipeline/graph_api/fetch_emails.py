@@ -1,42 +1,163 @@
+import os
 import requests
+from urllib.parse import urljoin
+from utils.metrics import record_graph_response
+from utils.trace import record_poll, TRACE_PATH
+from utils.detect_route import detect_route
+from utils.json_stream import iter_items
+from processor.email_record import EmailRecord
+
+GRAPH_BASE_URL = os.getenv("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0")
+# internetMessageHeaders is only returned when selected; detect_route needs it for X-Session-ID
+MESSAGE_FIELDS = "id,conversationId,subject,bodyPreview,body,from,toRecipients,receivedDateTime,isRead,hasAttachments,internetMessageHeaders"
+# The unread poll lists these (everything but the body), filters on them
+# and only then fetches bodies for the wanted messages. Graph cannot filter
+# on subject keywords or headers reliably, so only isRead is server-side.
+LIST_FIELDS = "id,conversationId,subject,bodyPreview,from,toRecipients,receivedDateTime,isRead,hasAttachments,internetMessageHeaders"
+# Messages per Graph page; pages are followed through @odata.nextLink
+PAGE_SIZE = int(os.getenv("GRAPH_PAGE_SIZE", "50"))
+CHUNK_BYTES = 64 * 1024
+# Graph accepts at most 20 requests per JSON batch
+BATCH_LIMIT = 20
+
+def is_wanted(message):
+    """Cheap subject/preview filter, applied before a message is preprocessed"""
+    text = (message.get("subject", "") + message.get("bodyPreview", "")).lower()
+    return (
+        "tutorial" in text
+        or "tutor" in text
+        or "reschedule" in text
+        or "change" in text
+        or "available" in text
+        or "availability" in text
+        # Replies to our own invites, whatever they say ("Yes, I can make it")
+        or detect_route(message)["route"] == "reply"
+    )
 
 def get_emails(access_token):
-    url = "https://graph.microsoft.com/v1.0/me/messages?$filter=isRead eq false"
+    """
+    Wanted unread emails as EmailRecords. The unread listing leaves out the
+    body, so messages the filter rejects cost only their metadata on every
+    poll; bodies are then fetched in JSON batches for the wanted ones alone
+    and each record is built as soon as its body arrives.
+    """
+    url = f"{GRAPH_BASE_URL}/me/messages?$filter=isRead eq false&$select={LIST_FIELDS}&$top={PAGE_SIZE}"
+    # Recording keeps the raw messages so bench/replay.py can serve them again
+    recorded = [] if TRACE_PATH else None
+    wanted = []
+
+    while url:
+        page = list_page(url, access_token)
+        if page is None:
+            return None
+        messages, url = page
+        wanted.extend(message for message in messages if is_wanted(message))
+
+    emails = []
+    for start in range(0, len(wanted), BATCH_LIMIT):
+        chunk = wanted[start:start + BATCH_LIMIT]
+        bodies = fetch_bodies([message["id"] for message in chunk if "body" not in message], access_token)
+        if bodies is None:
+            return None
+        for message in chunk:
+            # Replayed traces already carry the body
+            message = dict(message, body=bodies[message["id"]]) if message["id"] in bodies else message
+            if "body" not in message:
+                continue
+            if recorded is not None:
+                recorded.append(message)
+            emails.append(EmailRecord.from_graph(message))
+
+    print("[OK] Email fetch success.")
+    if recorded is not None:
+        record_poll(200, {"value": recorded})
+    return emails
+
+def list_page(url, access_token):
+    """(messages, next page url or None) of one body-less Graph listing page; None after a 401"""
     headers = {
         "Authorization": f"Bearer {access_token}"
     }
+    meta = {}
+    with requests.get(url, headers=headers, stream=True) as response:
+        record_graph_response("messages", response.status_code)
+        if response.status_code != 200:
+            return fetch_failed(response)
+        messages = list(iter_items(response.iter_content(CHUNK_BYTES), "value", meta))
+    next_link = meta.get("@odata.nextLink")
+    return messages, urljoin(GRAPH_BASE_URL + "/", next_link) if next_link else None
 
-    response = requests.get(url, headers=headers)
-
-    if response.status_code == 200:
-        print("[OK] Email fetch success.")
-        all_emails = response.json().get("value", [])
-        # Only return emails that contain these words in subject or preview
-        return [
-            email for email in all_emails
-            if "tutorial" in (email.get("subject", "") + email.get("bodyPreview", "")).lower()
-            or "tutor" in (email.get("subject", "") + email.get("bodyPreview", "")).lower()
-            or "reschedule" in (email.get("subject", "") + email.get("bodyPreview", "")).lower()
-            or "change" in (email.get("subject", "") + email.get("bodyPreview", "")).lower()
-            or "available" in (email.get("subject", "") + email.get("bodyPreview", "")).lower()
-            or "availability" in (email.get("subject", "") + email.get("bodyPreview", "")).lower()
-            ]
-
-    else:
-        error_msg = f"HTTP {response.status_code}"
-        try:
-            error_detail = response.json()
-            if 'error' in error_detail:
-                error_msg += f": {error_detail['error'].get('message', 'Unknown error')}"
-        except:
-            error_msg += f": {response.text[:200]}"
-        
-        print(f"[ERROR] Email fetch failed - {error_msg}")
-        if response.status_code == 401:
-            print("[ERROR] Authentication failed. Access token may be expired.")
-            # ✅ Return None for 401 errors so main script can handle token refresh
-            return None
-        elif response.status_code == 403:
-            print("[ERROR] Permission denied. Check Graph API permissions.")
-        
-        raise Exception(f"[ERROR] Failed to fetch emails: {error_msg}")
+def fetch_bodies(message_ids, access_token):
+    """
+    {id: body} for up to BATCH_LIMIT messages in one JSON batch; None after a
+    401. A message read or deleted since the listing is left out and skipped
+    until a later poll lists it again.
+    """
+    if not message_ids:
+        return {}
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json"
+    }
+    batch = [{"id": str(i), "method": "GET", "url": f"/me/messages/{message_id}?$select=body"}
+             for i, message_id in enumerate(message_ids)]
+    response = requests.post(f"{GRAPH_BASE_URL}/$batch", headers=headers, json={"requests": batch})
+    record_graph_response("message_body_batch", response.status_code)
+    if response.status_code != 200:
+        return fetch_failed(response)
+    bodies = {}
+    for item in response.json().get("responses", []):
+        status = item.get("status", 0)
+        record_graph_response("message_body", status)
+        if status == 200:
+            bodies[message_ids[int(item["id"])]] = (item.get("body") or {}).get("body")
+        else:
+            print(f"[WARNING] Could not fetch body of message {message_ids[int(item['id'])]}: HTTP {status}")
+    return bodies
+
+def read_page(url, access_token, wanted=is_wanted, recorded=None):
+    """(records of the wanted messages, next page url or None) of one Graph page; None after a 401"""
+    headers = {
+        "Authorization": f"Bearer {access_token}"
+    }
+    records, meta = [], {}
+    with requests.get(url, headers=headers, stream=True) as response:
+        record_graph_response("messages", response.status_code)
+        if response.status_code != 200:
+            return fetch_failed(response)
+        for message in iter_items(response.iter_content(CHUNK_BYTES), "value", meta):
+            if recorded is not None:
+                recorded.append(message)
+            if wanted(message):
+                records.append(EmailRecord.from_graph(message))
+    next_link = meta.get("@odata.nextLink")
+    return records, urljoin(GRAPH_BASE_URL + "/", next_link) if next_link else None
+
+def folder_messages_url(folder, since, until, page_size=PAGE_SIZE):
+    """
+    All messages of a mail folder (well-known name such as inbox or archive,
+    or a folder id) received in [since, until), oldest first. Read state is
+    neither filtered on nor changed.
+    """
+    window = f"receivedDateTime ge {since} and receivedDateTime lt {until}"
+    return (f"{GRAPH_BASE_URL}/me/mailFolders/{folder}/messages?$filter={window}"
+            f"&$orderby=receivedDateTime asc&$select={MESSAGE_FIELDS}&$top={page_size}")
+
+def fetch_failed(response):
+    error_msg = f"HTTP {response.status_code}"
+    try:
+        error_detail = response.json()
+        if 'error' in error_detail:
+            error_msg += f": {error_detail['error'].get('message', 'Unknown error')}"
+    except:
+        error_msg += f": {response.text[:200]}"
+
+    print(f"[ERROR] Email fetch failed - {error_msg}")
+    if response.status_code == 401:
+        print("[ERROR] Authentication failed. Access token may be expired.")
+        # ✅ Return None for 401 errors so main script can handle token refresh
+        return None
+    elif response.status_code == 403:
+        print("[ERROR] Permission denied. Check Graph API permissions.")
+
+    raise Exception(f"[ERROR] Failed to fetch emails: {error_msg}")
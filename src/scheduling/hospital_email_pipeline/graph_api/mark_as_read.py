@@ -1,13 +1,58 @@
+import os
 import requests
+from utils.metrics import record_graph_response
+
+GRAPH_BASE_URL = os.getenv("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0")
 
 def mark_email_as_read(email_id, access_token):
-    url = f"https://graph.microsoft.com/v1.0/me/messages/{email_id}"
+    """True once Graph has marked the email read"""
+    url = f"{GRAPH_BASE_URL}/me/messages/{email_id}"
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Content-Type": "application/json"
     }
     data = {"isRead": True}
     response = requests.patch(url, headers=headers, json=data)
+    record_graph_response("mark_read", response.status_code)
 
     if response.status_code != 200:
         print(f"[ERROR] Failed to mark as read: {response.status_code} - {response.text}")
+        return False
+    return True
+
+# Graph accepts at most 20 requests per JSON batch
+BATCH_LIMIT = 20
+
+def mark_emails_as_read(email_ids, access_token):
+    """Mark several emails read with JSON batching; returns the ids that failed"""
+    failed = []
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json"
+    }
+    for start in range(0, len(email_ids), BATCH_LIMIT):
+        chunk = email_ids[start:start + BATCH_LIMIT]
+        batch = [
+            {"id": str(i), "method": "PATCH", "url": f"/me/messages/{email_id}",
+             "headers": {"Content-Type": "application/json"}, "body": {"isRead": True}}
+            for i, email_id in enumerate(chunk)
+        ]
+        try:
+            response = requests.post(f"{GRAPH_BASE_URL}/$batch", headers=headers, json={"requests": batch})
+        except requests.RequestException as e:
+            print(f"[ERROR] Failed to mark {len(chunk)} emails as read: {e}")
+            failed.extend(chunk)
+            continue
+        record_graph_response("mark_read_batch", response.status_code)
+        if response.status_code != 200:
+            print(f"[ERROR] Failed to mark {len(chunk)} emails as read: {response.status_code} - {response.text}")
+            failed.extend(chunk)
+            continue
+        for item in response.json().get("responses", []):
+            status = item.get("status", 0)
+            record_graph_response("mark_read", status)
+            if status != 200:
+                failed.append(chunk[int(item["id"])])
+    if failed:
+        print(f"[ERROR] {len(failed)} emails could not be marked as read")
+    return failed
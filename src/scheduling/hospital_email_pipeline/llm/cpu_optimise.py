@@ -0,0 +1,166 @@
+import os
+
+# Opt-in optimised CPU execution for LlamaModel (cpu_optimised: true in
+# llm_config.yaml). On CPU the model otherwise runs float32, eager, with
+# torch's default thread pools. This enables, each only where it works:
+#
+#   bfloat16 weights  when the CPU has native bf16 (AMX or AVX-512 BF16) and
+#                     torch has oneDNN; torch_dtype left at auto, no quantization
+#                     (python prepare_model.py --dtype bfloat16 makes a snapshot to map)
+#   sdpa attention    torch.nn.functional.scaled_dot_product_attention
+#   torch.compile     of the forward pass with a static KV cache, so every
+#                     decode step runs the same compiled graph; compiled and
+#                     warmed up at start-up, skipped with a draft model or
+#                     dynamic_int8 (neither works with the static cache)
+#   thread pools      cpu_threads intra-op threads (default: physical cores,
+#                     or the worker's slice under the worker pool) and
+#                     cpu_interop_threads inter-op threads
+#
+# Anything unsupported falls back to the default path with a warning, and so
+# does a compile that fails during warm-up.
+#
+#   cpu_optimised: false
+#   cpu_threads: null
+#   cpu_interop_threads: 1
+#   compile_cache_tokens: 2048   (static cache length; prompt + max_new_tokens must fit)
+
+BF16_FLAGS = ("amx_bf16", "avx512_bf16")
+WARMUP_TEXT = """From: Dr Tan <dr.tan@hospital.sg>
+To: Med Admin <med-admin@hospital.sg>
+Subject: Cardiac Tutorial
+
+I'm available on 10 July (Mon) 2pm and 13 July (Thu) 4pm for the Year 2 batch.
+"""
+WARMUP_NEW_TOKENS = 8
+
+
+def cpu_flags():
+    """Feature flags of the first CPU in /proc/cpuinfo (empty where there is none)"""
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def physical_cores():
+    """Physical cores this process may run on (hyperthread siblings counted once)"""
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    siblings = per_core = None
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                if line.startswith("siblings"):
+                    siblings = int(line.split(":")[1])
+                elif line.startswith("cpu cores"):
+                    per_core = int(line.split(":")[1])
+                if siblings and per_core:
+                    break
+    except (OSError, ValueError):
+        pass
+    threads_per_core = max(1, siblings // per_core) if siblings and per_core else 1
+    return max(1, cores // threads_per_core)
+
+
+def bf16_supported(torch):
+    return bool(set(BF16_FLAGS) & cpu_flags()) and torch.backends.mkldnn.is_available()
+
+
+def plan(torch, torch_dtype=None, quantization=None, draft_model_id=None):
+    """
+    The optimisations to apply: {"torch_dtype", "attn_implementation",
+    "compile", "applied": [...]}, falling back per feature with a warning
+    """
+    options = {"torch_dtype": torch_dtype, "attn_implementation": None, "compile": False, "applied": []}
+    if torch.cuda.is_available():
+        print("[WARNING] cpu_optimised ignored: the model runs on GPU")
+        return options
+
+    quantized = (quantization or "none") != "none"
+    if torch_dtype not in (None, "auto"):
+        print(f"[INFO] cpu_optimised: keeping the configured torch_dtype {torch_dtype}")
+    elif quantized:
+        print(f"[INFO] cpu_optimised: keeping float32 with quantization {quantization}")
+    elif bf16_supported(torch):
+        options["torch_dtype"] = "bfloat16"
+        options["applied"].append("bf16")
+    else:
+        print("[WARNING] cpu_optimised: no native bfloat16 on this CPU (AMX/AVX-512 BF16); staying on float32")
+
+    if hasattr(torch.nn.functional, "scaled_dot_product_attention"):
+        options["attn_implementation"] = "sdpa"
+    else:
+        print("[WARNING] cpu_optimised: this torch has no scaled_dot_product_attention; using eager attention")
+
+    if not hasattr(torch, "compile"):
+        print("[WARNING] cpu_optimised: this torch has no torch.compile; decoding runs eager")
+    elif draft_model_id:
+        print("[INFO] cpu_optimised: torch.compile skipped, assisted generation does not use the static cache")
+    elif quantization == "dynamic_int8":
+        print("[INFO] cpu_optimised: torch.compile skipped for dynamic_int8")
+    else:
+        options["compile"] = True
+    return options
+
+
+def configure_threads(torch, threads=None, interop_threads=1):
+    """Size torch's thread pools; returns (intra-op, inter-op) threads in effect"""
+    # Under the worker pool OMP_NUM_THREADS is the worker's CPU slice
+    threads = threads or int(os.environ.get("OMP_NUM_THREADS") or 0) or physical_cores()
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(interop_threads)
+    except RuntimeError:
+        # Only settable once per process, before any inter-op work (the worker pool sets it first)
+        pass
+    return torch.get_num_threads(), torch.get_num_interop_threads()
+
+
+def compile_decode(torch, model):
+    """Static KV cache plus a compiled forward; returns a function restoring eager decoding"""
+    eager_forward = model.forward
+    previous_cache = getattr(model.generation_config, "cache_implementation", None)
+    model.generation_config.cache_implementation = "static"
+    model.forward = torch.compile(model.forward)
+
+    def restore():
+        model.forward = eager_forward
+        model.generation_config.cache_implementation = previous_cache
+    return restore
+
+
+def warm_up(torch, model, tokenizer, system_prompt, cache_tokens):
+    """
+    Compile the prefill and decode graphs before the first email. The first
+    generation sizes the static cache to cache_tokens; later, shorter ones
+    reuse it, so the decode graph is not recompiled per email. Raises what
+    the compile raises.
+    """
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class StopAfter(StoppingCriteria):
+        def __init__(self, prompt_length):
+            self.prompt_length = prompt_length
+
+        def __call__(self, input_ids, scores, **kwargs):
+            return input_ids.shape[-1] - self.prompt_length >= WARMUP_NEW_TOKENS
+
+    input_ids = tokenizer.apply_chat_template(
+        [{"role": "system", "content": system_prompt}, {"role": "user", "content": WARMUP_TEXT}],
+        return_tensors="pt", tokenize=True, add_generation_prompt=True,
+    ).to(model.device)
+    prompt_length = input_ids.shape[-1]
+    # Twice: torch recompiles once when it first sees a new shape, and that belongs here too
+    for _ in range(2):
+        with torch.no_grad():
+            model.generate(
+                input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                max_new_tokens=max(WARMUP_NEW_TOKENS, cache_tokens - prompt_length),
+                do_sample=False,
+                pad_token_id=tokenizer.pad_token_id,
+                stopping_criteria=StoppingCriteriaList([StopAfter(prompt_length)]),
+            )
@@ -0,0 +1,151 @@
+import os
+import re
+import json
+import math
+import hashlib
+
+# Retrieval-selected few-shot examples for LlamaModel. Instead of the long
+# static system_prompt with its fixed worked examples, the prompt is a short
+# core instruction (core_prompt in llm_config.yaml) plus the few_shot_k
+# solved emails from the example bank that are most similar to the incoming
+# one. Fewer prompt tokens per email means a shorter prefill.
+#
+# Similarity is TF-IDF cosine over the subject and body (headers dropped).
+# Numbers, months, weekdays and times are folded into classes, so a list of
+# dates matches another list of dates whatever the dates are. The bank's
+# vectors are precomputed by prepare_model.py (or on first use) and cached
+# under models/, keyed by the bank's content, so editing the bank rebuilds
+# them.
+#
+#   few_shot_k: 2                                   (0 keeps system_prompt)
+#   few_shot_bank: config/few_shot_examples.jsonl   (relative to the pipeline directory)
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(PIPELINE_DIR, "models")
+# Bump when the features change, so cached vectors are rebuilt
+FEATURES_VERSION = 1
+EXAMPLES_PLACEHOLDER = "{examples}"
+
+HEADER_LINE = re.compile(r"^\s*(from|to|cc|sent|date)\s*:", re.IGNORECASE)
+WORD = re.compile(r"[a-z0-9]+(?:[:.][0-9]+)?")
+TIME = re.compile(r"^\d{1,2}([:.]\d{2})?(am|pm)$|^(am|pm)$")
+MONTHS = {"jan", "january", "feb", "february", "mar", "march", "apr", "april", "may", "jun", "june", "jul", "july",
+          "aug", "august", "sep", "sept", "september", "oct", "october", "nov", "november", "dec", "december"}
+WEEKDAYS = {"mon", "monday", "tue", "tues", "tuesday", "wed", "wednesday", "thu", "thur", "thurs", "thursday",
+            "fri", "friday", "sat", "saturday", "sun", "sunday"}
+
+
+def example_text(example):
+    """An example rendered the way extract_relevant_fields renders an incoming email"""
+    return (f"From: {example['from_name']} <{example['from_email']}>\n"
+            f"To: {example['to_name']} <{example['to_email']}>\n"
+            f"Subject: {example['subject']}\n\n{example['body']}\n")
+
+
+def terms(text):
+    """Unigrams and bigrams of the subject and body, with dates and times folded into classes"""
+    lines = [line for line in text.splitlines() if not HEADER_LINE.match(line)]
+    words = []
+    for word in WORD.findall(" ".join(lines).lower().replace("'", "")):
+        if TIME.match(word):
+            word = "<time>"
+        elif word in MONTHS:
+            word = "<month>"
+        elif word in WEEKDAYS:
+            word = "<weekday>"
+        elif any(c.isdigit() for c in word):
+            word = "<num>"
+        words.append(word)
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def tf_vector(words, idf):
+    """Sublinear TF-IDF, L2-normalised, as a sparse {term: weight}"""
+    counts = {}
+    for word in words:
+        if word in idf:
+            counts[word] = counts.get(word, 0) + 1
+    vector = {word: (1 + math.log(n)) * idf[word] for word, n in counts.items()}
+    norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+    return {word: w / norm for word, w in vector.items()}
+
+
+def build_index(examples):
+    """{"idf": {...}, "vectors": [...]} for the examples"""
+    documents = [terms(example_text(e)) for e in examples]
+    df = {}
+    for words in documents:
+        for word in set(words):
+            df[word] = df.get(word, 0) + 1
+    n = len(documents)
+    idf = {word: math.log((1 + n) / (1 + d)) + 1 for word, d in df.items()}
+    return {"idf": idf, "vectors": [tf_vector(words, idf) for words in documents]}
+
+
+def render_example(number, example):
+    output = {k: v for k, v in example["output"].items() if k not in ("from_name", "from_email", "to_email")}
+    return f"📧 Example {number}\n{example_text(example)}\nExpected Output:\n{json.dumps(output, ensure_ascii=False)}"
+
+
+class ExampleBank:
+    def __init__(self, path, cache_dir=CACHE_DIR):
+        if not os.path.isabs(path):
+            path = os.path.join(PIPELINE_DIR, path)
+        self.path = path
+        with open(path, "rb") as f:
+            raw = f.read()
+        self.examples = [json.loads(line) for line in raw.decode("utf-8").splitlines() if line.strip()]
+        if not self.examples:
+            raise ValueError(f"Example bank {path} is empty")
+        digest = hashlib.sha1(raw + f"features-v{FEATURES_VERSION}".encode()).hexdigest()[:16]
+        self.cache_path = os.path.join(cache_dir, f"few_shot_{digest}.json")
+        self.index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+        index = build_index(self.examples)
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"[WARNING] Could not cache the few-shot index: {e}")
+        return index
+
+    def nearest(self, email_text, k):
+        """The k most similar examples as (similarity, example), best first"""
+        query = tf_vector(terms(email_text), self.index["idf"])
+        scored = [(sum(w * vector.get(word, 0.0) for word, w in query.items()), i)
+                  for i, vector in enumerate(self.index["vectors"])]
+        # Ties keep the bank's order, so prompts are reproducible
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(score, self.examples[i]) for score, i in scored[:k]]
+
+
+class FewShotPrompter:
+    def __init__(self, core_prompt, bank, k):
+        if EXAMPLES_PLACEHOLDER not in core_prompt:
+            raise ValueError(f"core_prompt needs an {EXAMPLES_PLACEHOLDER} placeholder for the retrieved examples")
+        self.core_prompt = core_prompt
+        self.bank = bank
+        self.k = k
+
+    @classmethod
+    def from_config(cls, config):
+        """A prompter for the config, or None when few_shot_k is 0 (system_prompt is used as is)"""
+        k = int(config.get("few_shot_k") or 0)
+        if k <= 0:
+            return None
+        return cls(config["core_prompt"], ExampleBank(config["few_shot_bank"]), k)
+
+    def system_prompt(self, email_text):
+        examples = [example for _, example in self.bank.nearest(email_text, self.k)]
+        # Most similar last, closest to the email
+        blocks = [render_example(i, e) for i, e in enumerate(reversed(examples), 1)]
+        return self.core_prompt.replace(EXAMPLES_PLACEHOLDER, "\n\n---\n\n".join(blocks))
@@ -0,0 +1,72 @@
+import os
+import json
+import socket
+import http.client
+from urllib.parse import urlparse
+
+# Client side of llm/inference_server.py. Stdlib only, so a monitor in
+# client mode starts without importing torch or transformers.
+#
+# The server address comes from the `inference_server` key of the model's
+# YAML config, or the INFERENCE_SERVER env var when the key is absent:
+#
+#   INFERENCE_SERVER=http://127.0.0.1:8765
+#   INFERENCE_SERVER=unix:///tmp/email-llm.sock
+
+
+def server_address(config):
+    return config.get("inference_server", os.getenv("INFERENCE_SERVER")) or None
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class InferenceClient:
+    def __init__(self, address, timeout=600):
+        self.address = address
+        self.timeout = timeout
+        parsed = urlparse(address)
+        if parsed.scheme == "unix":
+            self.socket_path = parsed.path
+        elif parsed.scheme == "http":
+            self.socket_path = None
+            self.host, self.port = parsed.hostname, parsed.port or 80
+        else:
+            raise ValueError(f"Unsupported inference server address '{address}' (use http://host:port or unix:///path)")
+
+    def _connection(self, timeout):
+        if self.socket_path:
+            return UnixHTTPConnection(self.socket_path, timeout=timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _request(self, method, path, payload=None, timeout=None):
+        connection = self._connection(timeout or self.timeout)
+        try:
+            body = json.dumps(payload).encode("utf-8") if payload is not None else None
+            headers = {"Content-Type": "application/json"} if body else {}
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = json.loads(response.read() or b"{}")
+            if response.status != 200:
+                raise RuntimeError(f"{path} returned {response.status}: {data.get('error', data)}")
+            return data
+        finally:
+            connection.close()
+
+    def health(self, timeout=2):
+        """Server status, or None when it cannot be reached"""
+        try:
+            return self._request("GET", "/healthz", timeout=timeout)
+        except (OSError, RuntimeError, ValueError, http.client.HTTPException):
+            return None
+
+    def generate(self, kind, text):
+        return self._request("POST", f"/v1/{kind}", {"text": text})["output"]
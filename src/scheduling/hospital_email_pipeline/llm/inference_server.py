@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import argparse
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PIPELINE_DIR)
+from utils.metrics import REGISTRY, QUEUE_DEPTH, STAGE_SECONDS, stage
+
+# Long-lived local inference service. It loads the extraction and reply models
+# once and serves every Python entry point on the host, so restarting the
+# monitor no longer reloads a model. Requests for the same model are queued
+# and the ones that arrive within --batch-wait-ms are run as one batch.
+#
+#   python llm/inference_server.py --port 8765
+#   python llm/inference_server.py --socket /tmp/email-llm.sock --max-batch 8
+#
+# Clients: LlamaModel/LlamaReplyModel with INFERENCE_SERVER=http://127.0.0.1:8765
+# (or unix:///tmp/email-llm.sock) set, see llm/inference_client.py.
+#
+#   POST /v1/extract  {"text": ...}  ->  {"output": ...}
+#   POST /v1/reply    {"text": ...}  ->  {"output": ...}
+#   GET  /healthz, GET /metrics
+
+MAX_BODY_BYTES = 1_000_000
+
+
+class Batcher:
+    """Serialises one model behind a queue and groups requests that arrive close together"""
+
+    def __init__(self, name, model, max_batch=4, wait_ms=20):
+        self.name = name
+        self.model = model
+        self.max_batch = max_batch
+        self.wait = wait_ms / 1000.0
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.requests = 0
+        threading.Thread(target=self._run, name=f"batcher-{name}", daemon=True).start()
+
+    def submit(self, text):
+        future = Future()
+        self.queue.put((text, future, time.perf_counter()))
+        QUEUE_DEPTH.set(self.queue.qsize(), model=self.name)
+        return future
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            QUEUE_DEPTH.set(self.queue.qsize(), model=self.name)
+            texts = [text for text, _, _ in batch]
+            started = time.perf_counter()
+            for _, _, queued_at in batch:
+                STAGE_SECONDS.observe(started - queued_at, stage="server_queue")
+            try:
+                with stage(f"server_{self.name}"):
+                    if len(texts) > 1 and hasattr(self.model, "generate_batch"):
+                        outputs = self.model.generate_batch(texts)
+                    else:
+                        outputs = [self.model.generate(text) for text in texts]
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.requests += len(batch)
+            for (_, future, _), output in zip(batch, outputs):
+                future.set_result(output)
+
+
+def make_handler(batchers, started_at):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload, content_type="application/json"):
+            body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/healthz":
+                self._send(200, {
+                    "status": "ok",
+                    "models": sorted(batchers),
+                    "model_ids": {name: getattr(b.model, "model_id", None) for name, b in batchers.items()},
+                    "queued": {name: b.queue.qsize() for name, b in batchers.items()},
+                    "requests": {name: b.requests for name, b in batchers.items()},
+                    "batches": {name: b.batches for name, b in batchers.items()},
+                    "uptime_seconds": round(time.time() - started_at, 1),
+                })
+            elif self.path == "/metrics":
+                self._send(200, REGISTRY.render().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            name = self.path.rsplit("/", 1)[-1] if self.path.startswith("/v1/") else None
+            if name not in batchers:
+                self._send(404, {"error": f"unknown model endpoint {self.path}"})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            if not 0 < length <= MAX_BODY_BYTES:
+                self._send(413 if length else 400, {"error": "request body missing or too large"})
+                return
+            try:
+                text = json.loads(self.rfile.read(length))["text"]
+            except (ValueError, KeyError, TypeError):
+                self._send(400, {"error": "expected a JSON body with a 'text' field"})
+                return
+            try:
+                output = batchers[name].submit(text).result()
+            except Exception as e:
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+                return
+            self._send(200, {"output": output})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # BaseHTTPRequestHandler expects an (host, port) client address
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+def load_models(names):
+    """Load the requested models in-process (never as clients of another server)"""
+    models = {}
+    local = {"inference_server": None}
+    if "extract" in names:
+        from llm.llama_model import LlamaModel
+        models["extract"] = LlamaModel(overrides=local)
+    if "reply" in names:
+        from llm.llm_reply import LlamaReplyModel
+        models["reply"] = LlamaReplyModel(overrides=local)
+    return models
+
+
+def serve(models, host="127.0.0.1", port=8765, socket_path=None, max_batch=4, wait_ms=20):
+    batchers = {name: Batcher(name, model, max_batch, wait_ms) for name, model in models.items()}
+    handler = make_handler(batchers, time.time())
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = UnixHTTPServer(socket_path, handler)
+        os.chmod(socket_path, 0o660)
+        address = f"unix://{socket_path}"
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        address = f"http://{host}:{server.server_address[1]}"
+    print(f"[OK] Inference server for {', '.join(sorted(batchers))} on {address} (max batch {max_batch}, wait {wait_ms:g} ms)")
+    print(f"[INFO] Point clients at it with INFERENCE_SERVER={address}")
+    return server, address
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local LLM inference server shared by the monitor and other tools")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.getenv("INFERENCE_PORT", "8765")))
+    parser.add_argument("--socket", help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("--models", default="extract,reply", help="Comma-separated: extract, reply")
+    parser.add_argument("--max-batch", type=int, default=4, help="Largest batch per model (1 disables batching)")
+    parser.add_argument("--batch-wait-ms", type=float, default=20, help="How long the first request waits for others to join its batch")
+    args = parser.parse_args()
+
+    print("[INFO] Loading LLM models...")
+    models = load_models([m.strip() for m in args.models.split(",") if m.strip()])
+    server, address = serve(models, args.host, args.port, args.socket, args.max_batch, args.batch_wait_ms)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+        print("[INFO] Inference server stopped")
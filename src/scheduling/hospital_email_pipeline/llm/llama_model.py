@@ -1,53 +1,130 @@
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
 import yaml
 import os
+import time
+from llm.inference_client import InferenceClient, server_address
+from llm.speculative import load_draft_model, check_compatible, count_forwards, record_speculation
+from llm.few_shot import FewShotPrompter
+from utils.metrics import stage, GenerationTimer
+
+# torch/transformers are imported on the first in-process load; client mode never needs them
+torch = None
 
 class LlamaModel:
-    def __init__(self):
+    def __init__(self, model_id=None, overrides=None):
         config_path = os.path.join(os.path.dirname(__file__), "../config/llm_config.yaml")
         config_path = os.path.abspath(config_path)
 
         with open(config_path, "r") as f:
             config = yaml.safe_load(f)
+        # Benchmarks pass overrides for any config key (max_new_tokens, system_prompt, torch_dtype, ...)
+        config.update(overrides or {})
 
-        self.model_id = config["model_id"]
+        self.model_id = model_id or config["model_id"]
         self.system_prompt = config["system_prompt"]
         self.max_new_tokens = config["max_new_tokens"]
         self.temperature = config["temperature"]
         self.top_k = config["top_k"]
         self.top_p = config["top_p"]
+        self.torch_dtype = config.get("torch_dtype")
+        self.quantization = config.get("quantization")
+        self.mmap_weights = config.get("mmap_weights", False)
+        self.use_prepared = config.get("use_prepared", True)
+        self.draft_model_id = config.get("draft_model_id")
+        self.num_assistant_tokens = config.get("num_assistant_tokens", 5)
+        # None unless few_shot_k > 0; then each email gets its own system prompt
+        self.prompter = FewShotPrompter.from_config(config)
+        # See llm/cpu_optimise.py
+        self.cpu_optimised = config.get("cpu_optimised", False)
+        self.cpu_threads = config.get("cpu_threads")
+        self.cpu_interop_threads = config.get("cpu_interop_threads", 1)
+        self.compile_cache_tokens = config.get("compile_cache_tokens", 2048)
+        self.cpu_optimisations = []
+
+        # Client mode: a running llm/inference_server.py owns the model
+        self.client = None
+        address = server_address(config)
+        if address:
+            client = InferenceClient(address)
+            status = client.health()
+            if status and "extract" in status.get("models", []):
+                self.client = client
+                print(f"[OK] Using inference server at {address}")
+                return
+            print(f"[WARNING] Inference server at {address} not available; loading the model in-process")
+
+        global torch
+        import torch
+        from transformers import AutoTokenizer
+        from llm.loading import load_causal_lm, resolve_weights
+
+        options = {"attn_implementation": None, "compile": False}
+        if self.cpu_optimised:
+            from llm import cpu_optimise
+            threads, interop = cpu_optimise.configure_threads(torch, self.cpu_threads, self.cpu_interop_threads)
+            print(f"[INFO] CPU threads: {threads} intra-op, {interop} inter-op")
+            options = cpu_optimise.plan(torch, self.torch_dtype, self.quantization, self.draft_model_id)
+            self.torch_dtype = options["torch_dtype"]
+            self.cpu_optimisations = list(options["applied"])
 
         print("[INFO] Loading tokenizer and model...")
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_id, trust_remote_code=True)
+        source, mmap_weights = resolve_weights(self.model_id, self.torch_dtype, self.mmap_weights, self.use_prepared)
+        self.tokenizer = AutoTokenizer.from_pretrained(source, trust_remote_code=True)
         
         # Set pad token if not already set
         if self.tokenizer.pad_token is None:
             self.tokenizer.pad_token = self.tokenizer.eos_token
             print("[INFO] Set pad_token to eos_token")
         
-        self.model = AutoModelForCausalLM.from_pretrained(
-            self.model_id,
-            device_map="auto",
-            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-            trust_remote_code=True
-        )
+        self.model = load_causal_lm(source, self.torch_dtype, self.quantization, mmap_weights, options["attn_implementation"])
         print("[OK] Model loaded successfully on:", self.model.device)
+        if options["attn_implementation"] and getattr(self.model.config, "_attn_implementation", None) == options["attn_implementation"]:
+            self.cpu_optimisations.append(options["attn_implementation"])
+
+        self.draft_model = None
+        if self.draft_model_id:
+            check_compatible(self.tokenizer, self.draft_model_id)
+            self.draft_model = load_draft_model(self.draft_model_id, self.torch_dtype, self.num_assistant_tokens, self.use_prepared)
+            print(f"[OK] Assisted generation with draft model {self.draft_model_id}")
+
+        if options["compile"]:
+            self._compile()
+        if self.cpu_optimised:
+            print(f"[OK] CPU-optimised mode: {', '.join(self.cpu_optimisations) or 'nothing supported, default path'}")
+
+    def _compile(self):
+        """torch.compile the decode step and warm it up; stays eager if that fails"""
+        from llm.cpu_optimise import compile_decode, warm_up, WARMUP_TEXT
+        print("[INFO] Compiling the decode step (warm-up)...")
+        started = time.perf_counter()
+        restore = compile_decode(torch, self.model)
+        try:
+            warm_up(torch, self.model, self.tokenizer, self.prompt_for(WARMUP_TEXT), self.compile_cache_tokens)
+        except Exception as e:
+            restore()
+            torch._dynamo.reset()
+            print(f"[WARNING] torch.compile failed during warm-up ({type(e).__name__}: {e}); decoding runs eager")
+            return
+        self.cpu_optimisations.append("compile")
+        print(f"[OK] Decode step compiled in {time.perf_counter() - started:.1f}s")
 
     def generate(self, email_text):
+        if self.client:
+            return self._generate_remote(email_text)
+
         print("[INFO] Preparing input...")
         messages = [
-            {"role": "system", "content": self.system_prompt},
+            {"role": "system", "content": self.prompt_for(email_text)},
             {"role": "user", "content": email_text}
         ]
         
         try:
-            input_ids = self.tokenizer.apply_chat_template(
-                messages,
-                return_tensors="pt",
-                tokenize=True,
-                add_generation_prompt=True
-            ).to(self.model.device)
+            with stage("tokenize"):
+                input_ids = self.tokenizer.apply_chat_template(
+                    messages,
+                    return_tensors="pt",
+                    tokenize=True,
+                    add_generation_prompt=True
+                ).to(self.model.device)
             
             # Create attention mask
             attention_mask = torch.ones_like(input_ids)
@@ -58,7 +135,10 @@ class LlamaModel:
 
         try:
             print("[INFO] Generating output...")
-            with torch.no_grad():
+            timer = GenerationTimer()
+            # Only set when a draft model is configured: plain generate() otherwise
+            assisted = {"assistant_model": self.draft_model} if self.draft_model is not None else {}
+            with torch.no_grad(), count_forwards(self.model) as verify, count_forwards(self.draft_model) as draft:
                 output_ids = self.model.generate(
                     input_ids,
                     attention_mask=attention_mask,
@@ -69,7 +149,13 @@ class LlamaModel:
                     top_p=self.top_p,
                     eos_token_id=self.tokenizer.eos_token_id,
                     pad_token_id=self.tokenizer.pad_token_id,
+                    streamer=timer,
+                    **assisted,
                 )
+            new_tokens = output_ids.shape[-1] - input_ids.shape[-1]
+            timer.record(input_ids.shape[-1], new_tokens)
+            if assisted:
+                record_speculation(new_tokens, verify.count, draft.count)
             print("[OK] Output generated.")
         except Exception as e:
             print("[ERROR] Generation error:", e)
@@ -87,4 +173,58 @@ class LlamaModel:
             return response_text
         except Exception as e:
             print("[ERROR] Decoding error:", e)
-            return ""
\ No newline at end of file
+            return ""
+
+    def generate_batch(self, email_texts):
+        """Generate for several emails in one left-padded batch; failed items come back as """""
+        if not email_texts:
+            return []
+        if self.client:
+            # Concurrent requests let the server batch them
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=len(email_texts)) as pool:
+                return list(pool.map(self._generate_remote, email_texts))
+        prompts = [
+            self.tokenizer.apply_chat_template(
+                [{"role": "system", "content": self.prompt_for(text)}, {"role": "user", "content": text}],
+                tokenize=False,
+                add_generation_prompt=True,
+            )
+            for text in email_texts
+        ]
+        try:
+            with stage("tokenize"):
+                self.tokenizer.padding_side = "left"
+                inputs = self.tokenizer(prompts, return_tensors="pt", padding=True, add_special_tokens=False).to(self.model.device)
+            timer = GenerationTimer()
+            # The compiled static cache is sized for one email; a batch would replace it with a bigger one
+            dynamic_cache = {"cache_implementation": None} if "compile" in self.cpu_optimisations else {}
+            with torch.no_grad():
+                output_ids = self.model.generate(
+                    **inputs,
+                    max_new_tokens=self.max_new_tokens,
+                    do_sample=False,
+                    eos_token_id=self.tokenizer.eos_token_id,
+                    pad_token_id=self.tokenizer.pad_token_id,
+                    streamer=timer,
+                    **dynamic_cache,
+                )
+            prompt_length = inputs["input_ids"].shape[-1]
+            response_ids = output_ids[:, prompt_length:]
+            new_tokens = int((response_ids != self.tokenizer.pad_token_id).sum())
+            timer.record(int(inputs["attention_mask"].sum()), new_tokens)
+            return [self.tokenizer.decode(ids, skip_special_tokens=True).strip() for ids in response_ids]
+        except Exception as e:
+            print("[ERROR] Batch generation error:", e)
+            return [""] * len(email_texts)
+
+    def prompt_for(self, email_text):
+        """The system prompt for one email: retrieved examples with a prompter, else the static system_prompt"""
+        return self.prompter.system_prompt(email_text) if self.prompter else self.system_prompt
+
+    def _generate_remote(self, email_text):
+        try:
+            return self.client.generate("extract", email_text)
+        except Exception as e:
+            print("[ERROR] Inference server error:", e)
+            return ""
@@ -1,40 +1,65 @@
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
 import yaml
 import os
+from llm.inference_client import InferenceClient, server_address
+from utils.metrics import stage, GenerationTimer
+
+# torch/transformers are imported on the first in-process load; client mode never needs them
+torch = None
 
 class LlamaReplyModel:
-    def __init__(self):
+    def __init__(self, model_id=None, overrides=None):
         config_path = os.path.join(os.path.dirname(__file__), "../config/llm_reply.yaml")
         config_path = os.path.abspath(config_path)
 
         with open(config_path, "r") as f:
             config = yaml.safe_load(f)
+        # Benchmarks pass overrides for any config key (max_new_tokens, system_prompt, torch_dtype, ...)
+        config.update(overrides or {})
 
-        self.model_id = config["model_id"]
+        self.model_id = model_id or config["model_id"]
         self.system_prompt = config["system_prompt"]
         self.max_new_tokens = config["max_new_tokens"]
         self.temperature = config["temperature"]
         self.top_k = config["top_k"]
         self.top_p = config["top_p"]
+        self.torch_dtype = config.get("torch_dtype")
+        self.quantization = config.get("quantization")
+        self.mmap_weights = config.get("mmap_weights", False)
+        self.use_prepared = config.get("use_prepared", True)
+
+        # Client mode: a running llm/inference_server.py owns the model
+        self.client = None
+        address = server_address(config)
+        if address:
+            client = InferenceClient(address)
+            status = client.health()
+            if status and "reply" in status.get("models", []):
+                self.client = client
+                print(f"[OK] Using inference server at {address}")
+                return
+            print(f"[WARNING] Inference server at {address} not available; loading the model in-process")
+
+        global torch
+        import torch
+        from transformers import AutoTokenizer
+        from llm.loading import load_causal_lm, resolve_weights
 
         print("[INFO] Loading tokenizer and model...")
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_id, trust_remote_code=True)
+        source, mmap_weights = resolve_weights(self.model_id, self.torch_dtype, self.mmap_weights, self.use_prepared)
+        self.tokenizer = AutoTokenizer.from_pretrained(source, trust_remote_code=True)
         
         # Set pad token if not already set
         if self.tokenizer.pad_token is None:
             self.tokenizer.pad_token = self.tokenizer.eos_token
             print("[INFO] Set pad_token to eos_token")
         
-        self.model = AutoModelForCausalLM.from_pretrained(
-            self.model_id,
-            device_map="auto",
-            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-            trust_remote_code=True
-        )
+        self.model = load_causal_lm(source, self.torch_dtype, self.quantization, mmap_weights)
         print("[OK] Model loaded successfully on:", self.model.device)
 
     def generate(self, email_text):
+        if self.client:
+            return self._generate_remote(email_text)
+
         print("[INFO] Preparing input...")
         messages = [
             {"role": "system", "content": self.system_prompt},
@@ -42,12 +67,13 @@ class LlamaReplyModel:
         ]
         
         try:
-            input_ids = self.tokenizer.apply_chat_template(
-                messages,
-                return_tensors="pt",
-                tokenize=True,
-                add_generation_prompt=True
-            ).to(self.model.device)
+            with stage("tokenize"):
+                input_ids = self.tokenizer.apply_chat_template(
+                    messages,
+                    return_tensors="pt",
+                    tokenize=True,
+                    add_generation_prompt=True
+                ).to(self.model.device)
             
             # Create attention mask
             attention_mask = torch.ones_like(input_ids)
@@ -58,6 +84,7 @@ class LlamaReplyModel:
 
         try:
             print("[INFO] Generating output...")
+            timer = GenerationTimer()
             with torch.no_grad():
                 output_ids = self.model.generate(
                     input_ids,
@@ -69,7 +96,9 @@ class LlamaReplyModel:
                     top_p=self.top_p,
                     eos_token_id=self.tokenizer.eos_token_id,
                     pad_token_id=self.tokenizer.pad_token_id,
+                    streamer=timer,
                 )
+            timer.record(input_ids.shape[-1], output_ids.shape[-1] - input_ids.shape[-1])
             print("[OK] Output generated.")
         except Exception as e:
             print("[ERROR] Generation error:", e)
@@ -87,4 +116,11 @@ class LlamaReplyModel:
             return response_text
         except Exception as e:
             print("[ERROR] Decoding error:", e)
-            return ""
\ No newline at end of file
+            return ""
+
+    def _generate_remote(self, email_text):
+        try:
+            return self.client.generate("reply", email_text)
+        except Exception as e:
+            print("[ERROR] Inference server error:", e)
+            return ""
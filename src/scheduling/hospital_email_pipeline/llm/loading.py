@@ -0,0 +1,191 @@
+import os
+import torch
+from transformers import AutoModelForCausalLM
+
+# Shared model loading for LlamaModel and LlamaReplyModel. Both read the same
+# optional YAML keys:
+#
+#   torch_dtype:  auto | float32 | float16 | bfloat16   (auto: fp16 on GPU, fp32 on CPU)
+#   quantization: none | dynamic_int8 | bnb_8bit | bnb_4bit
+#   mmap_weights: false | true   (map the safetensors read-only instead of copying them; CPU only)
+#   use_prepared: true | false   (load the snapshot written by prepare_model.py when there is one)
+#
+# load_causal_lm also takes an attn_implementation (llm/cpu_optimise.py asks
+# for sdpa); a model that does not support it is loaded with the default.
+#
+# dynamic_int8 quantizes the Linear layers after loading and runs on CPU;
+# the bnb_* modes need bitsandbytes and a GPU.
+
+DTYPES = {"float32": torch.float32, "float16": torch.float16, "bfloat16": torch.bfloat16}
+PREPARED_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+PREPARED_MARKER = "prepared.json"
+QUANTIZATIONS = ("none", "dynamic_int8", "bnb_8bit", "bnb_4bit")
+
+
+def resolve_dtype(name=None):
+    if not name or name == "auto":
+        return torch.float16 if torch.cuda.is_available() else torch.float32
+    if name not in DTYPES:
+        raise ValueError(f"Unknown torch_dtype '{name}', expected one of: auto, {', '.join(DTYPES)}")
+    return DTYPES[name]
+
+
+def dtype_name(dtype):
+    return next(name for name, value in DTYPES.items() if value == dtype)
+
+
+def prepared_dir(model_id, torch_dtype=None):
+    """Where prepare_model.py keeps the snapshot of model_id in the resolved dtype"""
+    return os.path.join(PREPARED_ROOT, f"{model_id.replace('/', '--')}-{dtype_name(resolve_dtype(torch_dtype))}")
+
+
+def find_prepared(model_id, torch_dtype=None):
+    """The prepared snapshot directory if one was completed for this model and dtype, else None"""
+    path = prepared_dir(model_id, torch_dtype)
+    return path if os.path.exists(os.path.join(path, PREPARED_MARKER)) else None
+
+
+def resolve_weights(model_id, torch_dtype=None, mmap_weights=False, use_prepared=True):
+    """
+    (source, mmap_weights) to load from. A prepared snapshot is already in the
+    target dtype and next to its tokenizer, so on CPU it is always mapped: no
+    Hub lookup, no conversion and no copy of the weights. On GPU it is loaded
+    onto the device like any other checkpoint.
+    """
+    prepared = find_prepared(model_id, torch_dtype) if use_prepared else None
+    if prepared:
+        print(f"[INFO] Using prepared weights: {prepared}")
+        return prepared, not torch.cuda.is_available()
+    return model_id, mmap_weights
+
+
+def load_causal_lm(model_id, torch_dtype=None, quantization=None, mmap_weights=False, attn_implementation=None):
+    quantization = quantization or "none"
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization '{quantization}', expected one of: {', '.join(QUANTIZATIONS)}")
+
+    if mmap_weights and torch.cuda.is_available():
+        # The mapped weights stay on the CPU; device_map puts the model on the GPU
+        print("[INFO] mmap_weights ignored: a GPU is available")
+        mmap_weights = False
+
+    if mmap_weights and not quantization.startswith("bnb_"):
+        model = load_causal_lm_mmap(find_weights_dir(model_id), torch_dtype, attn_implementation)
+        if quantization == "dynamic_int8":
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    kwargs = {"device_map": "auto", "torch_dtype": resolve_dtype(torch_dtype), "trust_remote_code": True}
+    if quantization.startswith("bnb_"):
+        from transformers import BitsAndBytesConfig
+        if quantization == "bnb_4bit":
+            kwargs["quantization_config"] = BitsAndBytesConfig(load_in_4bit=True, bnb_4bit_compute_dtype=kwargs["torch_dtype"])
+        else:
+            kwargs["quantization_config"] = BitsAndBytesConfig(load_in_8bit=True)
+
+    if attn_implementation:
+        kwargs["attn_implementation"] = attn_implementation
+    try:
+        model = AutoModelForCausalLM.from_pretrained(model_id, **kwargs)
+    except ValueError as e:
+        # Raised from the config check, before any weights are read
+        if "attn_implementation" not in kwargs:
+            raise
+        print(f"[WARNING] {kwargs.pop('attn_implementation')} attention not available ({e}); using the default")
+        model = AutoModelForCausalLM.from_pretrained(model_id, **kwargs)
+    if quantization == "dynamic_int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.eval()
+    return model
+
+
+# safetensors dtype tags -> torch dtypes
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8,
+    "U8": torch.uint8, "BOOL": torch.bool,
+}
+
+
+def mmap_safetensors(path):
+    """
+    Tensors of one .safetensors file as views of a read-only mmap. Nothing is
+    copied, so every process mapping the same file shares the page cache.
+    """
+    import json
+    import mmap
+    import struct
+    import warnings
+
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    with warnings.catch_warnings():
+        # The buffer is deliberately read-only; torch warns about that
+        warnings.simplefilter("ignore")
+        raw = torch.frombuffer(mapped, dtype=torch.uint8)
+
+    base = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        start, end = info["data_offsets"]
+        dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        tensors[name] = raw[base + start:base + end].view(dtype).reshape(info["shape"])
+    return tensors
+
+
+def load_causal_lm_mmap(weights_dir, torch_dtype=None, attn_implementation=None):
+    """Build the model around memory-mapped safetensors instead of private copies of the weights"""
+    import glob
+    from accelerate import init_empty_weights
+    from transformers import AutoConfig
+
+    dtype = resolve_dtype(torch_dtype)
+    config = AutoConfig.from_pretrained(weights_dir, trust_remote_code=True)
+    kwargs = {"attn_implementation": attn_implementation} if attn_implementation else {}
+    with init_empty_weights():
+        try:
+            model = AutoModelForCausalLM.from_config(config, torch_dtype=dtype, trust_remote_code=True, **kwargs)
+        except ValueError as e:
+            if not kwargs:
+                raise
+            print(f"[WARNING] {attn_implementation} attention not available ({e}); using the default")
+            model = AutoModelForCausalLM.from_config(config, torch_dtype=dtype, trust_remote_code=True)
+
+    files = sorted(glob.glob(os.path.join(weights_dir, "*.safetensors")))
+    if not files:
+        raise FileNotFoundError(f"No .safetensors files in {weights_dir}")
+
+    state = {}
+    converted = 0
+    for path in files:
+        for name, tensor in mmap_safetensors(path).items():
+            if tensor.is_floating_point() and tensor.dtype != dtype:
+                # Converting makes a private copy; a dtype-ready snapshot avoids this
+                tensor = tensor.to(dtype)
+                converted += 1
+            state[name] = tensor
+
+    model.load_state_dict(state, strict=False, assign=True)
+    model.tie_weights()
+    left_on_meta = [name for name, p in model.named_parameters() if p.is_meta]
+    if left_on_meta:
+        raise ValueError(f"Weights missing from {weights_dir}: {', '.join(left_on_meta[:5])}")
+    if converted:
+        dtype_name = str(dtype).replace("torch.", "")
+        print(f"[WARNING] {converted} tensors converted to {dtype_name}; they are private to this process, not shared "
+              f"(python prepare_model.py --dtype {dtype_name} stores a snapshot that maps as is)")
+    model.eval()
+    return model
+
+
+def find_weights_dir(model_id):
+    """Local directory holding the model's safetensors: the path itself or its Hugging Face cache snapshot"""
+    if os.path.isdir(model_id):
+        return model_id
+    from huggingface_hub import snapshot_download
+    return snapshot_download(model_id, allow_patterns=["*.json", "*.safetensors"], local_files_only=True)
@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+from utils.metrics import SPECULATIVE_TOKENS
+
+# Assisted (speculative) generation for LlamaModel. A small draft model that
+# shares the main model's tokenizer proposes a few tokens, and the main model
+# checks them all in one forward pass. Under greedy decoding the main model
+# keeps exactly the tokens it would have produced on its own, so the output
+# does not change; only the number of slow forward passes does.
+#
+#   draft_model_id: meta-llama/Llama-3.2-1B-Instruct   (null disables)
+#   num_assistant_tokens: 5                             (draft tokens per round, adapted by transformers)
+
+
+def load_draft_model(draft_model_id, torch_dtype=None, num_assistant_tokens=5, use_prepared=True):
+    from llm.loading import load_causal_lm, resolve_weights
+
+    print(f"[INFO] Loading draft model {draft_model_id} for assisted generation...")
+    source, mmap_weights = resolve_weights(draft_model_id, torch_dtype, use_prepared=use_prepared)
+    draft = load_causal_lm(source, torch_dtype, mmap_weights=mmap_weights)
+    draft.generation_config.num_assistant_tokens = num_assistant_tokens
+    return draft
+
+
+def check_compatible(tokenizer, draft_model_id, source=None):
+    """The draft must tokenize exactly like the main model, or its proposals are meaningless"""
+    from transformers import AutoTokenizer
+    draft_tokenizer = AutoTokenizer.from_pretrained(source or draft_model_id, trust_remote_code=True)
+    if draft_tokenizer.get_vocab() != tokenizer.get_vocab():
+        raise ValueError(f"Draft model {draft_model_id} does not share the main model's tokenizer")
+
+
+class _ForwardCount:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, module, inputs, output):
+        self.count += 1
+
+
+@contextmanager
+def count_forwards(model):
+    """Count forward passes of a model (no-op for None)"""
+    counter = _ForwardCount()
+    handle = model.register_forward_hook(counter) if model is not None else None
+    try:
+        yield counter
+    finally:
+        if handle is not None:
+            handle.remove()
+
+
+def record_speculation(new_tokens, verify_passes, draft_passes):
+    """
+    Each verification pass keeps the accepted draft tokens plus one token of
+    its own, and each draft pass proposes one token, so:
+    accepted = new tokens - verification passes, proposed = draft passes.
+    """
+    accepted = max(0, new_tokens - verify_passes)
+    SPECULATIVE_TOKENS.inc(accepted, result="accepted")
+    SPECULATIVE_TOKENS.inc(max(accepted, draft_passes), result="proposed")
@@ -0,0 +1,327 @@
+import os
+import sys
+import time
+import itertools
+import collections
+import threading
+import contextlib
+import multiprocessing
+import multiprocessing.connection
+from concurrent.futures import Future
+from utils.metrics import REGISTRY
+
+# N inference processes behind one generate() call. Each worker is pinned to
+# its own slice of the CPUs with a matching torch thread count, and maps the
+# safetensors weights read-only (mmap_weights), so the model is in memory
+# once no matter how many workers run. The pool hands each email to an idle
+# worker over that worker's own pipe, and results come back on another, so
+# workers share no queue or lock a dying worker could leave held. A worker's
+# [WARNING] and [ERROR] lines reach stderr (tensors converted at load are not
+# shared, for one); the rest of its output is dropped. Metrics a worker
+# records (stage timings, tokens) are sent back after each email and merged
+# into the monitor's registry, so /metrics covers generation too.
+#
+# A worker that dies (crash, OOM kill) fails the email it was working on and
+# is respawned on the same cores, up to MAX_RESPAWNS times per slot. When no
+# worker is left, pending and new requests raise instead of blocking.
+
+MAX_RESPAWNS = 3
+# No task in progress for a worker
+IDLE = -1
+# Longest the collector waits before noticing close()
+LIVENESS_SECONDS = 1.0
+
+
+def load_extraction_model(model_id=None, overrides=None):
+    from llm.llama_model import LlamaModel
+    return LlamaModel(model_id=model_id, overrides=dict(overrides or {}, mmap_weights=True))
+
+
+def load_reply_model(model_id=None, overrides=None):
+    from llm.llm_reply import LlamaReplyModel
+    return LlamaReplyModel(model_id=model_id, overrides=dict(overrides or {}, mmap_weights=True))
+
+
+MODEL_FACTORIES = {"extract": load_extraction_model, "reply": load_reply_model}
+
+
+def split_cores(workers, cores=None):
+    """Contiguous, equal CPU slices, one per worker"""
+    if cores is None:
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    per_worker = max(1, len(cores) // workers)
+    return [cores[i * per_worker:(i + 1) * per_worker] or cores[-1:] for i in range(workers)]
+
+
+class _WarningsOnly:
+    """stdout for a worker: the model's [INFO]/[OK] chatter is dropped, warnings and errors go to stderr"""
+
+    def __init__(self, index):
+        self.index = index
+        self.partial = ""
+
+    def write(self, text):
+        lines = (self.partial + text).split("\n")
+        self.partial = lines.pop()
+        for line in lines:
+            tag, _, rest = line.partition(" ")
+            if tag in ("[WARNING]", "[ERROR]"):
+                sys.stderr.write(f"{tag} Inference worker {self.index}: {rest}\n")
+        return len(text)
+
+    def flush(self):
+        sys.stderr.flush()
+
+
+def _worker_main(index, cores, factory, model_id, overrides, tasks, results):
+    # Pin and size the thread pools before torch is imported
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    threads = max(1, len(cores))
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[name] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except ImportError:
+        pass
+
+    quiet = _WarningsOnly(index)
+    started = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(quiet):
+            model = factory(model_id, overrides)
+    except Exception as e:
+        results.send(("failed", f"{type(e).__name__}: {e}", None))
+        return
+    results.send(("metrics", REGISTRY.take()))
+    results.send(("ready", os.getpid(), time.perf_counter() - started))
+
+    while True:
+        try:
+            task = tasks.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        task_id, text = task
+        started = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(quiet):
+                output = model.generate(text)
+            message = ("done", task_id, output, time.perf_counter() - started)
+        except Exception as e:
+            message = ("error", task_id, f"{type(e).__name__}: {e}", time.perf_counter() - started)
+        # Before the result, so the metrics are merged by the time the caller sees it
+        results.send(("metrics", REGISTRY.take()))
+        results.send(message)
+
+
+class WorkerPool:
+    """Drop-in for LlamaModel.generate() backed by a pool of pinned worker processes"""
+
+    def __init__(self, workers, kind="extract", model_id=None, overrides=None, cores=None,
+                 factory=None, start_timeout=1800):
+        self.workers = workers
+        self.core_sets = split_cores(workers, cores)
+        self._context = multiprocessing.get_context("spawn")
+        self._worker_args = (factory or MODEL_FACTORIES[kind], model_id, overrides)
+        self._pending = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self.pids = []
+        self.load_seconds = []
+
+        # Emails waiting for a worker, and the workers waiting for an email
+        self._backlog = collections.deque()
+        self._idle = collections.deque()
+        # Task each worker was handed, set before it is sent
+        self._running = [IDLE] * workers
+        self._respawns = [0] * workers
+        self._dead = set()
+        self._started = False
+        self._closing = False
+        self._start_error = None
+        self._processes = [None] * workers
+        self._task_pipes = [None] * workers
+        self._result_pipes = [None] * workers
+        for i in range(workers):
+            self._spawn(i)
+        self._collector = threading.Thread(target=self._collect, name="inference-results", daemon=True)
+        self._collector.start()
+
+        deadline = time.time() + start_timeout
+        with self._changed:
+            while len(self.pids) < workers and self._start_error is None and time.time() < deadline:
+                self._changed.wait(timeout=LIVENESS_SECONDS)
+            error = self._start_error
+            ready = len(self.pids) == workers
+            self._started = ready
+        if not ready:
+            self.close()
+            raise error or TimeoutError(f"Inference workers not ready after {start_timeout}s")
+        print(f"[OK] {workers} inference workers ready (cores per worker: {len(self.core_sets[0])})")
+
+    def _spawn(self, index):
+        factory, model_id, overrides = self._worker_args
+        task_reader, task_writer = self._context.Pipe(duplex=False)
+        result_reader, result_writer = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_worker_main, name=f"inference-worker-{index}", daemon=True,
+            args=(index, self.core_sets[index], factory, model_id, overrides, task_reader, result_writer))
+        process.start()
+        # The child's ends: closed here so the pipes report EOF once it exits
+        task_reader.close()
+        result_writer.close()
+        self._processes[index] = process
+        self._task_pipes[index] = task_writer
+        self._result_pipes[index] = result_reader
+
+    def _collect(self):
+        """Read every worker's results and notice exits, on one thread"""
+        while not self._closing:
+            owners = {}
+            for index, process in enumerate(self._processes):
+                if index not in self._dead:
+                    owners[self._result_pipes[index]] = index
+                    owners[process.sentinel] = index
+            for index in {owners[ready] for ready in multiprocessing.connection.wait(list(owners), LIVENESS_SECONDS)}:
+                if self._closing:
+                    return
+                self._drain(index)
+
+    def _drain(self, index):
+        """Handle what worker index sent; if it has exited, only after everything it sent before"""
+        pipe, process = self._result_pipes[index], self._processes[index]
+        try:
+            while pipe.poll():
+                self._handle(index, pipe.recv())
+        except (EOFError, OSError):
+            process.join(timeout=LIVENESS_SECONDS)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        if not process.is_alive():
+            pipe.close()
+            self._task_pipes[index].close()
+            self._worker_exited(index, process.exitcode)
+
+    def _handle(self, index, message):
+        if message[0] == "metrics":
+            REGISTRY.merge(message[1])
+            return
+        status, task_id, value, seconds = message[0], message[1], message[-2], message[-1]
+        if status == "ready":
+            with self._changed:
+                if not self._started:
+                    self.pids.append(task_id)
+                    self.load_seconds.append(seconds)
+                    self._changed.notify_all()
+                else:
+                    print(f"[OK] Inference worker {index} respawned (pid {task_id}, {seconds:.0f}s to load)")
+                self._idle.append(index)
+            self._dispatch()
+            return
+        if status == "failed":
+            with self._changed:
+                if not self._started:
+                    self._start_error = RuntimeError(f"Inference worker {index} failed to load the model: {task_id}")
+                    self._changed.notify_all()
+                    return
+            print(f"[ERROR] Respawned inference worker {index} failed to load the model: {task_id}", file=sys.stderr)
+            return
+        with self._lock:
+            self._running[index] = IDLE
+            self._idle.append(index)
+            future = self._pending.pop(task_id, None)
+        self._dispatch()
+        if future is None:
+            return
+        if status == "done":
+            future.set_result(value)
+        else:
+            print(f"[ERROR] Inference worker error: {value}", file=sys.stderr)
+            future.set_result("")
+
+    def _dispatch(self):
+        """Hand queued emails to idle workers"""
+        handed = []
+        with self._lock:
+            while self._idle and self._backlog:
+                index = self._idle.popleft()
+                task = self._backlog.popleft()
+                # Recorded before sending, so a worker that dies with it fails this email
+                self._running[index] = task[0]
+                handed.append((index, task))
+        for index, task in handed:
+            try:
+                self._task_pipes[index].send(task)
+            except (OSError, ValueError):
+                # The worker died; the collector fails the task when it sees the exit
+                pass
+
+    def _worker_exited(self, index, exitcode):
+        """Fail the task of a worker that died and respawn it; with no worker left, fail everything"""
+        with self._changed:
+            if self._closing:
+                return
+            if not self._started:
+                if self._start_error is None:
+                    self._start_error = RuntimeError(
+                        f"Inference worker {index} exited while loading the model (code {exitcode})")
+                self._changed.notify_all()
+                self._dead.add(index)
+                return
+            if index in self._idle:
+                self._idle.remove(index)
+            task_id, self._running[index] = self._running[index], IDLE
+            future = self._pending.pop(task_id, None) if task_id != IDLE else None
+        print(f"[ERROR] Inference worker {index} exited with code {exitcode}", file=sys.stderr)
+        if future is not None:
+            future.set_result("")
+        if self._respawns[index] < MAX_RESPAWNS:
+            self._respawns[index] += 1
+            self._spawn(index)
+            return
+        print(f"[ERROR] Inference worker {index} died {MAX_RESPAWNS + 1} times; not respawning it", file=sys.stderr)
+        with self._lock:
+            self._dead.add(index)
+            if len(self._dead) < self.workers:
+                return
+            pending, self._pending = list(self._pending.values()), {}
+            self._backlog.clear()
+        for future in pending:
+            future.set_exception(RuntimeError("All inference workers have died"))
+
+    def submit(self, email_text):
+        future = Future()
+        with self._lock:
+            if len(self._dead) == self.workers:
+                raise RuntimeError("All inference workers have died")
+            task_id = next(self._ids)
+            self._pending[task_id] = future
+            self._backlog.append((task_id, email_text))
+        self._dispatch()
+        return future
+
+    def generate(self, email_text):
+        return self.submit(email_text).result()
+
+    def map(self, email_texts):
+        futures = [self.submit(text) for text in email_texts]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self._closing = True
+        self._collector.join(timeout=10)
+        for pipe in self._task_pipes:
+            try:
+                pipe.send(None)
+            except (OSError, ValueError):
+                pass
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
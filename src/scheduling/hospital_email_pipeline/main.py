@@ -1,29 +1,113 @@
-import json
 import os
 import time
 import sys
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
-from llm.llama_model import LlamaModel
-from llm.llm_reply import LlamaReplyModel
-from processor.email_parser import should_process_email, extract_relevant_fields
-from api.send_to_backend import post_structured_data
+from processor.email_parser import should_process_email
+from processor.pipeline import process_email, process_reply, use_outbox, use_near_duplicates, use_work_queue
+from processor.near_duplicates import NearDuplicateIndex
+from processor.coalesce import group_by_conversation, group_key, thread_context
+from processor.priority import score_email
+from processor.work_queue import WorkQueue, format_stats, RETRYABLE_RESULTS
+from api.outbox import Outbox
+from graph_api.mark_as_read import mark_emails_as_read
+from api.send_to_backend import fetch_blocked_dates, fetch_scheduled_sessions
 from graph_api.fetch_emails import get_emails
-from graph_api.mark_as_read import mark_email_as_read
-from auth_helper import get_token_from_device_flow
 from utils.detect_route import detect_route
 from email_config import EmailConfig
+from processor.slot_intervals import ConflictChecker
+from utils.metrics import start_metrics_server, stage, mark_poll_success, QUEUE_DEPTH, EMAILS_PROCESSED, STARTUP_SECONDS
+from utils.profiling import EmailProfiler
+from utils.trace import TRACE_PATH
 
+PROCESS_STARTED = time.perf_counter()
 
-def safe_print(text):
-    """Safely print text with Unicode characters by encoding them properly"""
+CONFLICT_REFRESH_SECONDS = 600
+# Re-poll while draining a long queue, so new urgent mail is scored and can jump ahead
+REFETCH_SECONDS = 60
+STATS_INTERVAL_SECONDS = 600
+# >1 runs extraction in a pool of pinned worker processes sharing mmap'd weights
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1") or 1)
+# Inference workers finish emails concurrently; only the first stamps first_email
+first_email_lock = threading.Lock()
+
+
+def load_conflict_checker():
+    """Index blocked dates and booked sessions from the backend for slot conflict checks"""
+    blocked_dates = fetch_blocked_dates()
+    sessions = fetch_scheduled_sessions()
+    timetable = f"{len(sessions)} sessions" if sessions is not None else "timetable unavailable"
+    print(f"[INFO] Conflict index loaded: {len(blocked_dates)} blocked dates, {timetable}")
+    return ConflictChecker(blocked_dates, sessions)
+
+
+def handle_email(email, superseded=()):
+    """Process the latest email of a conversation; earlier unread ones only add context"""
+    route = detect_route(email)
+    context = thread_context(email, superseded)
+    with profiler.profile(email.get("id")):
+        if route["route"] == "reply":
+            result = process_reply(email, route["session_id"], llama_reply, conflict_checker, access_token, context)
+        else:
+            result = process_email(email, llama, conflict_checker, access_token, context)
+    EMAILS_PROCESSED.inc(result=result)
+
+    # The latest email stays unread on a parse or backend error, so the whole thread is retried
+    if superseded and result not in RETRYABLE_RESULTS:
+        failed = mark_emails_as_read([e["id"] for e in superseded], access_token)
+        if failed:
+            failed = mark_emails_as_read(failed, access_token)
+        if failed:
+            # Still unread: the next poll must not extract them after the message that replaced them
+            work_queue.add_unmarked(failed)
+            print(f"[WARNING] {len(failed)} superseded message(s) still unread; they are skipped and marked read later")
+        EMAILS_PROCESSED.inc(len(superseded) - len(failed), result="superseded")
+        print(f"[INFO] Coalesced {len(superseded)} earlier message(s) of the thread into {email.get('id')}")
+    return result
+
+
+def process_item(item):
+    key, email, superseded, priority = item
     try:
-        # Try to encode and decode to remove problematic Unicode characters
-        safe_text = text.encode('ascii', 'ignore').decode('ascii')
-        print(safe_text)
+        result = handle_email(email, superseded)
     except Exception:
-        # If all else fails, print a sanitized version
-        print("[INFO] <Email content contains special characters>")
+        # Still unread, so it is queued again on the next poll
+        work_queue.complete(key, "parse_error")
+        raise
+    work_queue.complete(key, result)
+    with first_email_lock:
+        if not STARTUP_SECONDS.value(phase="first_email"):
+            mark_startup("first_email")
+            print(f"[INFO] Time to first email: {STARTUP_SECONDS.value(phase='first_email'):.1f}s after start "
+                  f"(model load {STARTUP_SECONDS.value(phase='model_load'):.1f}s)")
+
+
+def drain_queue(deadline):
+    """Process queued conversations, highest aged priority first, until empty or the deadline"""
+    in_flight = set()
+    while True:
+        # Refill as each email finishes, so one slow email does not idle the other workers
+        while time.time() < deadline and len(in_flight) < INFERENCE_WORKERS:
+            item = work_queue.pop()
+            if item is None:
+                break
+            if executor is None:
+                process_item(item)
+                QUEUE_DEPTH.set(len(work_queue))
+            else:
+                in_flight.add(executor.submit(process_item, item))
+        if not in_flight:
+            return
+        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            future.result()
+        QUEUE_DEPTH.set(len(work_queue))
+
+
+def mark_startup(phase):
+    STARTUP_SECONDS.set(time.perf_counter() - PROCESS_STARTED, phase=phase)
 
 
 def get_access_token_from_profile(profile_name):
@@ -78,7 +162,19 @@ def get_access_token_from_profile(profile_name):
 # Parse command line arguments
 parser = argparse.ArgumentParser(description='Email monitoring and LLM processing')
 parser.add_argument('--profile', default='default', help='Email profile to use for monitoring')
+parser.add_argument('--backfill', action='store_true',
+                    help='Re-extract past mail received in [--since, --until) instead of monitoring; read state is not changed')
+parser.add_argument('--since', help='Backfill start date, YYYY-MM-DD')
+parser.add_argument('--until', help='Backfill end date (exclusive), YYYY-MM-DD; default tomorrow')
+parser.add_argument('--folders', default='inbox', help='Comma-separated mail folders to backfill (well-known names or ids)')
+parser.add_argument('--batch-size', type=int, default=8, help='Emails per batched generation in backfill mode')
+parser.add_argument('--window', type=int, default=64, help='Emails read ahead and sorted by length per backfill window')
+parser.add_argument('--restart', action='store_true', help='Start the backfill of this range over instead of resuming')
+parser.add_argument('--metrics-port', type=int, default=None,
+                    help='Port for /metrics and /healthz (default METRICS_PORT or 9108; one per monitor, 0 disables)')
 args = parser.parse_args()
+if args.backfill and not args.since:
+    parser.error('--backfill needs --since')
 
 # Load environment variables
 load_dotenv()
@@ -100,24 +196,85 @@ if not access_token:
     print("\nTo setup a profile: python email_config.py setup <profile_name> <email> <name>")
     sys.exit(1)
 
-# Load both models at once
+# Load both models at once; torch/transformers are only imported once the profile is usable
 print("[INFO] Loading LLM models...")
 try:
-    llama = LlamaModel()
+    from llm.llama_model import LlamaModel
+    from llm.llm_reply import LlamaReplyModel
+    if INFERENCE_WORKERS > 1:
+        from llm.worker_pool import WorkerPool
+        llama = WorkerPool(INFERENCE_WORKERS)
+    else:
+        llama = LlamaModel()
     llama_reply = LlamaReplyModel()
-    print("[OK] LLM models loaded successfully")
+    mark_startup("model_load")
+    print(f"[OK] LLM models loaded successfully in {STARTUP_SECONDS.value(phase='model_load'):.1f}s")
 except Exception as e:
     print(f"[ERROR] Failed to load LLM models: {e}")
     print("[ERROR] Check that config files exist: config/llm_config.yaml, config/llm_reply.yaml")
     sys.exit(1)
 
+conflict_checker = load_conflict_checker()
+conflict_checker_loaded_at = time.time()
+
+start_metrics_server(args.metrics_port)
+
+if args.backfill:
+    from datetime import date, timedelta
+    from processor.backfill import Checkpoint, run_backfill
+    until = args.until or (date.today() + timedelta(days=1)).isoformat()
+    backfill_outbox = Outbox(f"{args.profile}_backfill").start()
+    checkpoint = Checkpoint(args.profile)
+    print(f"[INFO] Backfill {args.since}..{until} of {args.folders}; checkpoint {checkpoint.path}")
+    try:
+        run_backfill(lambda: get_access_token_from_profile(args.profile), llama, conflict_checker, backfill_outbox,
+                     checkpoint, args.folders.split(","), args.since, until, args.batch_size, args.window, args.restart)
+    except KeyboardInterrupt:
+        print("\n[INFO] Backfill interrupted; run the same command again to resume")
+    finally:
+        backfill_outbox.close()
+        if len(backfill_outbox):
+            print(f"[WARNING] {len(backfill_outbox)} records still in {backfill_outbox.path}; they are delivered on the next backfill run")
+    sys.exit(0)
+
+if INFERENCE_WORKERS > 1:
+    generation_elsewhere = "the inference worker processes"
+elif getattr(llama, "client", None) or getattr(llama_reply, "client", None):
+    generation_elsewhere = "the inference server"
+else:
+    generation_elsewhere = None
+profiler = EmailProfiler(generation_elsewhere=generation_elsewhere)
+if profiler.enabled:
+    print(f"[INFO] Profiling {profiler.describe()} into {profiler.out_dir} (config {profiler.config_hash})")
+    if generation_elsewhere:
+        print(f"[WARNING] Generation runs in {generation_elsewhere}: profiles cover only this process and carry no token counts")
+if TRACE_PATH:
+    print(f"[INFO] Recording Graph, LLM and backend responses to {TRACE_PATH}")
+
+work_queue = WorkQueue(args.profile)
+use_work_queue(work_queue)
+print(f"[INFO] Work queue: {work_queue.path} ({len(work_queue)} queued)")
+# Parsed records are committed here and delivered to the backend in batches
+outbox = Outbox(args.profile).start()
+use_outbox(outbox)
+print(f"[INFO] Outbox: {outbox.path} ({len(outbox)} awaiting delivery)")
+# Forwards and resends of an email already extracted reuse its record
+near_duplicates = NearDuplicateIndex(args.profile)
+use_near_duplicates(near_duplicates)
+print(f"[INFO] Near-duplicate index: {near_duplicates.path} ({len(near_duplicates)} emails)")
+stats_printed_at = time.time()
+
+# One thread per worker keeps every inference process busy
+executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS) if INFERENCE_WORKERS > 1 else None
+
 print(f"[INFO] Monitoring unread tutorial-related emails every 5s for profile: {args.profile}...")
 print("[INFO] Listening for emails containing: tutorial, tutor, reschedule, change, available, availability")
 
 while True:
     try:
         # ✅ Periodically check if token is still valid (every 10 iterations or when getting 401 errors)
-        emails = get_emails(access_token)
+        with stage("fetch"):
+            emails = get_emails(access_token)
         
         # ✅ Check if we got an authentication error from the email fetch
         if emails is None:
@@ -130,86 +287,64 @@ while True:
                 access_token = new_access_token
                 print("[OK] Successfully refreshed access token")
                 # Retry fetching emails with new token
-                emails = get_emails(access_token)
+                with stage("fetch"):
+                    emails = get_emails(access_token)
             else:
                 print("[ERROR] Could not refresh access token. Stopping monitoring.")
                 print("[ERROR] Please re-authenticate the profile and restart the monitoring")
                 break
         
-        if not emails:
-            # No emails to process, continue loop
-            pass
-        else:
-            for email in emails:
-                if should_process_email(email):
-                    fields = extract_relevant_fields(email)
-                    print("[INFO] Extracted Fields:")
-                    for k, v in fields.items():
-                        print(f"{k}: ", end="")
-                        safe_print(str(v))
-
-                    user_message = fields["raw_text"]
-                    print("[INFO] Prompt to LLM:")
-                    safe_print(user_message)
-
-                    structured_json = llama.generate(user_message).strip()
-                    if structured_json.lower().startswith("assistant"):
-                        structured_json = structured_json[len("assistant"):].strip()
-
-                    try:
-                        structured_data = json.loads(structured_json)
-                        structured_data["from_name"] = fields["from_name"]
-                        structured_data["from_email"] = fields["from_email"]
-                        structured_data["to_email"] = fields["to_email"]
-                        
-                        # Robustly derive available_slots_timings from original_session + new_session
-                        if (structured_data.get("type") or "").strip().lower() == "availability":
-                            original = (structured_data.get("original_session") or "").strip()
-                            new_time = (structured_data.get("new_session") or "").strip()
-
-                            print("[INFO] original_session:", original)
-                            print("[INFO] new_session:", new_time)
-
-                            if original and new_time:
-                                import re
-                                # Normalize common unicode dashes to simple hyphen
-                                original_cleaned = original.replace("\u2013", "-").replace("\u2014", "-").replace("\u2015", "-").strip()
-
-                                # Extract everything before the first opening parenthesis
-                                match = re.match(r"^(.*?)\s*\(", original_cleaned)
-                                extracted_date = match.group(1).strip() if match else None
-
-                                if extracted_date:
-                                    structured_data["available_slots_timings"] = [f"{extracted_date} ({new_time})"]
-                                    print("[OK] Overwrote available_slots_timings:", structured_data["available_slots_timings"])
-                                else:
-                                    print("[ERROR] Could not extract date from cleaned original_session:", original_cleaned)
-                            else:
-                                print("[WARNING] original_session or new_session missing")
-
-                        print("[INFO] Final structured data to send to backend:")
-                        safe_print(json.dumps(structured_data, indent=2, ensure_ascii=True))
-
-                        code, response = post_structured_data(structured_data)
-                        print(f"[OK] Sent to backend: {code} - {response}")
-                        
-                        # ✅ Handle token expiration during email marking
-                        try:
-                            mark_email_as_read(email['id'], access_token)
-                        except Exception as mark_error:
-                            print(f"[WARNING] Failed to mark email as read: {mark_error}")
-                            if "401" in str(mark_error) or "authentication" in str(mark_error).lower():
-                                print("[WARNING] Token may have expired during email processing")
-                                # Continue with processing other emails, token will be refreshed on next iteration
-                        
-                    except json.JSONDecodeError:
-                        print("[ERROR] Failed to parse model output:")
-                        safe_print(structured_json)
+        if emails is not None:
+            mark_poll_success()
+            if not STARTUP_SECONDS.value(phase="ready"):
+                mark_startup("ready")
+                print(f"[INFO] Ready {STARTUP_SECONDS.value(phase='ready'):.1f}s after start")
+
+        if emails and time.time() - conflict_checker_loaded_at > CONFLICT_REFRESH_SECONDS:
+            conflict_checker = load_conflict_checker()
+            conflict_checker_loaded_at = time.time()
+
+        pending = []
+        for email in emails or []:
+            if should_process_email(email):
+                pending.append(email)
+            else:
+                EMAILS_PROCESSED.inc(result="skipped")
+
+        # Superseded or already stored earlier, but marking them read failed then
+        stale = work_queue.unmarked_ids(email["id"] for email in pending)
+        if stale:
+            pending = [email for email in pending if email["id"] not in stale]
+            failed = mark_emails_as_read(sorted(stale), access_token)
+            work_queue.forget_unmarked(stale - set(failed))
+            EMAILS_PROCESSED.inc(len(stale) - len(failed), result="marked_read")
+
+        # One queue entry per conversation: follow-ups supersede earlier messages
+        groups = group_by_conversation(pending)
+        for email, superseded in groups:
+            score, priority = score_email(email, conflict_checker)
+            work_queue.push(email, superseded, score, priority)
+        if emails is not None:
+            work_queue.retain(group_key(email) for email, _ in groups)
+        QUEUE_DEPTH.set(len(work_queue))
+
+        drain_queue(time.time() + REFETCH_SECONDS)
+
+        if time.time() - stats_printed_at > STATS_INTERVAL_SECONDS:
+            print(f"[INFO] Time to processed (24h) - {format_stats(work_queue.stats())}")
+            if len(outbox):
+                print(f"[INFO] Outbox: {len(outbox)} records awaiting delivery, oldest {outbox.oldest_pending_age():.0f}s")
+            if outbox.dead_count():
+                print(f"[WARNING] Outbox: {outbox.dead_count()} dead records never accepted by the backend ({outbox.path})")
+            stats_printed_at = time.time()
 
+        if len(work_queue):
+            continue
         time.sleep(5)
 
     except KeyboardInterrupt:
         print("\n[INFO] Monitoring stopped by user")
+        outbox.close()
         break
     except Exception as e:
         print(f"[ERROR] Error during polling: {e}")
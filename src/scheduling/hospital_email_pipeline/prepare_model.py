@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import yaml
+
+# One-off conversion of the configured model into a local snapshot that
+# LlamaModel/LlamaReplyModel pick up automatically: safetensors already in the
+# target torch_dtype (one shard, so one mmap) plus the tokenizer, under
+# models/<model_id>-<dtype>. Restarts then skip the Hub cache lookup and the
+# dtype conversion and map the weights instead of copying them. The TF-IDF
+# index of the few-shot example bank (llm/few_shot.py) is built here too.
+#
+#   python prepare_model.py                       # llm_config.yaml and llm_reply.yaml
+#   python prepare_model.py --dtype bfloat16      # set torch_dtype: bfloat16 in the config too
+#   python prepare_model.py --model-id HuggingFaceTB/SmolLM2-135M-Instruct --force
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config")
+CONFIGS = ["llm_config.yaml", "llm_reply.yaml"]
+
+
+def configured_models(dtype=None):
+    """(model_id, torch_dtype) pairs the monitor will load, without duplicates"""
+    models = []
+    for name in CONFIGS:
+        with open(os.path.join(CONFIG_DIR, name), "r") as f:
+            config = yaml.safe_load(f)
+        entry = (config["model_id"], dtype or config.get("torch_dtype"))
+        if entry not in models:
+            models.append(entry)
+    return models
+
+
+def prepare(model_id, torch_dtype=None, force=False):
+    import torch
+    import transformers
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+    from llm.loading import resolve_dtype, dtype_name, prepared_dir, find_prepared, PREPARED_MARKER
+
+    target = prepared_dir(model_id, torch_dtype)
+    if find_prepared(model_id, torch_dtype) and not force:
+        print(f"[OK] Already prepared: {target} (use --force to rebuild)")
+        return target
+
+    dtype = resolve_dtype(torch_dtype)
+    print(f"[INFO] Preparing {model_id} as {dtype_name(dtype)}...")
+    started = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(model_id, trust_remote_code=True)
+    model = AutoModelForCausalLM.from_pretrained(model_id, torch_dtype=dtype, trust_remote_code=True, low_cpu_mem_usage=True)
+
+    # Write next to the target and swap in at the end, so a half-written
+    # snapshot is never picked up by a restarting monitor
+    staging = target + ".partial"
+    shutil.rmtree(staging, ignore_errors=True)
+    model.save_pretrained(staging, safe_serialization=True, max_shard_size="1000GB")
+    tokenizer.save_pretrained(staging)
+    with open(os.path.join(staging, PREPARED_MARKER), "w") as f:
+        json.dump({
+            "model_id": model_id,
+            "torch_dtype": dtype_name(dtype),
+            "torch": torch.__version__,
+            "transformers": transformers.__version__,
+            "prepared_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }, f, indent=2)
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+    size_mb = sum(os.path.getsize(os.path.join(target, n)) for n in os.listdir(target)) / 2 ** 20
+    print(f"[OK] Prepared {target} ({size_mb:.0f} MB) in {time.perf_counter() - started:.1f}s")
+    return target
+
+
+def prepare_few_shot():
+    """Precompute the example bank's vectors so the first email does not pay for them"""
+    from llm.few_shot import ExampleBank
+    with open(os.path.join(CONFIG_DIR, "llm_config.yaml"), "r") as f:
+        config = yaml.safe_load(f)
+    if not config.get("few_shot_bank"):
+        return
+    bank = ExampleBank(config["few_shot_bank"])
+    print(f"[OK] Few-shot index for {len(bank.examples)} examples: {bank.cache_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the configured LLMs into local dtype-ready safetensors snapshots")
+    parser.add_argument("--model-id", help="Prepare this model instead of the ones in config/")
+    parser.add_argument("--dtype", help="torch_dtype to store (default: the config's torch_dtype, else auto)")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if a snapshot exists")
+    args = parser.parse_args()
+
+    models = [(args.model_id, args.dtype)] if args.model_id else configured_models(args.dtype)
+    if not args.model_id:
+        prepare_few_shot()
+    try:
+        for model_id, torch_dtype in models:
+            prepare(model_id, torch_dtype, args.force)
+    except ImportError as e:
+        print(f"[ERROR] {e}; prepare_model.py needs torch and transformers")
+        sys.exit(1)
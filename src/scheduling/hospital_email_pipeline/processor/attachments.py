@@ -0,0 +1,143 @@
+import os
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+from processor.slot_intervals import format_slot, DEFAULT_SLOT_MINUTES
+
+# Structured attachments are read directly instead of going through the LLM:
+# calendar invites (.ics) become availability slots, and posting spreadsheets
+# (.xlsx) go through the same blocked-date extraction as a manual upload
+# (src/components/extract_blocked_dates.py).
+#
+# Spreadsheets are only read from the posting coordinators listed in
+# BLOCKED_DATES_SENDERS, each with the school and year of study its blocked
+# dates are for (what the manual upload asks for); from anyone else they
+# are ignored. Entries are separated by ";":
+#
+#   BLOCKED_DATES_SENDERS="posting@duke-nus.edu.sg=DUKE NUS:M2; coord@nus.edu.sg=NUS YLL:M3"
+
+COMPONENTS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "components"))
+KINDS = {".ics": "ics", ".xlsx": "xlsx"}
+# RFC 5545 DURATION: P1W, P1D, PT1H30M, P1DT2H
+DURATION_RE = re.compile(r"^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+CONTENT_TYPES = {"text/calendar": "ics", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "xlsx"}
+
+
+def blocked_dates_senders(value=None):
+    """{coordinator email: (school, yearofstudy)} from BLOCKED_DATES_SENDERS"""
+    if value is None:
+        value = os.getenv("BLOCKED_DATES_SENDERS", "")
+    senders = {}
+    for entry in value.split(";"):
+        email, _, target = entry.partition("=")
+        school, _, year = target.rpartition(":")
+        if not email.strip() or not school.strip() or not year.strip():
+            if entry.strip():
+                print(f"[WARNING] Ignoring BLOCKED_DATES_SENDERS entry {entry.strip()!r}: expected email=SCHOOL:YEAR")
+            continue
+        senders[email.strip().lower()] = (school.strip(), year.strip())
+    return senders
+
+
+def attachment_kind(attachment):
+    """'ics', 'xlsx' or None for a Graph attachment resource"""
+    if attachment.get("@odata.type", "#microsoft.graph.fileAttachment") != "#microsoft.graph.fileAttachment":
+        return None
+    extension = os.path.splitext(attachment.get("name") or "")[1].lower()
+    return KINDS.get(extension) or CONTENT_TYPES.get((attachment.get("contentType") or "").split(";")[0].lower())
+
+
+def _unfolded_lines(path):
+    """iCalendar content lines, read one at a time, with folded continuations joined"""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        current = None
+        for raw in f:
+            line = raw.rstrip("\r\n")
+            if line[:1] in (" ", "\t") and current is not None:
+                current += line[1:]
+                continue
+            if current is not None:
+                yield current
+            current = line
+        if current is not None:
+            yield current
+
+
+def _ics_time(params, value):
+    """A DTSTART/DTEND value as a date (all-day) or a local naive datetime"""
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return datetime.strptime(value[:8], "%Y%m%d").date()
+    moment = datetime.strptime(value.rstrip("Z")[:15], "%Y%m%dT%H%M%S")
+    if value.endswith("Z"):
+        return moment.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    if "TZID" in params:
+        try:
+            from zoneinfo import ZoneInfo
+            return moment.replace(tzinfo=ZoneInfo(params["TZID"].strip('"'))).astimezone().replace(tzinfo=None)
+        except Exception:
+            # Outlook writes Windows zone names ("Singapore Standard Time"); treat as local wall time
+            pass
+    return moment
+
+
+def _ics_duration(value):
+    """A DURATION value as a timedelta, or None when it does not parse"""
+    match = DURATION_RE.match(value.upper())
+    if not match or not any(match.groups()[1:]):
+        return None
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                         minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -duration if sign == "-" else duration
+
+
+def parse_ics(path):
+    """(availability slot texts, event summaries) from the VEVENTs of a calendar file"""
+    events, current = [], None
+    for line in _unfolded_lines(path):
+        name, _, value = line.partition(":")
+        name, *param_parts = name.split(";")
+        name = name.upper()
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            current = {}
+        elif name == "END" and value.upper() == "VEVENT" and current is not None:
+            events.append(current)
+            current = None
+        elif current is not None and name in ("DTSTART", "DTEND", "DURATION", "SUMMARY", "STATUS") and name not in current:
+            params = dict(part.split("=", 1) for part in param_parts if "=" in part)
+            current[name] = (params, value.strip())
+
+    slots, summaries = [], []
+    for event in events:
+        if "DTSTART" not in event or event.get("STATUS", ({}, ""))[1].upper() == "CANCELLED":
+            continue
+        start = _ics_time(*event["DTSTART"])
+        if "DTEND" in event:
+            end = _ics_time(*event["DTEND"])
+        else:
+            # No DTEND: DURATION, else a timed event lasts DEFAULT_SLOT_MINUTES and an all-day one a day
+            duration = _ics_duration(event["DURATION"][1]) if "DURATION" in event else None
+            if duration is None:
+                duration = timedelta(minutes=DEFAULT_SLOT_MINUTES) if isinstance(start, datetime) else timedelta(days=1)
+            end = start + duration
+        if isinstance(start, datetime):
+            times = ((start.hour, start.minute), (end.hour, end.minute)) if isinstance(end, datetime) and end > start else None
+            slots.append(format_slot(start.date(), times))
+        else:
+            # All-day events: DTEND is exclusive, one slot per day
+            day, last = start, (end - timedelta(days=1)) if end and end > start else start
+            while day <= last:
+                slots.append(format_slot(day))
+                day += timedelta(days=1)
+        summary = event.get("SUMMARY", ({}, ""))[1].replace("\\,", ",").replace("\\;", ";")
+        if summary and summary not in summaries:
+            summaries.append(summary)
+    return slots, summaries
+
+
+def parse_xlsx(path):
+    """Blocked dates [{date, remark}] from a posting spreadsheet"""
+    if COMPONENTS_DIR not in sys.path:
+        sys.path.insert(0, COMPONENTS_DIR)
+    from extract_blocked_dates import extract_blocked_dates
+    return [{"date": item["date"], "remark": item["remark"]} for item in extract_blocked_dates(path)]
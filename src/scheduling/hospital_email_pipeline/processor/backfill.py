@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+from datetime import datetime, timezone
+from processor.email_parser import should_process_email, extract_relevant_fields
+from processor.pipeline import parse_model_output, received_at
+from processor.slot_intervals import annotate_conflicts
+from processor.work_queue import STATE_DIR
+from graph_api.fetch_emails import read_page, folder_messages_url
+from api.outbox import idempotency_key
+from utils.detect_route import detect_route
+from utils.metrics import stage, EMAILS_PROCESSED
+
+# Batch re-extraction of past mail (main.py --backfill), e.g. after a prompt
+# or model change, or for a newly onboarded mailbox. Folders are paged
+# oldest first through $top/nextLink. Messages are gathered into windows of
+# whole pages, sorted by prompt length and generated in batches, so each
+# padded batch wastes little compute. Records go through the outbox, and
+# nothing is marked read.
+#
+# Progress is checkpointed per run in state/backfill_<profile>.db: the page a
+# window started on, and every email already committed. An interrupted run
+# resumes where it stopped without re-running inference. Each run has its
+# own idempotency keys, so a resumed run never posts an email twice, while a
+# --restart run re-extracts everything.
+
+BACKFILL_PAGE_SIZE = int(os.getenv("BACKFILL_PAGE_SIZE", "100"))
+REPORT_SECONDS = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    run_key TEXT NOT NULL,
+    next_url TEXT,
+    processed INTEGER NOT NULL DEFAULT 0,
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS done (
+    run_key TEXT NOT NULL,
+    email_id TEXT NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (run_key, email_id)
+);
+"""
+
+
+def graph_time(day):
+    """YYYY-MM-DD (local midnight) as the UTC timestamp Graph filters on"""
+    return datetime.strptime(day, "%Y-%m-%d").astimezone().astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class Checkpoint:
+    def __init__(self, name="default", path=None):
+        if path is None:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            path = os.path.join(STATE_DIR, f"backfill_{name}.db")
+        self.path = path
+        self._db = sqlite3.connect(path)
+        with self._db:
+            self._db.executescript(SCHEMA)
+
+    def start(self, run_id, restart=False):
+        """(run_key, next_url, processed, finished) of the run, creating it (or a fresh one on restart)"""
+        row = self._db.execute("SELECT run_key, next_url, processed, finished_at FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is not None and not restart:
+            return row[0], row[1], row[2], row[3] is not None
+        run_key, now = uuid.uuid4().hex, time.time()
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO runs (run_id, run_key, next_url, processed, started_at, updated_at) "
+                             "VALUES (?, ?, NULL, 0, ?, ?)", (run_id, run_key, now, now))
+        return run_key, None, 0, False
+
+    def done_ids(self, run_key, email_ids):
+        marks = ",".join("?" * len(email_ids))
+        return {i for (i,) in self._db.execute(
+            f"SELECT email_id FROM done WHERE run_key = ? AND email_id IN ({marks})", (run_key, *email_ids))} if email_ids else set()
+
+    def mark_done(self, run_id, run_key, results):
+        with self._db:
+            self._db.executemany("INSERT OR IGNORE INTO done (run_key, email_id, result) VALUES (?, ?, ?)",
+                                 [(run_key, email_id, result) for email_id, result in results])
+            self._db.execute("UPDATE runs SET processed = processed + ?, updated_at = ? WHERE run_id = ?",
+                             (len(results), time.time(), run_id))
+
+    def advance(self, run_id, next_url):
+        """Resume from next_url from now on; None means the run is complete"""
+        with self._db:
+            self._db.execute("UPDATE runs SET next_url = ?, updated_at = ?, finished_at = ? WHERE run_id = ?",
+                             (next_url, time.time(), None if next_url else time.time(), run_id))
+
+
+class Progress:
+    def __init__(self, since, until, already=0):
+        self.since = datetime.fromisoformat(since.replace("Z", "+00:00")).timestamp()
+        self.until = datetime.fromisoformat(until.replace("Z", "+00:00")).timestamp()
+        self.started = time.time()
+        self.reported = self.started
+        self.already = already
+        self.counts = {}
+        self.last_received = None
+
+    def add(self, result):
+        self.counts[result] = self.counts.get(result, 0) + 1
+
+    def report(self, folder, force=False):
+        now = time.time()
+        if not force and now - self.reported < REPORT_SECONDS:
+            return
+        self.reported = now
+        done = sum(self.counts.values())
+        rate = done / max(now - self.started, 1e-9) * 60
+        line = f"[INFO] Backfill {folder}: {self.already + done} emails ({rate:.1f}/min this session)"
+        if self.last_received:
+            reached = datetime.fromisoformat(self.last_received.replace("Z", "+00:00")).timestamp()
+            fraction = min(1.0, max(0.0, (reached - self.since) / max(self.until - self.since, 1)))
+            line += f", up to {self.last_received[:10]} ({fraction:.0%} of the range)"
+            if 0 < fraction < 1 and done:
+                remaining = (now - self.started) * (1 - fraction) / fraction
+                line += f", about {remaining / 3600:.1f}h left"
+        print(line + f" - {json.dumps(self.counts, sort_keys=True)}", flush=True)
+
+
+def generate_many(model, texts):
+    """One batched generation where the model supports it (LlamaModel, WorkerPool), else one by one"""
+    if hasattr(model, "generate_batch"):
+        return model.generate_batch(texts)
+    if hasattr(model, "map"):
+        return model.map(texts)
+    return [model.generate(text) for text in texts]
+
+
+def backfill_wanted(message):
+    # Replies to invites were applied to their live sessions already
+    return should_process_email(message) and detect_route(message)["route"] != "reply"
+
+
+def process_window(records, run_id, run_key, model, conflict_checker, outbox, checkpoint, progress, batch_size):
+    """Extract one window of records, shortest prompts first, in batches"""
+    items = sorted(((record, extract_relevant_fields(record)) for record in records),
+                   key=lambda item: len(item[1]["raw_text"]))
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        with stage("generate"):
+            outputs = generate_many(model, [fields["raw_text"] for _, fields in batch])
+        results = []
+        for (record, fields), output in zip(batch, outputs):
+            try:
+                structured_data = parse_model_output((output or "").strip(), fields)
+            except json.JSONDecodeError:
+                result = "parse_error"
+            else:
+                annotate_conflicts(structured_data, conflict_checker, received_at(record))
+                outbox.put(record.id, structured_data, key=idempotency_key(f"backfill:{run_key}:{record.id}"))
+                result = "queued"
+            results.append((record.id, result))
+            progress.add(result)
+            EMAILS_PROCESSED.inc(result=f"backfill_{result}")
+        # Committed to the outbox, so these are never generated again in this run
+        checkpoint.mark_done(run_id, run_key, results)
+
+
+def run_backfill(token_provider, model, conflict_checker, outbox, checkpoint, folders, since, until,
+                 batch_size=8, window=64, restart=False):
+    """
+    Re-extract every wanted message received in [since, until) (YYYY-MM-DD)
+    in the given folders. token_provider() returns a fresh Graph token and is
+    called again whenever a page comes back 401.
+    """
+    since_utc, until_utc = graph_time(since), graph_time(until)
+    access_token = token_provider()
+    for folder in folders:
+        run_id = f"{folder}:{since}:{until}"
+        run_key, url, processed, finished = checkpoint.start(run_id, restart)
+        if finished:
+            print(f"[INFO] Backfill {folder} {since}..{until} already complete ({processed} emails); use --restart to redo it")
+            continue
+        if url:
+            print(f"[INFO] Resuming backfill {folder} {since}..{until} after {processed} emails")
+        url = url or folder_messages_url(folder, since_utc, until_utc, BACKFILL_PAGE_SIZE)
+        progress = Progress(since_utc, until_utc, processed)
+
+        while url:
+            records, refreshed = [], False
+            # Whole pages only, so the checkpoint can always point at a page
+            while url and len(records) < window:
+                with stage("fetch"):
+                    page = read_page(url, access_token, backfill_wanted)
+                if page is None:
+                    access_token = None if refreshed else token_provider()
+                    if not access_token:
+                        raise RuntimeError("Graph token expired and could not be refreshed; rerun to resume")
+                    refreshed = True
+                    continue
+                page_records, url = page
+                records.extend(page_records)
+                refreshed = False
+
+            skip = checkpoint.done_ids(run_key, [r.id for r in records])
+            todo = [r for r in records if r.id not in skip]
+            if todo:
+                process_window(todo, run_id, run_key, model, conflict_checker, outbox, checkpoint, progress, batch_size)
+            checkpoint.advance(run_id, url)
+            if records:
+                progress.last_received = max(r.received or "" for r in records) or progress.last_received
+            progress.report(folder, force=not url)
+        print(f"[OK] Backfill {folder} {since}..{until} complete")
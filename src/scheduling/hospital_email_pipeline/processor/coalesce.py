@@ -0,0 +1,65 @@
+from processor.reply_classifier import latest_reply
+from processor.email_record import as_record
+
+# Follow-ups in one thread ("correction: 3pm not 2pm") are handled together:
+# per poll, unread messages are grouped by Graph conversationId and sender,
+# only the newest one is extracted, with the new text of the earlier ones as
+# context, and the rest are marked read without being posted. The sender is
+# part of the key because an invite goes to several doctors in one message,
+# so all their replies share a conversation.
+
+MAX_CONTEXT_CHARS = 1500
+
+
+def group_key(email):
+    """Conversation and sender, or the message id when Graph gave no conversationId"""
+    conversation = email.get("conversationId")
+    if not conversation:
+        return email["id"]
+    return f"{conversation}:{(as_record(email).from_email or '').lower()}"
+
+
+def group_by_conversation(emails):
+    """[(latest, superseded)] per conversation and sender, in order of each group's latest message"""
+    groups = {}
+    for email in emails:
+        groups.setdefault(group_key(email), []).append(email)
+    ordered = []
+    for messages in groups.values():
+        messages.sort(key=lambda e: e.get("receivedDateTime") or "")
+        ordered.append((messages[-1], messages[:-1]))
+    ordered.sort(key=lambda group: group[0].get("receivedDateTime") or "")
+    return ordered
+
+
+def thread_context(latest, superseded):
+    """
+    New text of the superseded messages, oldest first, without quoted history
+    and without anything the latest message already repeats. None if empty.
+    """
+    if not superseded:
+        return None
+    latest_text = " ".join(as_record(latest).body_lines.split()).lower()
+    seen, lines = set(), []
+    for email in superseded:
+        text = latest_reply(as_record(email).body_lines)
+        normalised = " ".join(text.split()).lower()
+        if not normalised or normalised in seen or normalised in latest_text:
+            continue
+        seen.add(normalised)
+        lines.append(f"- ({email.get('receivedDateTime', '')}) {' '.join(text.split())}")
+    if not lines:
+        return None
+    context = "\n".join(lines)
+    # Keep the newest context if a long thread has to be cut
+    return context[-MAX_CONTEXT_CHARS:]
+
+
+def with_context(user_message, context):
+    """Prompt for the latest message of a thread, with earlier messages as context"""
+    if not context:
+        return user_message
+    return (
+        "Earlier messages in this thread, oldest first (the latest message below takes precedence):\n"
+        f"{context}\n\nLatest message:\n{user_message}"
+    )
@@ -1,4 +1,5 @@
-from utils.clean_html import strip_html
+from utils.detect_route import detect_route
+from processor.email_record import as_record
 
 def should_process_email(email):
     subject = email.get("subject", "").lower()
@@ -12,28 +13,23 @@ def should_process_email(email):
         or "change" in combined
         or "available" in combined
         or "availability" in combined
+        or detect_route(email)["route"] == "reply"
     )
 
 
 def extract_relevant_fields(email):
-    from_name = email["from"]["emailAddress"]["name"]
-    from_email = email["from"]["emailAddress"]["address"]
-    to_name = email["toRecipients"][0]["emailAddress"]["name"] if email["toRecipients"] else None
-    to_email = email["toRecipients"][0]["emailAddress"]["address"] if email["toRecipients"] else None
-    subject = email.get("subject", "")
-    body_text = strip_html(email.get("body", {}).get("content", ""))
+    email = as_record(email)
 
-    full_text = f"""From: {from_name} <{from_email}>
-To: {to_name} <{to_email}>
-Subject: {subject}
+    full_text = f"""From: {email.from_name} <{email.from_email}>
+To: {email.to_name} <{email.to_email}>
+Subject: {email.subject}
 
-{body_text}
+{email.body_text}
 """
 
     return {
-        "from_name": from_name,
-        "from_email": from_email,
-        "to_email": to_email,
-        "body_text": full_text,
+        "from_name": email.from_name,
+        "from_email": email.from_email,
+        "to_email": email.to_email,
         "raw_text": full_text  # what you send to the LLM
     }
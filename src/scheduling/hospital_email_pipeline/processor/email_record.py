@@ -0,0 +1,85 @@
+from utils.clean_html import strip_html_twice
+from utils.metrics import stage
+
+# Compact form of a Graph message. get_emails builds one per message as the
+# page streams in, strips the HTML body right away and keeps only the text,
+# so a backlog of thousands of unread emails costs a few KB each instead of
+# the full message resource. The top-level Graph keys the pipeline reads
+# (id, subject, receivedDateTime, ...) still work through get() and [], and
+# Graph-shaped dicts from the benchmarks go through as_record().
+
+# Only these headers are kept; detect_route needs them to spot invite replies
+KEPT_HEADERS = ("in-reply-to", "x-session-id")
+
+GRAPH_KEYS = {
+    "id": "id",
+    "conversationId": "conversation_id",
+    "subject": "subject",
+    "bodyPreview": "preview",
+    "receivedDateTime": "received",
+    "hasAttachments": "has_attachments",
+    "internetMessageHeaders": "headers",
+}
+
+
+def _address(recipient):
+    address = (recipient or {}).get("emailAddress") or {}
+    return address.get("name"), address.get("address")
+
+
+class EmailRecord:
+    __slots__ = (
+        "id", "conversation_id", "subject", "preview", "received", "has_attachments", "headers",
+        "from_name", "from_email", "to_name", "to_email", "body_text", "body_lines",
+    )
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+
+    @classmethod
+    def from_graph(cls, message):
+        """Preprocess a Graph message resource; the caller can drop the message afterwards"""
+        with stage("html_strip"):
+            body_text, body_lines = strip_html_twice((message.get("body") or {}).get("content", ""))
+        from_name, from_email = _address(message.get("from"))
+        to_name, to_email = _address((message.get("toRecipients") or [None])[0])
+        return cls(
+            id=message["id"],
+            conversation_id=message.get("conversationId"),
+            subject=message.get("subject") or "",
+            preview=message.get("bodyPreview") or "",
+            received=message.get("receivedDateTime"),
+            has_attachments=bool(message.get("hasAttachments")),
+            headers=[{"name": h["name"], "value": h["value"]} for h in message.get("internetMessageHeaders") or []
+                     if h["name"].lower() in KEPT_HEADERS],
+            from_name=from_name, from_email=from_email, to_name=to_name, to_email=to_email,
+            body_text=body_text, body_lines=body_lines,
+        )
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, values):
+        if "body_text" not in values:
+            # Queued before records existed: still a Graph message resource
+            return cls.from_graph(values)
+        return cls(**values)
+
+    def get(self, key, default=None):
+        value = getattr(self, GRAPH_KEYS[key], None) if key in GRAPH_KEYS else None
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        if key not in GRAPH_KEYS:
+            raise KeyError(key)
+        return getattr(self, GRAPH_KEYS[key])
+
+    def __repr__(self):
+        return f"EmailRecord(id={self.id!r}, subject={self.subject!r})"
+
+
+def as_record(email):
+    """EmailRecord for a record or a Graph-shaped dict"""
+    return email if isinstance(email, EmailRecord) else EmailRecord.from_graph(email)
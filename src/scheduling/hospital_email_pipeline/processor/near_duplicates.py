@@ -0,0 +1,241 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import deque
+from processor.work_queue import STATE_DIR
+
+# Near-duplicate index over extracted emails. A coordinator forwarding the
+# same availability to several colleagues, or a tutor resending with a typo
+# fixed, produce almost the same raw_text, and each would otherwise cost a
+# full generation.
+#
+# Texts are normalised (header lines, forwarding banners and quote markers
+# removed, lowercased) and shingled into character 5-grams. Word n-grams or
+# SimHash move too much for a one-word edit in a 40-word email. Each text
+# gets a MinHash signature by one-permutation hashing: one hash per shingle
+# into NUM_BINS bins, and empty bins borrow from the next filled one. The
+# signature is split into BANDS bands for LSH buckets, so a lookup compares
+# only the few emails sharing a band instead of all of them. The estimated
+# Jaccard similarity of a candidate is checked against THRESHOLD.
+#
+# A lookup has to stay under a millisecond with tens of thousands of emails
+# stored, and emails written from one template crowd the same buckets. Each
+# bucket therefore keeps only its BUCKET_CAP most recent signatures, which
+# bounds a lookup to BANDS * BUCKET_CAP comparisons. Resends and forwards
+# follow the original closely in time, so an evicted entry is rarely the
+# one wanted, and it stays reachable through its other bands. An identical
+# text is found by a dict lookup before any bucket is read.
+#
+# A near-duplicate is only reused as is when its "salient" tokens also
+# match: digits, months, weekdays, times and negations, and the subject
+# (without Re:/Fw: prefixes). "I'm available on 12 July" and "I'm not
+# available on 13 July" are textually close but must still go to the model,
+# and so must "Yes that works" on two different session invites.
+
+# Minimum estimated Jaccard similarity of the shingle sets to count as a near-duplicate
+THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.85"))
+SHINGLE_CHARS = 5
+NUM_BINS = 64
+# 8 bands of 8 rows: ~92% of pairs at 0.85 and ~99% at 0.9 share a bucket, ~13% at 0.6
+BANDS = 8
+ROWS = NUM_BINS // BANDS
+BUCKET_CAP = 32
+# Per 32-bit bin of a signature read as one integer: the low 31 bits, and the top bit
+LOW_BITS = int.from_bytes(b"\xff\xff\xff\x7f" * NUM_BINS, "little")
+TOP_BIT = int.from_bytes(b"\x00\x00\x00\x80" * NUM_BINS, "little")
+popcount = getattr(int, "bit_count", None) or (lambda v: bin(v).count("1"))
+
+HEADER_LINE = re.compile(r"^\s*(from|to|cc|bcc|sent|date|subject)\s*:", re.IGNORECASE)
+BANNER_LINE = re.compile(r"forwarded message|original message|begin forwarded", re.IGNORECASE)
+SUBJECT_LINE = re.compile(r"^\s*subject\s*:(.*)$", re.IGNORECASE)
+REPLY_PREFIX = re.compile(r"^\s*(?:(?:re|fw|fwd|aw|wg)\s*:\s*)+", re.IGNORECASE)
+WORD = re.compile(r"[a-z0-9]+")
+MONTHS = {"jan", "january", "feb", "february", "mar", "march", "apr", "april", "may", "jun", "june", "jul", "july",
+          "aug", "august", "sep", "sept", "september", "oct", "october", "nov", "november", "dec", "december"}
+WEEKDAYS = {"mon", "monday", "tue", "tues", "tuesday", "wed", "wednesday", "thu", "thur", "thurs", "thursday",
+            "fri", "friday", "sat", "saturday", "sun", "sunday", "today", "tomorrow"}
+NEGATIONS = {"not", "no", "cannot", "cant", "unable", "unavailable", "except", "neither", "nor", "decline", "cancel"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS near_duplicates (
+    email_id TEXT PRIMARY KEY,
+    signature BLOB NOT NULL,
+    salient TEXT NOT NULL,
+    record TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def normalise(raw_text):
+    """Words of the text without headers, forwarding banners and quote markers"""
+    lines = []
+    for line in raw_text.splitlines():
+        line = line.lstrip("> ")
+        if HEADER_LINE.match(line) or BANNER_LINE.search(line):
+            continue
+        lines.append(line)
+    return WORD.findall(" ".join(lines).lower().replace("'", ""))
+
+
+def salient(words):
+    """The tokens a tiny edit may not change: numbers, dates, times and negations"""
+    return " ".join(w for w in words if any(c.isdigit() for c in w) or w in MONTHS or w in WEEKDAYS
+                    or w in NEGATIONS or w in ("am", "pm"))
+
+
+def subjects(raw_text):
+    """The distinct subjects in the text (a forward or quoted reply carries the original's too), without Re:/Fw:"""
+    found = set()
+    for line in raw_text.splitlines():
+        match = SUBJECT_LINE.match(line.lstrip("> "))
+        if match:
+            subject = " ".join(WORD.findall(REPLY_PREFIX.sub("", match.group(1)).lower().replace("'", "")))
+            if subject:
+                found.add(subject)
+    return " | ".join(sorted(found))
+
+
+def fingerprint(raw_text):
+    """(signature, salient key) of an email's text: the body's shingles; its salient tokens and subject"""
+    words = normalise(raw_text)
+    return signature(words), f"{salient(words)}\n{subjects(raw_text)}"
+
+
+def signature(words):
+    """MinHash signature (NUM_BINS 32-bit minimums) of the character shingles, as bytes"""
+    text = " ".join(words)
+    shingles = {text[i:i + SHINGLE_CHARS] for i in range(max(1, len(text) - SHINGLE_CHARS + 1))}
+    bins = [None] * NUM_BINS
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        b, value = h % NUM_BINS, (h // NUM_BINS) & 0xFFFFFFFF
+        if bins[b] is None or value < bins[b]:
+            bins[b] = value
+    filled = [i for i in range(NUM_BINS) if bins[i] is not None]
+    dense = array("I", [0] * NUM_BINS)
+    for i in range(NUM_BINS):
+        if bins[i] is not None:
+            dense[i] = bins[i]
+        else:
+            # Densification: borrow from the next filled bin, salted with the distance
+            source = next(j for j in filled + [f + NUM_BINS for f in filled] if j > i)
+            dense[i] = (bins[source % NUM_BINS] + (source - i) * 0x9E3779B1) & 0xFFFFFFFF
+    return dense.tobytes()
+
+
+def _equal_bins(x, y):
+    """Bins two signatures (as integers) agree on, with a few big-integer operations instead of a loop"""
+    diff = x ^ y
+    # Top bit of each bin set where the bin differs: adding LOW_BITS carries into it from any low bit
+    differing = (((diff & LOW_BITS) + LOW_BITS) | diff) & TOP_BIT
+    return NUM_BINS - popcount(differing)
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures"""
+    return _equal_bins(int.from_bytes(a, "little"), int.from_bytes(b, "little")) / NUM_BINS
+
+
+class Match:
+    __slots__ = ("email_id", "similarity", "reusable", "_index")
+
+    def __init__(self, email_id, similarity, reusable, index):
+        self.email_id = email_id
+        self.similarity = similarity
+        self.reusable = reusable
+        self._index = index
+
+    def record(self):
+        """The structured record extracted for the earlier email"""
+        return self._index.record(self.email_id)
+
+
+class NearDuplicateIndex:
+    def __init__(self, name="default", path=None, threshold=THRESHOLD):
+        if path is None:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            path = os.path.join(STATE_DIR, f"near_duplicates_{name}.db")
+        self.path = path
+        self.threshold = threshold
+        self._buckets = [{} for _ in range(BANDS)]
+        # signature -> (latest email_id, salient, signature as an integer); identical texts share one entry
+        self._entries = {}
+        self._indexed = set()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+            rows = self._db.execute("SELECT email_id, signature, salient FROM near_duplicates ORDER BY created_at").fetchall()
+        for email_id, sig, salient_text in rows:
+            self._insert(email_id, bytes(sig), salient_text)
+
+    @staticmethod
+    def _band_keys(sig):
+        width = ROWS * 4
+        return [sig[b * width:(b + 1) * width] for b in range(BANDS)]
+
+    def _insert(self, email_id, sig, salient_text):
+        self._indexed.add(email_id)
+        if sig not in self._entries:
+            for bucket, key in zip(self._buckets, self._band_keys(sig)):
+                members = bucket.get(key)
+                if members is None:
+                    members = bucket[key] = deque(maxlen=BUCKET_CAP)
+                members.append(sig)
+        self._entries[sig] = (email_id, salient_text, int.from_bytes(sig, "little"))
+
+    def lookup(self, raw_text, exclude=None):
+        """Closest stored near-duplicate of raw_text as a Match, or None"""
+        return self._lookup(*fingerprint(raw_text), exclude)
+
+    def _lookup(self, sig, salient_text, exclude=None):
+        best = None
+        with self._lock:
+            exact = self._entries.get(sig)
+            if exact is not None and exact[0] != exclude and exact[1] == salient_text:
+                # Nothing can rank higher than an identical, reusable text
+                return Match(exact[0], 1.0, True, self)
+            candidates = set()
+            for bucket, key in zip(self._buckets, self._band_keys(sig)):
+                candidates.update(bucket.get(key, ()))
+            value = int.from_bytes(sig, "little")
+            for other in candidates:
+                email_id, other_salient, other_value = self._entries[other]
+                if email_id == exclude:
+                    continue
+                score = _equal_bins(value, other_value) / NUM_BINS
+                if score < self.threshold:
+                    continue
+                reusable = other_salient == salient_text
+                # Prefer a reusable match, then the most similar
+                rank = (reusable, score)
+                if best is None or rank > best[0]:
+                    best = (rank, email_id)
+        if best is None:
+            return None
+        (reusable, score), email_id = best
+        return Match(email_id, score, reusable, self)
+
+    def add(self, email_id, raw_text, record):
+        sig, salient_text = fingerprint(raw_text)
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO near_duplicates (email_id, signature, salient, record, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (email_id, sig, salient_text, json.dumps(record, ensure_ascii=False), time.time()))
+            if email_id not in self._indexed:
+                self._insert(email_id, sig, salient_text)
+
+    def record(self, email_id):
+        with self._lock:
+            row = self._db.execute("SELECT record FROM near_duplicates WHERE email_id = ?", (email_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def __len__(self):
+        return len(self._indexed)
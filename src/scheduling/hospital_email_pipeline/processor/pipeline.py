@@ -0,0 +1,351 @@
+import os
+import re
+import json
+from datetime import datetime
+from processor.email_parser import extract_relevant_fields
+from processor.email_record import as_record
+from processor.slot_intervals import annotate_conflicts
+from processor.coalesce import with_context
+from processor.reply_classifier import latest_reply, classify_reply, decline_reason, accepted_slots, format_session_slot
+from api.send_to_backend import post_structured_data, post_blocked_dates, fetch_email_session
+from api.outbox import idempotency_key
+from graph_api.mark_as_read import mark_email_as_read
+from graph_api.attachments import list_attachments, download_attachment
+from processor.attachments import attachment_kind, parse_ics, parse_xlsx, blocked_dates_senders
+from utils.metrics import stage, REPLY_ROUTES, NEAR_DUPLICATES
+from utils.trace import record, text_digest
+
+# One email through extraction -> LLM -> backend -> mark read. main.py runs
+# this in its polling loop; bench/replay.py drives it from a recorded trace.
+# Replies to our own invites (X-Session-ID) take process_reply instead, which
+# only calls the reply model when the rule-based classifier cannot decide.
+# A reply that turns the invite down is posted as type "decline", so it is
+# not counted as the doctor's availability for the session.
+#
+# With an outbox (use_outbox, see api/outbox.py) records are committed locally
+# and delivered in batches; without one they are posted directly, and an
+# email whose record the backend did not store is left unread for a retry.
+# Once the record is committed or posted the email counts as done, even if
+# marking it read fails: with a work queue (use_work_queue) that email is
+# remembered so later polls only retry marking it read.
+#
+# With a near-duplicate index (use_near_duplicates, see
+# processor/near_duplicates.py) a forward or resend of an email already
+# extracted reuses that record instead of calling the model, and every
+# record that repeats an earlier email is posted with duplicate_of set.
+
+outbox = None
+near_duplicates = None
+work_queue = None
+
+
+def use_outbox(box):
+    global outbox
+    outbox = box
+
+
+def use_near_duplicates(index):
+    global near_duplicates
+    near_duplicates = index
+
+
+def use_work_queue(queue):
+    global work_queue
+    work_queue = queue
+
+
+def safe_print(text):
+    """Safely print text with Unicode characters by encoding them properly"""
+    try:
+        # Try to encode and decode to remove problematic Unicode characters
+        safe_text = text.encode('ascii', 'ignore').decode('ascii')
+        print(safe_text)
+    except Exception:
+        # If all else fails, print a sanitized version
+        print("[INFO] <Email content contains special characters>")
+
+
+def received_at(email):
+    """Local datetime the email arrived, used to infer the year of slot dates"""
+    value = email.get("receivedDateTime")
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone().replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def parse_model_output(structured_json, fields):
+    """Turn the model's JSON reply into the backend payload; raises json.JSONDecodeError"""
+    if structured_json.lower().startswith("assistant"):
+        structured_json = structured_json[len("assistant"):].strip()
+
+    structured_data = json.loads(structured_json)
+    structured_data["from_name"] = fields["from_name"]
+    structured_data["from_email"] = fields["from_email"]
+    structured_data["to_email"] = fields["to_email"]
+
+    # Robustly derive available_slots_timings from original_session + new_session
+    if (structured_data.get("type") or "").strip().lower() == "availability":
+        original = (structured_data.get("original_session") or "").strip()
+        new_time = (structured_data.get("new_session") or "").strip()
+
+        print("[INFO] original_session:", original)
+        print("[INFO] new_session:", new_time)
+
+        if original and new_time:
+            # Normalize common unicode dashes to simple hyphen
+            original_cleaned = original.replace("\u2013", "-").replace("\u2014", "-").replace("\u2015", "-").strip()
+
+            # Extract everything before the first opening parenthesis
+            match = re.match(r"^(.*?)\s*\(", original_cleaned)
+            extracted_date = match.group(1).strip() if match else None
+
+            if extracted_date:
+                structured_data["available_slots_timings"] = [f"{extracted_date} ({new_time})"]
+                print("[OK] Overwrote available_slots_timings:", structured_data["available_slots_timings"])
+            else:
+                print("[ERROR] Could not extract date from cleaned original_session:", original_cleaned)
+        else:
+            print("[WARNING] original_session or new_session missing")
+
+    return structured_data
+
+
+def process_email(email, model, conflict_checker, access_token, context=None):
+    """Extract, post and mark one email read; returns the result label used in the metrics"""
+    fields = extract_relevant_fields(email)
+    print("[INFO] Extracted Fields:")
+    for k, v in fields.items():
+        print(f"{k}: ", end="")
+        safe_print(str(v))
+
+    if email.get("hasAttachments"):
+        result = process_attachments(email, fields, conflict_checker, access_token)
+        if result is not None:
+            return result
+
+    # Thread context changes what the model sees, so only standalone emails are matched
+    match = None
+    if near_duplicates is not None and context is None:
+        with stage("near_duplicate"):
+            match = near_duplicates.lookup(fields["raw_text"], exclude=email["id"])
+        if match is not None and match.reusable:
+            structured_data = match.record()
+            if structured_data is not None:
+                print(f"[OK] Near-duplicate of {match.email_id} ({match.similarity:.0%}); reusing its record")
+                NEAR_DUPLICATES.inc(action="reused")
+                for key in ("from_name", "from_email", "to_email"):
+                    structured_data[key] = fields[key]
+                structured_data["duplicate_of"] = idempotency_key(match.email_id)
+                return post_and_mark_read(email, structured_data, conflict_checker, access_token)
+
+    user_message = with_context(fields["raw_text"], context)
+    print("[INFO] Prompt to LLM:")
+    safe_print(user_message)
+
+    with stage("generate"):
+        structured_json = model.generate(user_message).strip()
+    record("llm_output", email_id=email.get("id"), input_sha1=text_digest(user_message), output=structured_json)
+
+    try:
+        structured_data = parse_model_output(structured_json, fields)
+    except json.JSONDecodeError:
+        print("[ERROR] Failed to parse model output:")
+        safe_print(structured_json)
+        return "parse_error"
+
+    if near_duplicates is not None and context is None:
+        near_duplicates.add(email["id"], fields["raw_text"], structured_data)
+        if match is not None:
+            # Close to an earlier email but with different dates, times or negations
+            print(f"[INFO] Near-duplicate of {match.email_id} ({match.similarity:.0%}) with different details; extracted anew")
+            NEAR_DUPLICATES.inc(action="generated")
+            structured_data["duplicate_of"] = idempotency_key(match.email_id)
+
+    return post_and_mark_read(email, structured_data, conflict_checker, access_token)
+
+
+def post_and_mark_read(email, structured_data, conflict_checker, access_token):
+    """Annotate conflicts, post the record to the backend and mark the email read"""
+    annotate_conflicts(structured_data, conflict_checker, received_at(email))
+    if structured_data["has_conflicts"]:
+        print("[WARNING] Requested slots collide with blocked dates or booked sessions")
+
+    print("[INFO] Final structured data to send to backend:")
+    safe_print(json.dumps(structured_data, indent=2, ensure_ascii=True))
+
+    if outbox is not None:
+        with stage("outbox"):
+            key = outbox.put(email["id"], structured_data)
+        print(f"[OK] Committed to outbox: {key}")
+        # The record is durable now, so the email can be marked read before delivery
+        mark_read(email, access_token)
+        return "queued"
+
+    with stage("backend_post"):
+        code, response = post_structured_data(dict(structured_data, idempotency_key=idempotency_key(email["id"])))
+    print(f"[OK] Sent to backend: {code} - {response}")
+    record("backend_response", email_id=email.get("id"), endpoint="parsed-email", status=code, body=response)
+
+    if not 200 <= code < 300:
+        print("[WARNING] Backend did not store the record; leaving the email unread for a retry")
+        return "backend_error"
+    mark_read(email, access_token)
+    return "posted"
+
+
+def mark_read(email, access_token):
+    """Mark a handled email read; on failure only the marking is retried on later polls"""
+    # ✅ Handle token expiration during email marking
+    try:
+        with stage("mark_read"):
+            marked = mark_email_as_read(email['id'], access_token)
+    except Exception as mark_error:
+        print(f"[WARNING] Failed to mark email as read: {mark_error}")
+        if "401" in str(mark_error) or "authentication" in str(mark_error).lower():
+            print("[WARNING] Token may have expired during email processing")
+            # Continue with processing other emails, token will be refreshed on next iteration
+        marked = False
+    if not marked and work_queue is not None:
+        work_queue.add_unmarked([email['id']])
+    return marked
+
+
+def read_attachments(email, access_token, read_xlsx=True):
+    """(slots, summaries, blocked dates, file names) from the email's .ics/.xlsx attachments"""
+    slots, summaries, blocked, names = [], [], [], []
+    for attachment in list_attachments(email["id"], access_token):
+        kind = attachment_kind(attachment)
+        if kind is None:
+            continue
+        if kind == "xlsx" and not read_xlsx:
+            print(f"[INFO] Ignoring spreadsheet {attachment.get('name')}: sender is not in BLOCKED_DATES_SENDERS")
+            continue
+        path = download_attachment(email["id"], attachment["id"], access_token, suffix=f".{kind}")
+        if path is None:
+            continue
+        try:
+            if kind == "ics":
+                event_slots, event_summaries = parse_ics(path)
+                slots.extend(s for s in event_slots if s not in slots)
+                summaries.extend(s for s in event_summaries if s not in summaries)
+            else:
+                blocked.extend(parse_xlsx(path))
+            names.append(attachment.get("name"))
+        except Exception as e:
+            print(f"[WARNING] Could not parse attachment {attachment.get('name')}: {e}")
+        finally:
+            os.unlink(path)
+    return slots, summaries, blocked, names
+
+
+def process_attachments(email, fields, conflict_checker, access_token):
+    """
+    Post what calendar/spreadsheet attachments say without the LLM. Returns
+    the result label, or None when there is nothing structured to read.
+    """
+    # Blocked dates only from a configured coordinator, for their school and year
+    target = blocked_dates_senders().get((fields["from_email"] or "").lower())
+    with stage("attachments"):
+        slots, summaries, blocked, names = read_attachments(email, access_token, read_xlsx=target is not None)
+    if not slots and not blocked:
+        return None
+    print(f"[INFO] Read {len(slots)} slots and {len(blocked)} blocked dates from: {', '.join(names)}")
+
+    if blocked:
+        with stage("backend_post"):
+            code, response = post_blocked_dates(blocked, *target)
+        print(f"[OK] Sent blocked dates to backend: {code} - {response}")
+        record("backend_response", email_id=email.get("id"), endpoint="update-blocked-dates", status=code, body=response)
+        if not 200 <= code < 300:
+            # Left unread: the attachments are read again on a later poll
+            return "backend_error"
+
+    if not slots:
+        mark_read(email, access_token)
+        return "posted"
+
+    structured_data = {
+        "type": "availability", "session_name": summaries[0] if summaries else None,
+        "from_name": fields["from_name"], "from_email": fields["from_email"], "to_email": fields["to_email"],
+        "original_session": None, "new_session": None, "reason": None, "students": None,
+        "available_slots_timings": slots, "notes": f"From calendar attachment: {', '.join(names)}",
+    }
+    return post_and_mark_read(email, structured_data, conflict_checker, access_token)
+
+
+_sessions = {}
+
+
+def session_details(session_id):
+    """email_sessions row for an invite, fetched once per monitor run"""
+    if session_id not in _sessions:
+        session = fetch_email_session(session_id)
+        if session is None:
+            return None
+        _sessions[session_id] = session
+    return _sessions[session_id]
+
+
+def fast_reply_record(reply, label, session, fields, reference=None):
+    """Backend record for a clear accept/decline, or None when the reply model is needed"""
+    structured_data = {
+        "type": "availability", "session_name": session.get("session_name"),
+        "from_name": fields["from_name"], "from_email": fields["from_email"], "to_email": fields["to_email"],
+        "original_session": None, "new_session": None, "reason": None, "students": None,
+        "available_slots_timings": [], "notes": f"Reply to session invite: {label}",
+    }
+    if label == "decline":
+        structured_data["type"] = "decline"
+        structured_data["reason"] = decline_reason(reply)
+        return structured_data
+    slots = accepted_slots(reply, session.get("slots") or [], reference)
+    if not slots:
+        return None
+    structured_data["available_slots_timings"] = slots
+    return structured_data
+
+
+def process_reply(email, session_id, reply_model, conflict_checker, access_token, context=None):
+    """A reply to one of our invites: classify, fall back to the reply model if unclear, post against the session"""
+    email = as_record(email)
+    fields = extract_relevant_fields(email)
+    # Line breaks matter here: the quoted invite starts at an "On ... wrote:" line
+    reply = latest_reply(email.body_lines)
+    session = session_details(session_id)
+
+    with stage("reply_classify"):
+        label = classify_reply(reply)
+    print(f"[INFO] Reply to session {session_id} classified as: {label}")
+
+    structured_data = None
+    if session is not None and label in ("accept", "decline"):
+        structured_data = fast_reply_record(reply, label, session, fields, received_at(email))
+
+    if structured_data is not None:
+        REPLY_ROUTES.inc(path="fast", label=label)
+    else:
+        REPLY_ROUTES.inc(path="llm", label=label)
+        user_message = with_context(fields["raw_text"], context)
+        if session is not None:
+            offered = ", ".join(format_session_slot(slot) for slot in session.get("slots") or [])
+            user_message = f"Invite for session: {session.get('session_name')}\nOffered slots: {offered or 'none'}\n\n{user_message}"
+        with stage("generate"):
+            structured_json = reply_model.generate(user_message).strip()
+        record("llm_output", email_id=email.get("id"), input_sha1=text_digest(user_message), output=structured_json)
+        try:
+            structured_data = parse_model_output(structured_json, fields)
+        except json.JSONDecodeError:
+            print("[ERROR] Failed to parse reply model output:")
+            safe_print(structured_json)
+            return "parse_error"
+        if session is not None and session.get("session_name"):
+            structured_data["session_name"] = session["session_name"]
+        if structured_data.get("type") == "availability" and not structured_data.get("available_slots_timings"):
+            # The reply model writes a decline as availability without slots
+            structured_data["type"] = "decline"
+
+    structured_data["session_id"] = session_id
+    return post_and_mark_read(email, structured_data, conflict_checker, access_token)
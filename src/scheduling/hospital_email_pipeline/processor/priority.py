@@ -0,0 +1,40 @@
+from datetime import datetime
+from processor.slot_intervals import mentioned_dates
+from processor.email_record import as_record
+
+# Cheap urgency score for an unread email, from the subject and preview only:
+# urgent keywords, dates close to today, and whether the sender already has
+# sessions on the timetable. Scores map to the classes reported in the stats.
+
+KEYWORDS = {
+    "urgent": 40, "asap": 40, "emergency": 40, "today": 30, "tomorrow": 30,
+    "cancel": 30, "cancellation": 30, "postpone": 20, "reschedule": 20, "change": 10,
+}
+# (max days ahead, points) for the nearest upcoming date mentioned
+DATE_PROXIMITY = [(1, 40), (3, 25), (7, 10)]
+KNOWN_TUTOR_POINTS = 15
+PRIORITY_CLASSES = [("urgent", 60), ("high", 30), ("normal", 0)]
+
+
+def priority_class(score):
+    return next(name for name, threshold in PRIORITY_CLASSES if score >= threshold)
+
+
+def score_email(email, conflict_checker=None, today=None):
+    """(score, priority class) of an email"""
+    today = today or datetime.now()
+    text = f"{email.get('subject') or ''} {email.get('bodyPreview') or ''}".lower()
+    words = set("".join(ch if ch.isalnum() else " " for ch in text).split())
+
+    score = sum(points for word, points in KEYWORDS.items() if word in words)
+
+    upcoming = [(day - today.date()).days for day in mentioned_dates(text, today)]
+    upcoming = [days for days in upcoming if days >= 0]
+    if upcoming:
+        score += next((points for max_days, points in DATE_PROXIMITY if min(upcoming) <= max_days), 0)
+
+    sender = as_record(email).from_email
+    if conflict_checker is not None and conflict_checker.knows_doctor(sender):
+        score += KNOWN_TUTOR_POINTS
+
+    return score, priority_class(score)
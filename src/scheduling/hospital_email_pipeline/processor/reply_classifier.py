@@ -0,0 +1,127 @@
+import re
+from datetime import datetime
+from processor.slot_intervals import mentioned_dates, format_slot
+
+# Rule-based triage of replies to our own session invites (the ones carrying
+# X-Session-ID). Most are one-liners ("Yes, I can make it", "Sorry, I'm away
+# that week") that need no LLM at all. Only the newest part of the reply is
+# read; anything that is long, mixed or proposes another time is "ambiguous"
+# or "propose" and goes to LlamaReplyModel instead.
+#
+# An accept phrase right after a negation ("not sure I can make it", "not
+# okay") or next to a hedge ("might", "tentatively") does not count as an
+# acceptance; the reply is ambiguous. Plain acknowledgements ("ok, noted")
+# are weak: they never outweigh a decline in the same reply.
+
+MAX_FAST_WORDS = 60
+
+ACCEPT = [
+    r"\byes\b", r"\bi can make it\b", r"\bi can (?:attend|do it|come|join)\b", r"\bconfirm(?:ed|ing)?\b",
+    r"\bworks for me\b", r"\b(?:i am|i'm|im) (?:free|available)\b", r"\bcount me in\b", r"\bsounds good\b",
+    r"\bhappy to\b", r"\bsee you\b",
+]
+# Acknowledgements: an acceptance on their own, but not against a decline
+WEAK_ACCEPT = [r"\bsure\b", r"\bok(?:ay)?\b", r"\bno problem\b", r"\bnoted\b"]
+DECLINE = [
+    r"\bnot (?:be )?(?:free|available|attending|coming|joining)\b", r"\bunavailable\b", r"\bno longer\b", r"\bregret\b",
+    r"\bdecline\b", r"\b(?:won't|will not|wont) be (?:able|attending|coming|joining|there)\b",
+    r"\b(?:can't|cant|cannot|can not|won't|wont|will not|unable to|not able to) (?:make|attend|do|come|join|teach)\b",
+    r"\bapolog", r"\bsorry\b", r"\bwill be (?:away|overseas|on leave)\b",
+]
+HEDGE = [
+    r"\bnot sure\b", r"\bunsure\b", r"\bmight\b", r"\bmaybe\b", r"\bperhaps\b", r"\btentative",
+    r"\bprobably\b", r"\bdepends\b", r"\bwill (?:try|check|confirm later|let you know)\b",
+]
+# Words that turn a following accept phrase around ("not okay", "no, i can't ... yes")
+NEGATIONS = {"not", "no", "never", "dont", "don't", "won't", "wont", "can't", "cant", "cannot", "isn't", "doesn't", "wouldn't"}
+NEGATION_WINDOW = 3
+PROPOSE = [
+    r"\binstead\b", r"\bhow about\b", r"\bwhat about\b", r"\balternative", r"\bcould we\b", r"\bcan we\b",
+    r"\bmove\b", r"\breschedul", r"\bpostpone\b", r"\banother (?:day|date|time|slot)\b", r"\bearlier\b", r"\blater\b",
+]
+_ACCEPT_RE = re.compile("|".join(ACCEPT))
+_WEAK_ACCEPT_RE = re.compile("|".join(WEAK_ACCEPT))
+_DECLINE_RE = re.compile("|".join(DECLINE))
+_PROPOSE_RE = re.compile("|".join(PROPOSE))
+_HEDGE_RE = re.compile("|".join(HEDGE))
+
+# Where the quoted invite starts in common mail clients
+_QUOTE_START_RE = re.compile(
+    r"^\s*(?:on .+ wrote:|-+\s*original message\s*-+|_{10,}|from:\s.+|sent from my \w+)\s*$", re.IGNORECASE)
+_REASON_RE = re.compile(r"\b(?:due to|because of|as i(?:'m| am| have| will be)?)\s+([^.!\n]+)", re.IGNORECASE)
+
+
+def latest_reply(body):
+    """The text above the quoted history, without '>' quote lines"""
+    lines = []
+    for line in body.splitlines():
+        if _QUOTE_START_RE.match(line):
+            break
+        if not line.lstrip().startswith(">"):
+            lines.append(line)
+    return "\n".join(lines).strip()
+
+
+def _negated(text, start):
+    """Whether one of the NEGATION_WINDOW words before position start is a negation"""
+    before = re.findall(r"[a-z']+", text[:start])[-NEGATION_WINDOW:]
+    return any(word in NEGATIONS for word in before)
+
+
+def _accepts(pattern, text):
+    """(plain matches, negated matches) of an accept pattern"""
+    plain = negated = 0
+    for match in pattern.finditer(text):
+        if _negated(text, match.start()):
+            negated += 1
+        else:
+            plain += 1
+    return plain, negated
+
+
+def classify_reply(text):
+    """'accept', 'decline', 'propose' or 'ambiguous' for the newest part of a reply"""
+    text = text.lower().replace("’", "'")
+    if not text or len(text.split()) > MAX_FAST_WORDS:
+        return "ambiguous"
+    if _PROPOSE_RE.search(text):
+        return "propose"
+    accept, negated = _accepts(_ACCEPT_RE, text)
+    weak, weak_negated = _accepts(_WEAK_ACCEPT_RE, text)
+    decline = bool(_DECLINE_RE.search(text))
+    if decline:
+        # "Ok, noted. I will not be attending." declines; "Yes ... sorry, can't" is mixed
+        return "ambiguous" if accept else "decline"
+    if negated or weak_negated or _HEDGE_RE.search(text):
+        return "ambiguous"
+    return "accept" if accept or weak else "ambiguous"
+
+
+def decline_reason(text):
+    match = _REASON_RE.search(text)
+    return match.group(1).strip() if match else None
+
+
+def _slot_date(slot):
+    return datetime.fromisoformat(str(slot["date"])[:10]).date()
+
+
+def format_session_slot(slot):
+    """{date, startTime, endTime} from email_sessions as '11 July 2025 (2pm–4pm)', like the availability link"""
+    times = None
+    if slot.get("startTime") and slot.get("endTime"):
+        times = tuple(tuple(int(part) for part in slot[key].split(":")[:2]) for key in ("startTime", "endTime"))
+    return format_slot(_slot_date(slot), times)
+
+
+def accepted_slots(text, offered, reference=None):
+    """
+    The offered slots an acceptance refers to: the one on offer, or the ones
+    whose dates the reply names. None when that cannot be told without the LLM.
+    """
+    if len(offered) == 1:
+        return [format_session_slot(offered[0])]
+    # Replies rarely give the year, so match on day and month
+    named = {(d.month, d.day) for d in mentioned_dates(text, reference)}
+    chosen = [slot for slot in offered if (_slot_date(slot).month, _slot_date(slot).day) in named]
+    return [format_session_slot(slot) for slot in chosen] or None
@@ -0,0 +1,326 @@
+import re
+from datetime import datetime, timedelta
+
+# Free-form slot text ("10 July (Mon) 2pm", "11am 11 July", "27 Aug 2-4pm")
+# is turned into [start, end) datetime intervals once, so conflict checks
+# never have to re-read the strings.
+
+DEFAULT_SLOT_MINUTES = 60
+
+MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3,
+    "apr": 4, "april": 4, "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7,
+    "aug": 8, "august": 8, "sep": 9, "sept": 9, "september": 9, "oct": 10, "october": 10,
+    "nov": 11, "november": 11, "dec": 12, "december": 12,
+}
+
+_MONTH = r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+_DAY_MONTH_RE = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?" + _MONTH + r"\b(?:\s+(\d{4}))?")
+_MONTH_DAY_RE = re.compile(r"\b" + _MONTH + r"\s+(\d{1,2})(?:st|nd|rd|th)?\b(?:,?\s+(\d{4}))?")
+_ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+
+_TIME = r"(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm)?"
+_TIME_RANGE_RE = re.compile(r"\b" + _TIME + r"\s*(?:-|to)\s*" + _TIME + r"(?![\d])")
+# A bare number only counts as a time with am/pm or hh:mm, so "11 July" is not 11 o'clock
+_TIME_RE = re.compile(r"\b(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm)\b|\b(\d{1,2})[:.](\d{2})\b")
+
+_DASHES = str.maketrans({"–": "-", "—": "-", "―": "-", "−": "-"})
+
+# Cohort named in the free-text "students" field ("Year 3 group", "M2 Duke-NUS")
+_YEAR_RE = re.compile(r"\b(?:year|yr|y|m|phase)\s*-?\s*([1-5])\b", re.IGNORECASE)
+# Schools as the blocked-dates upload names them; Duke-NUS before plain NUS
+_SCHOOLS = (("DUKE NUS", re.compile(r"\bduke\b", re.IGNORECASE)),
+            ("NUS YLL", re.compile(r"\b(?:nus|yll)\b", re.IGNORECASE)),
+            ("NTU LKC", re.compile(r"\b(?:ntu|lkc)\b", re.IGNORECASE)))
+
+
+def _to_minutes(hour, minute, meridiem):
+    hour = int(hour)
+    minute = int(minute or 0)
+    if meridiem == "pm" and hour != 12:
+        hour += 12
+    elif meridiem == "am" and hour == 12:
+        hour = 0
+    return hour * 60 + minute
+
+
+def parse_time_range(text):
+    """Return (start_minute, end_minute) from a time or time range, or None"""
+    text = text.lower().translate(_DASHES)
+
+    for m in _TIME_RANGE_RE.finditer(text):
+        h1, m1, mer1, h2, m2, mer2 = m.groups()
+        # "20 - 21 Oct" is a day range, not a time range
+        if not (mer1 or mer2 or m1 or m2):
+            continue
+        end = _to_minutes(h2, m2, mer2)
+        if mer1 is None and mer2:
+            # "2-4pm" shares the meridiem, "11-1pm" does not
+            start = _to_minutes(h1, m1, mer2)
+            if start >= end:
+                start = _to_minutes(h1, m1, "am")
+        else:
+            start = _to_minutes(h1, m1, mer1)
+        if end > start:
+            return start, end
+
+    m = _TIME_RE.search(text)
+    if m:
+        if m.group(3):
+            start = _to_minutes(m.group(1), m.group(2), m.group(3))
+        else:
+            start = _to_minutes(m.group(4), m.group(5), None)
+        return start, start + DEFAULT_SLOT_MINUTES
+
+    return None
+
+
+def parse_date(text, reference=None):
+    """Return the calendar date mentioned in text, inferring the year from reference"""
+    text = text.lower()
+    reference = reference or datetime.now()
+
+    m = _ISO_DATE_RE.search(text)
+    if m:
+        try:
+            return datetime(int(m.group(1)), int(m.group(2)), int(m.group(3))).date()
+        except ValueError:
+            return None
+
+    m = _DAY_MONTH_RE.search(text)
+    if m:
+        day, month, year = m.group(1), m.group(2), m.group(3)
+    else:
+        m = _MONTH_DAY_RE.search(text)
+        if not m:
+            return None
+        month, day, year = m.group(1), m.group(2), m.group(3)
+
+    month = MONTHS[month]
+    day = int(day)
+    try:
+        if year:
+            return datetime(int(year), month, day).date()
+        # Slots without a year are upcoming: roll past dates into next year
+        candidate = datetime(reference.year, month, day).date()
+        if candidate < (reference - timedelta(days=30)).date():
+            candidate = datetime(reference.year + 1, month, day).date()
+        return candidate
+    except ValueError:
+        return None
+
+
+def _clock(hour, minute):
+    suffix = "pm" if hour >= 12 else "am"
+    return f"{hour % 12 or 12}{':%02d' % minute if minute else ''}{suffix}"
+
+
+def format_slot(day, times=None):
+    """
+    Slot text in the availability-link style, '11 July 2025 (2pm–4pm)', from a
+    date and optional ((start hour, minute), (end hour, minute)); parse_slot reads it back.
+    """
+    text = f"{day.day} {day.strftime('%B %Y')}"
+    if times:
+        (h1, m1), (h2, m2) = times
+        text += f" ({_clock(h1, m1)}–{_clock(h2, m2)})"
+    return text
+
+
+def mentioned_dates(text, reference=None):
+    """Every calendar date mentioned in text"""
+    dates = set()
+    for pattern in (_ISO_DATE_RE, _DAY_MONTH_RE, _MONTH_DAY_RE):
+        for match in pattern.finditer(text.lower()):
+            value = parse_date(match.group(0), reference)
+            if value:
+                dates.add(value)
+    return dates
+
+
+def parse_slot(text, reference=None):
+    """Turn a slot string into a (start, end) datetime interval, or None if it has no date"""
+    if not text:
+        return None
+    slot_date = parse_date(text, reference)
+    if slot_date is None:
+        return None
+
+    day_start = datetime.combine(slot_date, datetime.min.time())
+    times = parse_time_range(text)
+    if times is None:
+        # No time given: the whole day is on offer
+        return day_start, day_start + timedelta(days=1)
+    return day_start + timedelta(minutes=times[0]), day_start + timedelta(minutes=times[1])
+
+
+class IntervalIndex:
+    """
+    Static interval tree over [start, end) intervals.
+
+    Intervals are kept sorted by start and viewed as an implicit balanced
+    BST (the middle element of each range is the node). Every node records
+    the largest end in its subtree, so overlap queries prune whole subtrees
+    and run in O(log n + k).
+    """
+
+    def __init__(self, intervals=()):
+        self._items = sorted(intervals, key=lambda iv: (iv[0], iv[1]))
+        self._max_end = [None] * len(self._items)
+        self._build(0, len(self._items))
+
+    def __len__(self):
+        return len(self._items)
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        max_end = self._items[mid][1]
+        for child in (self._build(lo, mid), self._build(mid + 1, hi)):
+            if child is not None and child > max_end:
+                max_end = child
+        self._max_end[mid] = max_end
+        return max_end
+
+    def _search(self, lo, hi, start, end, found, first_only):
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._max_end[mid] <= start:
+                return
+            self._search(lo, mid, start, end, found, first_only)
+            if first_only and found:
+                return
+            item = self._items[mid]
+            if item[0] >= end:
+                return
+            if item[1] > start:
+                found.append(item)
+                if first_only:
+                    return
+            lo = mid + 1
+
+    def overlaps(self, start, end):
+        """Every stored interval overlapping [start, end)"""
+        found = []
+        self._search(0, len(self._items), start, end, found, False)
+        return found
+
+    def collides(self, start, end):
+        """True if any stored interval overlaps [start, end)"""
+        found = []
+        self._search(0, len(self._items), start, end, found, True)
+        return bool(found)
+
+
+def student_cohort(students):
+    """(school, yearofstudy) named in a reply's students text; either is None when not said"""
+    text = students if isinstance(students, str) else ""
+    year = _YEAR_RE.search(text)
+    school = next((name for name, pattern in _SCHOOLS if pattern.search(text)), None)
+    return school, f"M{year.group(1)}" if year else None
+
+
+def _same(value, wanted):
+    # Blocked dates and replies that do not name a school or year apply to all
+    return not value or not wanted or re.sub(r"[^A-Z0-9]", "", str(value).upper()) == re.sub(r"[^A-Z0-9]", "", wanted.upper())
+
+
+def _parse_backend_date(value):
+    # MySQL DATE columns come back as UTC ISO timestamps of local midnight
+    if not value:
+        return None
+    if "T" in value:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone().date()
+    return datetime.fromisoformat(value[:10]).date()
+
+
+class ConflictChecker:
+    """
+    Blocked dates and booked sessions indexed for slot collision checks.
+    Blocked dates belong to a school and year, and only count against a
+    reply whose students are that cohort (or do not say). sessions=None
+    means the timetable could not be read, so slots are marked unchecked
+    rather than conflict-free.
+    """
+
+    def __init__(self, blocked_dates=(), sessions=()):
+        blocked = []
+        for item in blocked_dates:
+            day = _parse_backend_date(item.get("date"))
+            if day:
+                start = datetime.combine(day, datetime.min.time())
+                blocked.append((start, start + timedelta(days=1), {
+                    "type": "blocked_date", "date": str(day), "remark": item.get("remark"),
+                    "school": item.get("school"), "yearofstudy": item.get("yearofstudy"),
+                }))
+        self.blocked = IntervalIndex(blocked)
+
+        self.timetable_checked = sessions is not None
+        by_doctor = {}
+        for session in sessions or ():
+            day = _parse_backend_date(session.get("date"))
+            times = parse_time_range(session.get("time") or "")
+            if not day:
+                continue
+            start = datetime.combine(day, datetime.min.time())
+            end = start + timedelta(days=1)
+            if times:
+                start, end = start + timedelta(minutes=times[0]), start + timedelta(minutes=times[1])
+            email = (session.get("doctor_email") or "").lower()
+            by_doctor.setdefault(email, []).append((start, end, {
+                "type": "session",
+                "session_id": session.get("id"),
+                "session_name": session.get("session_name"),
+                "date": str(day),
+                "time": session.get("time"),
+            }))
+        self.sessions = {email: IntervalIndex(items) for email, items in by_doctor.items()}
+
+    def _blocked(self, start, end, cohort):
+        school, year = cohort or (None, None)
+        return [payload for _, _, payload in self.blocked.overlaps(start, end)
+                if _same(payload["school"], school) and _same(payload["yearofstudy"], year)]
+
+    def check_slot(self, start, end, doctor_email=None, cohort=None):
+        """Blocked dates of the (school, year) cohort and the doctor's own sessions that overlap [start, end)"""
+        conflicts = self._blocked(start, end, cohort)
+        index = self.sessions.get((doctor_email or "").lower())
+        if index:
+            conflicts.extend(payload for _, _, payload in index.overlaps(start, end))
+        return conflicts
+
+    def knows_doctor(self, doctor_email):
+        """Whether the doctor has sessions on the timetable"""
+        return (doctor_email or "").lower() in self.sessions
+
+    def collides(self, start, end, doctor_email=None, cohort=None):
+        index = self.sessions.get((doctor_email or "").lower())
+        return bool(self._blocked(start, end, cohort)) or bool(index and index.collides(start, end))
+
+    def check_reply(self, structured_data, reference=None):
+        """Normalise every slot in a parsed email and report the conflicts of each"""
+        doctor_email = structured_data.get("from_email")
+        cohort = student_cohort(structured_data.get("students"))
+        slots = list(structured_data.get("available_slots_timings") or [])
+        for field in ("original_session", "new_session"):
+            if structured_data.get(field):
+                slots.append(structured_data[field])
+
+        results = []
+        for text in slots:
+            interval = parse_slot(text, reference)
+            entry = {"slot": text, "start": None, "end": None, "conflicts": [], "timetable_checked": self.timetable_checked}
+            if interval:
+                entry["start"], entry["end"] = interval[0].isoformat(), interval[1].isoformat()
+                entry["conflicts"] = self.check_slot(interval[0], interval[1], doctor_email, cohort)
+            results.append(entry)
+        return results
+
+
+def annotate_conflicts(structured_data, checker, reference=None):
+    """Attach normalised slot intervals and their conflicts to the parsed email JSON"""
+    slots = checker.check_reply(structured_data, reference)
+    structured_data["slot_intervals"] = slots
+    structured_data["has_conflicts"] = any(slot["conflicts"] for slot in slots)
+    return structured_data
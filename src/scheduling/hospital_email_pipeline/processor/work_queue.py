@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime
+from utils.metrics import TIME_TO_PROCESSED
+from processor.email_record import EmailRecord, as_record
+from processor.coalesce import group_key
+
+# Persistent priority queue between the Graph fetch and inference. One row per
+# conversation and sender (see processor/coalesce.py), ordered by
+#
+#   score + aging_per_minute * minutes waiting
+#
+# so urgent mail jumps ahead but nothing waits forever. Rows survive restarts
+# (the wait keeps counting) and are kept after processing for the
+# time-to-processed stats.
+#
+# Messages that are dealt with but could not be marked read are remembered
+# in the superseded table: ones coalesced into a later message, and ones
+# whose record was already committed or posted when marking them read
+# failed. The next poll does not extract them again and only retries
+# marking them read.
+
+STATE_DIR = os.getenv("PIPELINE_STATE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "state"))
+AGING_PER_MINUTE = float(os.getenv("QUEUE_AGING_PER_MINUTE", "2"))
+KEEP_DONE_DAYS = 7
+# The email is still unread after these, so it comes back on the next poll
+RETRYABLE_RESULTS = ("parse_error", "backend_error")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_items (
+    key TEXT PRIMARY KEY,
+    email_id TEXT NOT NULL,
+    payload TEXT,
+    score REAL NOT NULL,
+    priority TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    enqueued_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    processed_at REAL,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS work_items_status ON work_items (status);
+CREATE TABLE IF NOT EXISTS superseded (
+    email_id TEXT PRIMARY KEY,
+    recorded_at REAL NOT NULL
+);
+"""
+
+
+def _received_epoch(email):
+    value = email.get("receivedDateTime")
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except (AttributeError, ValueError):
+        return time.time()
+
+
+class WorkQueue:
+    def __init__(self, name="default", path=None, aging_per_minute=AGING_PER_MINUTE):
+        if path is None:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            path = os.path.join(STATE_DIR, f"work_queue_{name}.db")
+        self.path = path
+        self.aging_per_minute = aging_per_minute
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+            # Items that were being processed when the monitor stopped go back in line
+            self._db.execute("UPDATE work_items SET status = 'pending' WHERE status = 'processing'")
+            self._db.execute("DELETE FROM work_items WHERE status = 'done' AND processed_at < ?",
+                             (time.time() - KEEP_DONE_DAYS * 86400,))
+            self._db.execute("DELETE FROM superseded WHERE recorded_at < ?", (time.time() - KEEP_DONE_DAYS * 86400,))
+
+    def push(self, email, superseded, score, priority):
+        """Queue (or refresh) a conversation; False if this exact email was already processed"""
+        key = group_key(email)
+        payload = json.dumps({"email": as_record(email).to_dict(), "superseded": [as_record(e).to_dict() for e in superseded]})
+        received = min(_received_epoch(e) for e in [email, *superseded])
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute("SELECT email_id, status FROM work_items WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._db.execute(
+                    "INSERT INTO work_items (key, email_id, payload, score, priority, received_at, enqueued_at, status) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, 'pending')",
+                    (key, email["id"], payload, score, priority, received, now))
+                return True
+            email_id, status = row
+            if status == "done" and email_id == email["id"]:
+                return False
+            if status == "processing":
+                return True
+            # A follow-up in the thread, or a retry after a parse error: keep the original wait
+            restart = status == "done"
+            self._db.execute(
+                "UPDATE work_items SET email_id = ?, payload = ?, score = ?, priority = ?, status = 'pending', "
+                "received_at = CASE WHEN ? THEN ? ELSE received_at END, "
+                "enqueued_at = CASE WHEN ? THEN ? ELSE enqueued_at END, processed_at = NULL, result = NULL "
+                "WHERE key = ?",
+                (email["id"], payload, score, priority, restart, received, restart, now, key))
+            return True
+
+    def retain(self, keys):
+        """Drop pending items that are no longer unread (read or deleted elsewhere)"""
+        keys = set(keys)
+        with self._lock, self._db:
+            pending = [k for (k,) in self._db.execute("SELECT key FROM work_items WHERE status = 'pending'")]
+            stale = [(k,) for k in pending if k not in keys]
+            self._db.executemany("DELETE FROM work_items WHERE key = ?", stale)
+        return len(stale)
+
+    def pop(self):
+        """(key, email, superseded, priority) with the highest aged score, or None"""
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT key, payload, priority FROM work_items WHERE status = 'pending' "
+                "ORDER BY score + ? * (? - enqueued_at) / 60.0 DESC, received_at ASC LIMIT 1",
+                (self.aging_per_minute, now)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE work_items SET status = 'processing' WHERE key = ?", (row[0],))
+        payload = json.loads(row[1])
+        return row[0], EmailRecord.from_dict(payload["email"]), [EmailRecord.from_dict(e) for e in payload["superseded"]], row[2]
+
+    def complete(self, key, result):
+        """Record the outcome; parse and backend errors stay retryable since the email is still unread"""
+        now = time.time()
+        status = "failed" if result in RETRYABLE_RESULTS else "done"
+        with self._lock, self._db:
+            row = self._db.execute("SELECT priority, received_at FROM work_items WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "UPDATE work_items SET status = ?, processed_at = ?, result = ?, payload = CASE WHEN ? = 'done' THEN NULL ELSE payload END "
+                "WHERE key = ?", (status, now, result, status, key))
+        if row and status == "done":
+            TIME_TO_PROCESSED.observe(now - row[1], priority=row[0])
+
+    def add_unmarked(self, email_ids):
+        """Remember messages that are dealt with but still unread, so only marking them read is retried"""
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO superseded (email_id, recorded_at) VALUES (?, ?)",
+                                 [(email_id, now) for email_id in email_ids])
+
+    def unmarked_ids(self, email_ids):
+        """The subset of email_ids that only need marking read"""
+        email_ids = list(email_ids)
+        if not email_ids:
+            return set()
+        marks = ",".join("?" * len(email_ids))
+        with self._lock:
+            return {i for (i,) in self._db.execute(f"SELECT email_id FROM superseded WHERE email_id IN ({marks})", email_ids)}
+
+    def forget_unmarked(self, email_ids):
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM superseded WHERE email_id = ?", [(email_id,) for email_id in email_ids])
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM work_items WHERE status = 'pending'").fetchone()[0]
+
+    def stats(self, hours=24):
+        """{priority: {count, p50_s, p95_s, pending}} of time from arrival to processed"""
+        since = time.time() - hours * 3600
+        with self._lock:
+            done = self._db.execute(
+                "SELECT priority, processed_at - received_at FROM work_items "
+                "WHERE status = 'done' AND processed_at >= ? ORDER BY 2", (since,)).fetchall()
+            pending = dict(self._db.execute(
+                "SELECT priority, COUNT(*) FROM work_items WHERE status = 'pending' GROUP BY priority").fetchall())
+        stats = {}
+        for priority in sorted({p for p, _ in done} | set(pending)):
+            waits = [w for p, w in done if p == priority]
+            stats[priority] = {
+                "count": len(waits),
+                "p50_s": waits[int(0.5 * (len(waits) - 1))] if waits else None,
+                "p95_s": waits[int(round(0.95 * (len(waits) - 1)))] if waits else None,
+                "pending": pending.get(priority, 0),
+            }
+        return stats
+
+
+def format_stats(stats):
+    parts = []
+    for priority, s in stats.items():
+        if s["count"]:
+            parts.append(f"{priority}: p50 {s['p50_s']:.0f}s, p95 {s['p95_s']:.0f}s (n={s['count']}, pending {s['pending']})")
+        else:
+            parts.append(f"{priority}: pending {s['pending']}")
+    return " | ".join(parts) or "no emails yet"
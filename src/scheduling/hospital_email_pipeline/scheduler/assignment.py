@@ -0,0 +1,323 @@
+import os
+import sys
+import json
+import argparse
+from collections import deque
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from processor.slot_intervals import IntervalIndex, parse_slot, parse_time_range
+
+# Tutor-to-session assignment as a max-flow problem:
+#
+#   source -> doctor (capacity: sessions the doctor may take)
+#          -> offered slot (capacity: most non-overlapping sessions that fit)
+#          -> open session that fits inside the slot (capacity 1)
+#          -> sink
+#
+# Constraints are pluggable objects that either cap a doctor's capacity or
+# veto a slot -> session edge. A doctor's overlapping slots are merged first,
+# so a long slot can take several sessions back to back. Flow alone cannot
+# stop two of them overlapping, so each round keeps a non-overlapping set per
+# doctor and the sessions it drops are offered again, around the bookings
+# kept so far, until a round books nothing new.
+
+
+class Constraint:
+    """Base class for assignment constraints; override either hook"""
+
+    def capacity(self, doctor):
+        return None
+
+    def allows(self, doctor, session):
+        return True
+
+
+class MaxSessionsPerDoctor(Constraint):
+    def __init__(self, limit):
+        self.limit = limit
+
+    def capacity(self, doctor):
+        return self.limit
+
+
+class NoBlockedDates(Constraint):
+    """Keep sessions off dates produced by the blocked-dates extractor"""
+
+    def __init__(self, blocked_dates):
+        self.dates = {str(item["date"])[:10] if isinstance(item, dict) else str(item)[:10] for item in blocked_dates}
+
+    def allows(self, doctor, session):
+        return session["start"].date().isoformat() not in self.dates
+
+
+class MatchSessionName(Constraint):
+    """Only offer a doctor the sessions named in their reply, when the reply names one"""
+
+    def allows(self, doctor, session):
+        wanted = (doctor.get("session_name") or "").strip().lower()
+        name = (session.get("session_name") or "").strip().lower()
+        return not wanted or not name or wanted in name or name in wanted
+
+
+class MaxFlow:
+    """Dinic's algorithm on flat edge arrays (edge e and e ^ 1 are a pair)"""
+
+    def __init__(self, node_count):
+        self.adj = [[] for _ in range(node_count)]
+        self.to = []
+        self.cap = []
+
+    def add_edge(self, u, v, capacity):
+        self.adj[u].append(len(self.to))
+        self.to.append(v)
+        self.cap.append(capacity)
+        self.adj[v].append(len(self.to))
+        self.to.append(u)
+        self.cap.append(0)
+        return len(self.to) - 2
+
+    def _levels(self, source, sink):
+        level = [-1] * len(self.adj)
+        level[source] = 0
+        queue = deque([source])
+        to, cap, adj = self.to, self.cap, self.adj
+        while queue:
+            u = queue.popleft()
+            for e in adj[u]:
+                if cap[e] and level[to[e]] < 0:
+                    level[to[e]] = level[u] + 1
+                    queue.append(to[e])
+        return level if level[sink] >= 0 else None
+
+    def max_flow(self, source, sink):
+        total = 0
+        to, cap, adj = self.to, self.cap, self.adj
+        while True:
+            level = self._levels(source, sink)
+            if level is None:
+                return total
+            pointer = [0] * len(adj)
+            while True:
+                # Iterative DFS for one augmenting path in the level graph
+                path = []
+                u = source
+                while u != sink:
+                    edges = adj[u]
+                    i = pointer[u]
+                    while i < len(edges):
+                        e = edges[i]
+                        if cap[e] and level[to[e]] == level[u] + 1:
+                            break
+                        i += 1
+                    pointer[u] = i
+                    if i == len(edges):
+                        if u == source:
+                            break
+                        # Dead end: retreat and skip the edge that led here
+                        level[u] = -1
+                        e = path.pop()
+                        u = to[e ^ 1]
+                        pointer[u] += 1
+                        continue
+                    path.append(edges[i])
+                    u = to[edges[i]]
+                if u != sink:
+                    break
+                flow = min(cap[e] for e in path)
+                for e in path:
+                    cap[e] -= flow
+                    cap[e ^ 1] += flow
+                total += flow
+
+
+def _session_interval(session):
+    if session.get("start") and session.get("end"):
+        return datetime.fromisoformat(session["start"]), datetime.fromisoformat(session["end"])
+    day = datetime.fromisoformat(str(session["date"])[:10])
+    times = parse_time_range(session.get("time") or "")
+    if times is None:
+        return day, day + timedelta(days=1)
+    return day + timedelta(minutes=times[0]), day + timedelta(minutes=times[1])
+
+
+def load_doctors(availability_records, reference=None):
+    """Group parsed availability emails by doctor and parse their offered slots"""
+    doctors = {}
+    for record in availability_records:
+        if (record.get("type") or "availability").lower() != "availability":
+            continue
+        email = (record.get("from_email") or "").lower()
+        if not email:
+            continue
+        doctor = doctors.setdefault(email, {
+            "email": email,
+            "name": record.get("from_name"),
+            "session_name": record.get("session_name"),
+            "slots": [],
+        })
+        for text in record.get("available_slots_timings") or []:
+            interval = parse_slot(text, reference)
+            if interval and interval not in doctor["slots"]:
+                doctor["slots"].append(interval)
+    return list(doctors.values())
+
+
+def load_sessions(open_sessions):
+    sessions = []
+    for session in open_sessions:
+        start, end = _session_interval(session)
+        sessions.append(dict(session, start=start, end=end))
+    return sessions
+
+
+def merge_slots(slots):
+    """A doctor's offered slots as sorted, disjoint intervals (touching slots stay apart)"""
+    merged = []
+    for start, end in sorted(slots):
+        if merged and start < merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def check_no_overlap(assignments):
+    """Raise ValueError if a doctor is assigned two sessions that overlap in time"""
+    by_doctor = {}
+    for assignment in assignments:
+        by_doctor.setdefault(assignment["doctor_email"], []).append((assignment["start"], assignment["end"]))
+    for doctor, intervals in by_doctor.items():
+        intervals.sort()
+        for (_, previous_end), (start, _) in zip(intervals, intervals[1:]):
+            if start < previous_end:
+                raise ValueError(f"{doctor} is double-booked at {start}")
+
+
+def most_disjoint(intervals):
+    """Largest set of pairwise non-overlapping (start, end, ...) tuples, earliest end first"""
+    kept = []
+    for interval in sorted(intervals, key=lambda i: i[1]):
+        if not kept or interval[0] >= kept[-1][1]:
+            kept.append(interval)
+    return kept
+
+
+def _overlaps_any(start, end, booked):
+    return any(start < b_end and b_start < end for b_start, b_end in booked)
+
+
+def _solve_round(doctors, doctor_slots, sessions, session_index, open_sessions, booked, constraints):
+    """One max-flow over the open sessions; {doctor: [session, ...]} as routed, overlaps and all"""
+    doctor_base = 1
+    slot_base = doctor_base + len(doctors)
+    session_base = slot_base + sum(len(slots) for slots in doctor_slots)
+    sink = session_base + len(sessions)
+    graph = MaxFlow(sink + 1)
+
+    match_edges = []
+    slot_node = slot_base
+    for d, doctor in enumerate(doctors):
+        limits = [c.capacity(doctor) for c in constraints]
+        limits = [limit for limit in limits if limit is not None]
+        doctor_capacity = 0
+        doctor_edge = graph.add_edge(0, doctor_base + d, 0)
+        for start, end in doctor_slots[d]:
+            fitting = []
+            for s_start, s_end, s in session_index.overlaps(start, end):
+                # The whole session has to fit inside the offered slot, clear of earlier bookings
+                if s not in open_sessions or s_start < start or s_end > end or _overlaps_any(s_start, s_end, booked[d]):
+                    continue
+                if all(c.allows(doctor, sessions[s]) for c in constraints):
+                    fitting.append((s_start, s_end, s))
+            capacity = len(most_disjoint(fitting))
+            if capacity:
+                graph.add_edge(doctor_base + d, slot_node, capacity)
+                doctor_capacity += capacity
+                for _, _, s in fitting:
+                    match_edges.append((graph.add_edge(slot_node, session_base + s, 1), d, s))
+            slot_node += 1
+        if limits:
+            doctor_capacity = min(doctor_capacity, min(limits) - len(booked[d]))
+        graph.cap[doctor_edge] = max(doctor_capacity, 0)
+
+    for s in open_sessions:
+        graph.add_edge(session_base + s, sink, 1)
+
+    graph.max_flow(0, sink)
+
+    routed = {}
+    for edge, d, s in match_edges:
+        if graph.cap[edge] == 0:
+            routed.setdefault(d, []).append(s)
+    return routed
+
+
+def solve(doctors, sessions, constraints=()):
+    """Maximum assignment of sessions to doctors; returns (assignments, unassigned sessions)"""
+    session_index = IntervalIndex((s["start"], s["end"], i) for i, s in enumerate(sessions))
+    doctor_slots = [merge_slots(d["slots"]) for d in doctors]
+
+    booked = [[] for _ in doctors]
+    assigned = {}
+    open_sessions = set(range(len(sessions)))
+    while open_sessions:
+        routed = _solve_round(doctors, doctor_slots, sessions, session_index, open_sessions, booked, constraints)
+        added = dropped = 0
+        for d, routed_sessions in routed.items():
+            kept = most_disjoint((sessions[s]["start"], sessions[s]["end"], s) for s in routed_sessions)
+            for start, end, s in kept:
+                booked[d].append((start, end))
+                assigned[s] = d
+                open_sessions.discard(s)
+            added += len(kept)
+            dropped += len(routed_sessions) - len(kept)
+        # Without drops the round was already a maximum assignment
+        if not added or not dropped:
+            break
+
+    assignments = []
+    for s, d in sorted(assigned.items()):
+        assignments.append({
+            "session_id": sessions[s].get("id"),
+            "session_name": sessions[s].get("session_name"),
+            "start": sessions[s]["start"].isoformat(),
+            "end": sessions[s]["end"].isoformat(),
+            "doctor_email": doctors[d]["email"],
+            "doctor_name": doctors[d]["name"],
+        })
+    unassigned = [sessions[s].get("id") for s in range(len(sessions)) if s not in assigned]
+    check_no_overlap(assignments)
+    return assignments, unassigned
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Assign tutors to open sessions from parsed availability replies")
+    parser.add_argument("--availability", required=True, help="JSON list of parsed availability emails")
+    parser.add_argument("--sessions", required=True, help="JSON list of open sessions (id, session_name, date, time)")
+    parser.add_argument("--blocked", help="JSON list of blocked dates ({date, remark})")
+    parser.add_argument("--max-per-doctor", type=int, default=None, help="Cap on sessions per doctor")
+    parser.add_argument("--match-session-name", action="store_true", help="Only assign sessions named in the reply")
+    args = parser.parse_args()
+
+    with open(args.availability, "r") as f:
+        availability = json.load(f)
+    with open(args.sessions, "r") as f:
+        open_sessions = json.load(f)
+
+    constraints = []
+    if args.blocked:
+        with open(args.blocked, "r") as f:
+            blocked = json.load(f)
+        constraints.append(NoBlockedDates(blocked.get("blocked_dates", []) if isinstance(blocked, dict) else blocked))
+    if args.max_per_doctor:
+        constraints.append(MaxSessionsPerDoctor(args.max_per_doctor))
+    if args.match_session_name:
+        constraints.append(MatchSessionName())
+
+    doctors = load_doctors(availability)
+    sessions = load_sessions(open_sessions)
+    assignments, unassigned = solve(doctors, sessions, constraints)
+
+    print(json.dumps({"assignments": assignments, "unassigned": unassigned}, indent=2))
+    print(f"[INFO] Assigned {len(assignments)}/{len(sessions)} sessions across {len(doctors)} doctors", file=sys.stderr)
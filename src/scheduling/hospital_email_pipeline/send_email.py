@@ -1,12 +1,11 @@
-import requests
 import json
 import os
 import sys
-from dotenv import load_dotenv
 from email_config import EmailConfig
 
 def send_email(access_token, to_emails, subject, body, session_id=None, from_email=None):
     """Send email using Microsoft Graph API"""
+    import requests
     
     # Format recipients for Graph API
     recipients = [{"emailAddress": {"address": email}} for email in to_emails]
@@ -46,8 +45,9 @@ def send_email(access_token, to_emails, subject, body, session_id=None, from_ema
     }
     
     try:
+        graph_base_url = os.getenv("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0")
         response = requests.post(
-            "https://graph.microsoft.com/v1.0/me/sendMail",
+            f"{graph_base_url}/me/sendMail",
             headers=headers,
             json=payload
         )
@@ -105,6 +105,7 @@ def send_session_email_from_data(email_data, profile_name="default"):
     return send_email(access_token, to_emails, subject, body, session_id, sender_info['email'])
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
     load_dotenv()
     
     # Parse command line arguments
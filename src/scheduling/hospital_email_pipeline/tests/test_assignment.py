@@ -0,0 +1,59 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PIPELINE_DIR)
+from scheduler.assignment import solve, merge_slots, check_no_overlap
+
+
+def at(hour, minute=0, day=11):
+    return datetime(2025, 7, day, hour, minute)
+
+
+def doctor(*slots):
+    return {"email": "dr.tan@hospital.sg", "name": "Dr Tan", "slots": list(slots)}
+
+
+def session(id_, start, end):
+    return {"id": id_, "session_name": "Cardiac Tutorial", "start": start, "end": end}
+
+
+def test_overlapping_slots_do_not_double_book():
+    # 9am-12pm and 10am-1pm on 11 July used to get both of these sessions
+    doctors = [doctor((at(9), at(12)), (at(10), at(13)))]
+    sessions = [session(1, at(10), at(11)), session(2, at(10, 30), at(11, 30))]
+    assignments, unassigned = solve(doctors, sessions)
+    assert len(assignments) == 1
+    assert len(unassigned) == 1
+
+
+def test_disjoint_slots_each_take_a_session():
+    doctors = [doctor((at(9), at(10)), (at(10), at(11)), (at(9, day=12), at(10, day=12)))]
+    sessions = [session(1, at(9), at(10)), session(2, at(10), at(11)), session(3, at(9, day=12), at(10, day=12))]
+    assignments, unassigned = solve(doctors, sessions)
+    assert sorted(a["session_id"] for a in assignments) == [1, 2, 3]
+    assert unassigned == []
+
+
+def test_merge_slots():
+    assert merge_slots([(at(10), at(13)), (at(9), at(12)), (at(13), at(14)), (at(9, day=12), at(10, day=12))]) == [
+        (at(9), at(13)), (at(13), at(14)), (at(9, day=12), at(10, day=12))]
+
+
+def test_check_no_overlap_rejects_a_double_booking():
+    booked = [{"doctor_email": "dr.tan@hospital.sg", "start": at(10).isoformat(), "end": at(11).isoformat()},
+              {"doctor_email": "dr.tan@hospital.sg", "start": at(10, 30).isoformat(), "end": at(11, 30).isoformat()}]
+    with pytest.raises(ValueError):
+        check_no_overlap(booked)
+
+
+def test_long_slot_takes_back_to_back_sessions():
+    # One 9am-1pm slot holds both the 9-11 and the 11-1 tutorial
+    doctors = [doctor((at(9), at(13)))]
+    sessions = [session(1, at(9), at(11)), session(2, at(11), at(13)), session(3, at(10), at(12))]
+    assignments, unassigned = solve(doctors, sessions)
+    assert sorted(a["session_id"] for a in assignments) == [1, 2]
+    assert unassigned == [3]
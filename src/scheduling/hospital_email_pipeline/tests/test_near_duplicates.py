@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PIPELINE_DIR)
+from processor.near_duplicates import NearDuplicateIndex
+
+REPLY = "From: Dr Tan <dr.tan@hospital.sg>\nTo: Med Admin <med-admin@hospital.sg>\nSubject: {subject}\n\nYes that works, thanks\n"
+
+
+@pytest.fixture
+def index(tmp_path):
+    return NearDuplicateIndex(path=str(tmp_path / "index.db"))
+
+
+def test_same_body_under_another_subject_is_not_reused(index):
+    index.add("cardio", REPLY.format(subject="Re: Cardio Tutorial 12 July"), {"session_name": "Cardio Tutorial"})
+    match = index.lookup(REPLY.format(subject="Re: Renal Tutorial 14 July"))
+    assert match is None or not match.reusable
+
+
+def test_resend_under_the_same_subject_is_reused(index):
+    index.add("cardio", REPLY.format(subject="Re: Cardio Tutorial 12 July"), {"session_name": "Cardio Tutorial"})
+    match = index.lookup(REPLY.format(subject="RE: Re: Cardio Tutorial 12 July"))
+    assert match is not None and match.reusable
+    assert match.record() == {"session_name": "Cardio Tutorial"}
+
+
+def test_forward_keeps_the_original_subject(index):
+    original = REPLY.format(subject="Cardio Tutorial 12 July")
+    index.add("cardio", original, {})
+    forward = ("From: Med Admin <med-admin@hospital.sg>\nTo: Colleague <colleague@hospital.sg>\n"
+               "Subject: FW: Cardio Tutorial 12 July\n\n---------- Forwarded message ---------\n" + original)
+    match = index.lookup(forward)
+    assert match is not None and match.reusable
@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PIPELINE_DIR)
+from processor.reply_classifier import classify_reply
+
+# Replies to a session invite and the label the rule-based classifier must
+# give them. "ambiguous" and "propose" go to the reply model, so a reply that
+# is not clearly an acceptance must never come out as "accept".
+CASES = [
+    # Acceptances
+    ("Yes, I can make it.", "accept"),
+    ("Ok, see you then", "accept"),
+    ("Works for me, thanks!", "accept"),
+    ("Sure, count me in.", "accept"),
+    ("Confirmed.", "accept"),
+    ("No problem", "accept"),
+    # Declines
+    ("Sorry, I'm away that week.", "decline"),
+    ("Ok, noted. I will not be attending.", "decline"),
+    ("I won't be able to make it, apologies.", "decline"),
+    ("Unfortunately I'm not available on that day.", "decline"),
+    ("I can't attend due to clinic.", "decline"),
+    ("Noted, I will be on leave then.", "decline"),
+    # Negated or hedged acceptances
+    ("I'm not sure I can make it", "ambiguous"),
+    ("Not okay for me", "ambiguous"),
+    ("No, I don't think I can make it", "ambiguous"),
+    ("I might be able to come, will let you know", "ambiguous"),
+    ("Yes, but sorry, I can't do the second slot", "ambiguous"),
+    # Proposals and empty replies
+    ("Could we do 3pm instead?", "propose"),
+    ("", "ambiguous"),
+    ("Thanks for the email.", "ambiguous"),
+]
+
+
+@pytest.mark.parametrize("text, expected", CASES)
+def test_classify_reply(text, expected):
+    assert classify_reply(text) == expected
@@ -0,0 +1,33 @@
+import os
+import sys
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PIPELINE_DIR)
+from processor.slot_intervals import ConflictChecker, annotate_conflicts, student_cohort
+
+BLOCKED = [{"date": "2025-07-11", "remark": "CBL Week", "school": "DUKE NUS", "yearofstudy": "M3"},
+           {"date": "2025-07-11", "remark": "Exams", "school": "NUS YLL", "yearofstudy": "M2"}]
+
+
+def conflicts(checker, students):
+    record = {"students": students, "available_slots_timings": ["11 July 2025 2-4pm"]}
+    return [c["remark"] for c in annotate_conflicts(record, checker)["slot_intervals"][0]["conflicts"]]
+
+
+def test_student_cohort():
+    assert student_cohort("Year 3 group") == (None, "M3")
+    assert student_cohort("M2 Duke-NUS students") == ("DUKE NUS", "M2")
+    assert student_cohort(None) == (None, None)
+
+
+def test_blocked_dates_only_count_for_their_cohort():
+    checker = ConflictChecker(BLOCKED, [])
+    assert conflicts(checker, "Year 3 group") == ["CBL Week"]
+    assert conflicts(checker, "Year 2 NUS batch") == ["Exams"]
+    # A reply that does not say which students still sees every blocked date
+    assert sorted(conflicts(checker, None)) == ["CBL Week", "Exams"]
+
+
+def test_unread_timetable_is_not_reported_as_checked():
+    record = annotate_conflicts({"available_slots_timings": ["12 July 2025 2-4pm"]}, ConflictChecker(BLOCKED, None))
+    assert record["slot_intervals"][0]["timetable_checked"] is False
@@ -1,4 +1,11 @@
-from bs4 import BeautifulSoup
+def strip_html(html_content, separator=""):
+    # bs4 is only needed once an email is actually processed
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html_content, "html.parser").get_text(separator)
 
-def strip_html(html_content):
-    return BeautifulSoup(html_content, "html.parser").get_text()
\ No newline at end of file
+
+def strip_html_twice(html_content, separator="\n"):
+    """(get_text(), get_text(separator)) from a single parse of the HTML"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html_content, "html.parser")
+    return soup.get_text(), soup.get_text(separator)
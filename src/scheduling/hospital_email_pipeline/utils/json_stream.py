@@ -0,0 +1,102 @@
+import json
+import codecs
+
+# Incremental reader for Graph list responses ({"value": [...], "@odata.nextLink": ...}).
+# The top-level object is walked by hand and each element of the array is
+# decoded on its own as soon as its bytes have arrived, so a page of
+# thousands of messages is never held in memory as one document. Stdlib only.
+
+WHITESPACE = " \t\r\n"
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.done = False
+
+    def more(self):
+        """Append the next chunk, dropping what was already consumed; False at the end of the stream"""
+        if self.done:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.done = True
+            tail = self.utf8.decode(b"", final=True)
+        else:
+            tail = self.utf8.decode(chunk)
+        self.text = self.text[self.pos:] + tail
+        self.pos = 0
+        return chunk is not None or bool(tail)
+
+    def peek(self):
+        """Next non-whitespace character, without consuming it"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.more():
+                raise ValueError("Unexpected end of JSON stream")
+
+    def take(self, allowed):
+        char = self.peek()
+        if char not in allowed:
+            raise ValueError(f"Expected one of {allowed!r} in JSON stream, got {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode one complete JSON value, reading further chunks until it is whole"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                # Read until the pending text has at least doubled, so a large
+                # value is re-scanned a logarithmic number of times
+                wanted = 2 * (len(self.text) - self.pos)
+                read = False
+                while len(self.text) - self.pos < wanted and self.more():
+                    read = True
+                if not read:
+                    raise
+                continue
+            # A number (or anything) ending exactly at the buffer end may continue in the next chunk
+            if end == len(self.text) and self.more():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_items(chunks, key="value", meta=None):
+    """
+    Yield the elements of the top-level array `key` of a streamed JSON object
+    one at a time. The object's other members (e.g. @odata.nextLink) are put
+    in `meta` as they are read, so check it once the generator is exhausted.
+    """
+    reader = _Reader(chunks)
+    reader.take("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        name = reader.value()
+        reader.take(":")
+        if name == key and reader.peek() == "[":
+            reader.take("[")
+            if reader.peek() == "]":
+                reader.take("]")
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.take(",]") == "]":
+                        break
+        else:
+            value = reader.value()
+            if meta is not None:
+                meta[name] = value
+        if reader.take(",}") == "}":
+            return
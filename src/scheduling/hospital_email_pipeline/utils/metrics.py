@@ -0,0 +1,366 @@
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# In-process metrics for the monitor, served in Prometheus text format.
+# Updates are a dict lookup and an add under a per-metric lock, so the
+# instrumentation stays on in production. Inference worker processes have
+# their own registry: after each email a worker sends what changed (take())
+# back over its result pipe and the monitor folds it into its own (merge()).
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def take(self):
+        """Increments since the last take(), and start again from zero"""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            for key, amount in values.items():
+                self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def take(self):
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, values):
+        with self._lock:
+            self._values.update(values)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self, **labels):
+        """(bucket counts, sum, count) for one label set"""
+        with self._lock:
+            state = self._values.get(_label_key(labels))
+            if state is None:
+                return [0] * (len(self.buckets) + 1), 0.0, 0
+            return list(state[0]), state[1], state[2]
+
+    def take(self):
+        """Observations since the last take(), and start again from zero"""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            for key, (counts, total, count) in values.items():
+                state = self._values.get(key)
+                if state is None:
+                    state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                state[0] = [a + b for a, b in zip(state[0], counts)]
+                state[1] += total
+                state[2] += count
+
+    def label_sets(self):
+        with self._lock:
+            return [dict(key) for key in self._values]
+
+    def quantile(self, q, **labels):
+        """Estimate a quantile by linear interpolation inside its bucket, as Prometheus does"""
+        counts, _, count = self.snapshot(**labels)
+        if not count:
+            return None
+        rank = q * count
+        running = 0
+        for i, n in enumerate(counts):
+            if running + n >= rank and n:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - running) / n
+            running += n
+        return self.buckets[-1]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._values.items()]
+        for key, (counts, total, count) in items:
+            running = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                running += n
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {running}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def take(self):
+        """{metric name: changes} since the last take(), small enough to pickle per email"""
+        changes = {}
+        for metric in self.metrics:
+            values = metric.take()
+            if values:
+                changes[metric.name] = values
+        return changes
+
+    def merge(self, changes):
+        """Fold another process's take() into this registry"""
+        by_name = {metric.name: metric for metric in self.metrics}
+        for name, values in changes.items():
+            if name in by_name:
+                by_name[name].merge(values)
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "email_pipeline_stage_seconds",
+    "Latency of each pipeline stage (fetch, html_strip, generate, tokenize, prefill, decode, backend_post, mark_read)"))
+STAGE_TOTAL = REGISTRY.register(Counter(
+    "email_pipeline_stage_total", "Pipeline stage runs by outcome"))
+TOKENS_IN = REGISTRY.register(Counter(
+    "email_pipeline_tokens_in_total", "Prompt tokens sent to the LLM"))
+TOKENS_OUT = REGISTRY.register(Counter(
+    "email_pipeline_tokens_out_total", "Tokens generated by the LLM"))
+TOKENS_PER_SECOND = REGISTRY.register(Gauge(
+    "email_pipeline_decode_tokens_per_second", "Decode throughput of the most recent generation"))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "email_pipeline_queue_depth", "Emails from the current poll still waiting to be processed"))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "email_pipeline_cache_requests_total", "Cache lookups by cache and result (hit/miss)"))
+GRAPH_THROTTLED = REGISTRY.register(Counter(
+    "email_pipeline_graph_throttled_total", "Microsoft Graph responses with status 429 or 503"))
+EMAILS_PROCESSED = REGISTRY.register(Counter(
+    "email_pipeline_emails_total", "Emails handled by the monitor, by result"))
+LAST_POLL = REGISTRY.register(Gauge(
+    "email_pipeline_last_successful_poll_timestamp_seconds", "Unix time of the last successful mailbox poll"))
+SPECULATIVE_TOKENS = REGISTRY.register(Counter(
+    "email_pipeline_speculative_tokens_total", "Draft-model tokens in assisted generation, by result (proposed/accepted)"))
+REPLY_ROUTES = REGISTRY.register(Counter(
+    "email_pipeline_reply_route_total", "Replies to session invites by path (fast/llm) and classification"))
+TIME_TO_PROCESSED = REGISTRY.register(Histogram(
+    "email_pipeline_time_to_processed_seconds", "Seconds from an email's arrival to its record being posted, by priority class",
+    buckets=(5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600, 86400)))
+STARTUP_SECONDS = REGISTRY.register(Gauge(
+    "email_pipeline_startup_seconds", "Seconds from monitor start to each start-up milestone (model_load, ready, first_email)"))
+OUTBOX_DEPTH = REGISTRY.register(Gauge(
+    "email_pipeline_outbox_depth",
+    "Parsed records committed locally and not accepted by the backend, by status (pending/dead)"))
+OUTBOX_DELIVERIES = REGISTRY.register(Counter(
+    "email_pipeline_outbox_deliveries_total", "Outbox records per delivery attempt, by result (stored/duplicate/retry/dead)"))
+NEAR_DUPLICATES = REGISTRY.register(Counter(
+    "email_pipeline_near_duplicates_total", "Emails matching an earlier one, by action (reused/generated)"))
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage into STAGE_SECONDS and count its outcome"""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_TOTAL.inc(stage=name, outcome="error")
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+    STAGE_TOTAL.inc(stage=name, outcome="ok")
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_graph_response(endpoint, status_code):
+    if status_code in (429, 503):
+        GRAPH_THROTTLED.inc(endpoint=endpoint, status=status_code)
+
+
+def mark_poll_success():
+    LAST_POLL.set(time.time())
+
+
+def start_metrics_server(port=None, host="127.0.0.1", stale_after=120):
+    """Serve /metrics and /healthz on a daemon thread; port 0 disables the server"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    if port is None:
+        port = int(os.getenv("METRICS_PORT", "9108"))
+    if not port:
+        return None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body = REGISTRY.render().encode("utf-8")
+                status, content_type = 200, "text/plain; version=0.0.4; charset=utf-8"
+            elif self.path == "/healthz":
+                last = LAST_POLL.value()
+                age = time.time() - last if last else None
+                healthy = age is not None and age < stale_after
+                body = json.dumps({
+                    "status": "ok" if healthy else "stale",
+                    "last_successful_poll": last or None,
+                    "seconds_since_poll": round(age, 1) if age is not None else None,
+                }).encode("utf-8")
+                status, content_type = (200 if healthy else 503), "application/json"
+            else:
+                body, status, content_type = b"not found\n", 404, "text/plain"
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), Handler)
+    except OSError as e:
+        # Another monitor (one per profile) may already hold the port
+        print(f"[ERROR] Metrics server could not bind {host}:{port} ({e}); this monitor's metrics are not served. "
+              f"Give each monitor its own port with --metrics-port or METRICS_PORT (0 disables)")
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"[INFO] Metrics on http://{host}:{port}/metrics (health: /healthz)")
+    return server
+
+
+_token_tally = threading.local()
+
+
+@contextmanager
+def count_tokens():
+    """
+    Tokens generated on this thread inside the block, as a dict filled in by
+    GenerationTimer.record. TOKENS_IN/TOKENS_OUT are process-wide, so deltas
+    of them would include other emails generating at the same time.
+    """
+    counts = {"in": 0, "out": 0}
+    previous = getattr(_token_tally, "counts", None)
+    _token_tally.counts = counts
+    try:
+        yield counts
+    finally:
+        _token_tally.counts = previous
+
+
+class GenerationTimer:
+    """
+    Streamer for model.generate that splits prefill from decode.
+
+    generate() calls put() once with the prompt and then once per new token,
+    so the second put() marks the first generated token.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.ended_at = None
+        self._puts = 0
+
+    def put(self, value):
+        self._puts += 1
+        if self._puts == 2:
+            self.first_token_at = time.perf_counter()
+
+    def end(self):
+        self.ended_at = time.perf_counter()
+
+    def record(self, prompt_tokens, new_tokens):
+        ended = self.ended_at or time.perf_counter()
+        first = self.first_token_at or ended
+        STAGE_SECONDS.observe(first - self.started, stage="prefill")
+        STAGE_SECONDS.observe(ended - first, stage="decode")
+        STAGE_TOTAL.inc(stage="prefill", outcome="ok")
+        STAGE_TOTAL.inc(stage="decode", outcome="ok")
+        TOKENS_IN.inc(prompt_tokens)
+        TOKENS_OUT.inc(new_tokens)
+        counts = getattr(_token_tally, "counts", None)
+        if counts is not None:
+            counts["in"] += prompt_tokens
+            counts["out"] += new_tokens
+        if ended > first and new_tokens > 1:
+            TOKENS_PER_SECOND.set((new_tokens - 1) / (ended - first))
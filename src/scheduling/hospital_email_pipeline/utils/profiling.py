@@ -0,0 +1,184 @@
+import os
+import io
+import json
+import time
+import shutil
+import hashlib
+import cProfile
+import pstats
+import threading
+from contextlib import contextmanager
+from utils.metrics import count_tokens
+
+# Opt-in profiling of individual emails. Nothing is armed unless one of the
+# switches below is set:
+#
+#   PROFILE_EVERY_N=50    profile every 50th processed email (cProfile + torch.profiler)
+#   PROFILE_SLOW_MS=20000 keep the cProfile of any email slower than this
+#   PROFILE_TORCH=0       skip torch.profiler on sampled emails
+#   PROFILE_DIR / PROFILE_KEEP  where traces go and how many are kept (oldest removed)
+#
+# A slow email can only be recognised afterwards, so with PROFILE_SLOW_MS set
+# every email runs under cProfile (cheap next to generation) and the trace is
+# discarded unless the threshold was crossed.
+#
+# cProfile and torch.profiler cannot run twice at once, so with several
+# inference workers only one email is profiled at a time; emails finishing
+# alongside it run unprofiled. With INFERENCE_WORKERS > 1 or an inference
+# server, generation happens in another process: the traces then cover only
+# this process (parsing, HTTP, waiting on the model), not the model itself.
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_FILES = [os.path.join(PIPELINE_DIR, "config", name) for name in ("llm_config.yaml", "llm_reply.yaml")]
+DEFAULT_PROFILE_DIR = os.path.join(PIPELINE_DIR, "profiles")
+
+
+def config_hash(paths=CONFIG_FILES):
+    """Short hash of the LLM configs, so traces can be matched to model/prompt changes"""
+    digest = hashlib.sha256()
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        except OSError:
+            digest.update(b"<missing>")
+    return digest.hexdigest()[:12]
+
+
+def _env_int(name, default=0):
+    try:
+        return int(os.getenv(name, default) or 0)
+    except ValueError:
+        print(f"[WARNING] Ignoring non-integer {name}={os.getenv(name)!r}")
+        return default
+
+
+class EmailProfiler:
+    def __init__(self, every_n=None, slow_ms=None, out_dir=None, keep=None, torch_trace=None, generation_elsewhere=None):
+        self.every_n = every_n if every_n is not None else _env_int("PROFILE_EVERY_N")
+        self.slow_ms = slow_ms if slow_ms is not None else _env_int("PROFILE_SLOW_MS")
+        self.out_dir = out_dir or os.getenv("PROFILE_DIR") or DEFAULT_PROFILE_DIR
+        self.keep = keep if keep is not None else _env_int("PROFILE_KEEP", 20)
+        if torch_trace is None:
+            torch_trace = os.getenv("PROFILE_TORCH", "1") != "0"
+        self.torch_trace = torch_trace
+        # Where generation runs when it is not in this process, e.g. "the inference server"
+        self.generation_elsewhere = generation_elsewhere
+        self.count = 0
+        self._count_lock = threading.Lock()
+        self._session = threading.Lock()
+        self.config_hash = config_hash() if self.enabled else None
+
+    @property
+    def enabled(self):
+        return bool(self.every_n or self.slow_ms)
+
+    def describe(self):
+        parts = []
+        if self.every_n:
+            parts.append(f"every {self.every_n} emails")
+        if self.slow_ms:
+            parts.append(f"emails over {self.slow_ms} ms")
+        return " and ".join(parts)
+
+    def _start_torch(self):
+        try:
+            import torch
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            prof = torch.profiler.profile(activities=activities, record_shapes=True)
+            prof.__enter__()
+            return prof
+        except Exception as e:
+            print(f"[WARNING] torch.profiler unavailable: {e}")
+            return None
+
+    @contextmanager
+    def profile(self, email_id=None):
+        """Profile one email if it is sampled; the yielded dict is saved into meta.json"""
+        if not self.enabled:
+            yield {}
+            return
+
+        with self._count_lock:
+            self.count += 1
+            number = self.count
+        # One profiled email at a time; the others run as normal
+        if not self._session.acquire(blocking=False):
+            yield {}
+            return
+
+        try:
+            sampled = bool(self.every_n) and number % self.every_n == 0
+            extra = {}
+
+            torch_prof = self._start_torch() if sampled and self.torch_trace else None
+            cprof = cProfile.Profile()
+            started = time.perf_counter()
+            with count_tokens() as tokens:
+                cprof.enable()
+                try:
+                    yield extra
+                finally:
+                    cprof.disable()
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    if torch_prof is not None:
+                        torch_prof.__exit__(None, None, None)
+                    self._save(email_id, number, sampled, elapsed_ms, tokens, extra, cprof, torch_prof)
+        finally:
+            self._session.release()
+
+    def _save(self, email_id, number, sampled, elapsed_ms, tokens, extra, cprof, torch_prof):
+        slow = bool(self.slow_ms) and elapsed_ms >= self.slow_ms
+        if not (sampled or slow):
+            return
+        meta = {
+            "email_id": email_id,
+            "reason": "sampled" if sampled else "slow",
+            "email_number": number,
+            "elapsed_ms": round(elapsed_ms, 1),
+            # Counted in the generating process, so unknown here when that is another one
+            "tokens_in": None if self.generation_elsewhere else tokens["in"],
+            "tokens_out": None if self.generation_elsewhere else tokens["out"],
+            "generation_profiled": not self.generation_elsewhere,
+            "config_hash": self.config_hash,
+            "captured_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        if self.generation_elsewhere:
+            meta["generation_runs_in"] = self.generation_elsewhere
+        meta.update(extra)
+        try:
+            path = self._write(meta, cprof, torch_prof)
+            print(f"[INFO] Profile saved ({meta['reason']}, {elapsed_ms:.0f} ms): {path}")
+        except Exception as e:
+            print(f"[WARNING] Could not save profile: {e}")
+
+    def _write(self, meta, cprof, torch_prof):
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}_{meta['email_number']:06d}_{meta['reason']}"
+        path = os.path.join(self.out_dir, name)
+        os.makedirs(path, exist_ok=True)
+
+        cprof.dump_stats(os.path.join(path, "cprofile.prof"))
+        summary = io.StringIO()
+        pstats.Stats(cprof, stream=summary).sort_stats("cumulative").print_stats(40)
+        with open(os.path.join(path, "cprofile.txt"), "w") as f:
+            f.write(summary.getvalue())
+
+        if torch_prof is not None:
+            torch_prof.export_chrome_trace(os.path.join(path, "torch_trace.json"))
+            with open(os.path.join(path, "torch_ops.txt"), "w") as f:
+                f.write(torch_prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=40))
+
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+        self._rotate()
+        return path
+
+    def _rotate(self):
+        if self.keep <= 0:
+            return
+        entries = sorted(e.name for e in os.scandir(self.out_dir) if e.is_dir())
+        for name in entries[:-self.keep]:
+            shutil.rmtree(os.path.join(self.out_dir, name), ignore_errors=True)
@@ -0,0 +1,52 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+# Record mode for offline benchmarking: with PIPELINE_RECORD=path.jsonl the
+# monitor appends every Graph poll, LLM output and backend response to a
+# JSONL trace that bench/replay.py can play back. Traces contain full email
+# contents, so keep them out of git and delete them after use.
+
+TRACE_PATH = os.getenv("PIPELINE_RECORD")
+_lock = threading.Lock()
+_last_poll_digest = None
+
+
+def text_digest(text):
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+
+def record(kind, **payload):
+    """Append one event to the trace; a no-op unless PIPELINE_RECORD is set"""
+    if not TRACE_PATH:
+        return
+    line = json.dumps(dict(payload, kind=kind, ts=time.time()), ensure_ascii=False)
+    with _lock:
+        with open(TRACE_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def record_poll(status_code, body):
+    """Record a Graph /me/messages response, skipping polls identical to the previous one"""
+    global _last_poll_digest
+    if not TRACE_PATH:
+        return
+    digest = text_digest(json.dumps(body, sort_keys=True))
+    if digest == _last_poll_digest:
+        return
+    _last_poll_digest = digest
+    record("graph_messages", status=status_code, body=body)
+
+
+def load_trace(path):
+    """Trace events grouped by kind, each list in recorded order"""
+    events = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                event = json.loads(line)
+                events.setdefault(event["kind"], []).append(event)
+    return events